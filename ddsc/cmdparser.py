@@ -48,6 +48,23 @@ def add_project_name_arg(arg_parser, required=True, help_text="Name of the remot
                            required=required)
 
 
+def add_project_name_or_id_arg(arg_parser, required=True, help_text_suffix="manage"):
+    """
+    Adds mutually exclusive project_name(-p) and project_id(-i) parameters to a parser.
+    :param arg_parser: ArgumentParser parser to add these arguments to.
+    :param required: bool: must the user specify one of these arguments
+    :param help_text_suffix: str: end of the help text describing what we will do with the project
+    """
+    project_name_or_id = arg_parser.add_mutually_exclusive_group(required=required)
+    name_help_text = "Name of the project to {}.".format(help_text_suffix)
+    add_project_name_arg(project_name_or_id, required=False, help_text=name_help_text)
+    id_help_text = "ID of the project to {}.".format(help_text_suffix)
+    project_name_or_id.add_argument("-i",
+                                    metavar='ProjectId',
+                                    dest='project_id',
+                                    help=id_help_text)
+
+
 def _paths_must_exists(path):
     """
     Raises error if path doesn't exist.
@@ -122,6 +139,18 @@ def _add_follow_symlinks_arg(arg_parser):
                             dest='follow_symlinks')
 
 
+def _add_bundle_arg(arg_parser):
+    """
+    Adds optional bundle parameter to a parser.
+    :param arg_parser: ArgumentParser parser to add this argument to.
+    """
+    arg_parser.add_argument("--bundle",
+                            help="Upload each folder as a single tar file with a manifest of its contents. "
+                                 "Downloads unpack these files back into folders.",
+                            action='store_true',
+                            dest='bundle')
+
+
 def add_user_arg(arg_parser):
     """
     Adds username parameter to a parser.
@@ -249,9 +278,10 @@ class CommandParser(object):
         """
         description = "Uploads local files and folders to a remote host."
         upload_parser = self.subparsers.add_parser('upload', description=description)
-        add_project_name_arg(upload_parser, help_text="Name of the project to upload files/folders to.")
+        add_project_name_or_id_arg(upload_parser, help_text_suffix="upload files/folders to")
         _add_folders_positional_arg(upload_parser)
         _add_follow_symlinks_arg(upload_parser)
+        _add_bundle_arg(upload_parser)
         upload_parser.set_defaults(func=upload_func)
 
     def register_add_user_command(self, add_user_func):
@@ -262,7 +292,7 @@ class CommandParser(object):
         """
         description = "Gives user permission to access a remote project."
         add_user_parser = self.subparsers.add_parser('add_user', description=description)
-        add_project_name_arg(add_user_parser, help_text="Name of the project to add a user to.")
+        add_project_name_or_id_arg(add_user_parser, help_text_suffix="add a user to")
         user_or_email = add_user_parser.add_mutually_exclusive_group(required=True)
         add_user_arg(user_or_email)
         add_email_arg(user_or_email)
@@ -276,7 +306,7 @@ class CommandParser(object):
         """
         description = "Removes user permission to access a remote project."
         remove_user_parser = self.subparsers.add_parser('remove_user', description=description)
-        add_project_name_arg(remove_user_parser, help_text="Name of the project to remove a user from.")
+        add_project_name_or_id_arg(remove_user_parser, help_text_suffix="remove a user from")
         user_or_email = remove_user_parser.add_mutually_exclusive_group(required=True)
         add_user_arg(user_or_email)
         add_email_arg(user_or_email)
@@ -289,7 +319,7 @@ class CommandParser(object):
         """
         description = "Download the contents of a remote remote project to a local folder."
         download_parser = self.subparsers.add_parser('download', description=description)
-        add_project_name_arg(download_parser, help_text="Name of the project to download.")
+        add_project_name_or_id_arg(download_parser, help_text_suffix="download")
         _add_folder_positional_arg(download_parser)
         include_or_exclude = download_parser.add_mutually_exclusive_group(required=False)
         _add_include_arg(include_or_exclude)
@@ -305,7 +335,7 @@ class CommandParser(object):
                       "Sends the other user an email message via D4S2 service. " \
                       "If not specified this command gives user download permissions."
         share_parser = self.subparsers.add_parser('share', description=description)
-        add_project_name_arg(share_parser)
+        add_project_name_or_id_arg(share_parser, help_text_suffix="share")
         user_or_email = share_parser.add_mutually_exclusive_group(required=True)
         add_user_arg(user_or_email)
         add_email_arg(user_or_email)
@@ -322,7 +352,7 @@ class CommandParser(object):
                       "Makes a copy of the project. Send message to D4S2 service to send email and allow " \
                       "access to the copy of the project once user acknowledges receiving the data."
         deliver_parser = self.subparsers.add_parser('deliver', description=description)
-        add_project_name_arg(deliver_parser)
+        add_project_name_or_id_arg(deliver_parser, help_text_suffix="deliver")
         user_or_email = deliver_parser.add_mutually_exclusive_group(required=True)
         add_user_arg(user_or_email)
         add_email_arg(user_or_email)
@@ -340,7 +370,7 @@ class CommandParser(object):
         """
         description = "Show a list of project names or folders/files of a single project."
         list_parser = self.subparsers.add_parser('list', description=description)
-        add_project_name_arg(list_parser, required=False, help_text="Name of the project to show details for.")
+        add_project_name_or_id_arg(list_parser, required=False, help_text_suffix="show details for")
         list_parser.set_defaults(func=list_func)
 
     def register_delete_command(self, delete_func):
@@ -350,7 +380,7 @@ class CommandParser(object):
         """
         description = "Permanently delete a project."
         delete_parser = self.subparsers.add_parser('delete', description=description)
-        add_project_name_arg(delete_parser, help_text="Name of the project to delete.")
+        add_project_name_or_id_arg(delete_parser, help_text_suffix="delete")
         _add_force_arg(delete_parser, "Do not prompt before deleting.")
         delete_parser.set_defaults(func=delete_func)
 
@@ -2,6 +2,7 @@
 import os
 import re
 import math
+import hashlib
 import yaml
 import multiprocessing
 try:
@@ -16,10 +17,28 @@ DUKE_DATA_SERVICE_URL = 'https://api.dataservice.duke.edu/api/v1'
 D4S2_SERVICE_URL = 'https://d4s2.gcb.duke.edu/api/v1'
 MB_TO_BYTES = 1024 * 1024
 DDS_DEFAULT_UPLOAD_CHUNKS = 100 * MB_TO_BYTES
+DDS_DEFAULT_UPLOAD_MAX_CHUNK_BYTES = 250 * MB_TO_BYTES  # each upload worker holds one chunk in memory
+DDS_DEFAULT_UPLOAD_CHUNK_MEMORY_BYTES = 2000 * MB_TO_BYTES  # default max chunk is shared out so all workers fit in this
+DDS_DEFAULT_UPLOAD_MAX_CHUNKS = 10000
+DEFAULT_UPLOAD_SMALL_FILE_BATCH_SIZE = 32
 AUTH_ENV_KEY_NAME = 'DUKE_DATA_SERVICE_AUTH'
 # when uploading skip .DS_Store, our key file, and ._ (resource fork metadata)
 FILE_EXCLUDE_REGEX_DEFAULT = '^\.DS_Store$|^\.ddsclient$|^\.\_'
 MAX_DEFAULT_WORKERS = 8
+DEFAULT_CACHE_DIR = '~/.ddsclient_cache'
+HASH_CACHE_FILENAME = 'hashes.sqlite'
+DEFAULT_HASH_CACHE_MAX_ENTRIES = 1000000
+DEFAULT_FILE_HASH_ALGORITHMS = ['md5']
+DEFAULT_SCAN_WORKERS = 1
+REMOTE_TREE_CACHE_DIRNAME = 'remote_trees'
+DEFAULT_REMOTE_TREE_CACHE_SECONDS = 0
+DEFAULT_DOWNLOAD_RETRIES = 2
+DEFAULT_DOWNLOAD_URL_PREFETCH = 4
+DOWNLOAD_ALLOCATION_FALLOCATE = 'fallocate'    # reserve the whole file up front, ranges written in parallel
+DOWNLOAD_ALLOCATION_SPARSE = 'sparse'          # create a sparse file, ranges written in parallel
+DOWNLOAD_ALLOCATION_SEQUENTIAL = 'sequential'  # single worker writes the file from start to finish
+DOWNLOAD_ALLOCATION_STRATEGIES = [DOWNLOAD_ALLOCATION_FALLOCATE, DOWNLOAD_ALLOCATION_SPARSE,
+                                  DOWNLOAD_ALLOCATION_SEQUENTIAL]
 
 
 def create_config():
@@ -50,11 +69,29 @@ class Config(object):
     AGENT_KEY = 'agent_key'                            # software_agent key: /api/v1/software_agents/{id}/api_key
     AUTH = 'auth'                                      # Holds actual auth token for connecting to the dataservice
     UPLOAD_BYTES_PER_CHUNK = 'upload_bytes_per_chunk'  # bytes per chunk we will upload
+    UPLOAD_MAX_BYTES_PER_CHUNK = 'upload_max_bytes_per_chunk'  # largest chunk a large file may be split into
+    UPLOAD_MAX_CHUNKS = 'upload_max_chunks'            # most chunks the data service accepts for a single upload
     UPLOAD_WORKERS = 'upload_workers'                  # how many worker processes used for uploading
+    UPLOAD_SMALL_FILE_BATCH_SIZE = 'upload_small_file_batch_size'  # how many small files each upload task sends
     DOWNLOAD_WORKERS = 'download_workers'              # how many worker processes used for downloading
     DEBUG_MODE = 'debug'                               # show stack traces
     D4S2_URL = 'd4s2_url'                              # url for use with the D4S2 (share/deliver service)
     FILE_EXCLUDE_REGEX = 'file_exclude_regex'          # allows customization of which filenames will be uploaded
+    CACHE_DIR = 'cache_dir'                            # directory to store local caches in (empty disables caching)
+    HASH_CACHE_MAX_ENTRIES = 'hash_cache_max_entries'  # max number of file hashes to keep (0 disables hash cache)
+    FILE_HASH_ALGORITHMS = 'file_hash_algorithms'      # hash algorithms to calculate for files in preferred order
+    SCAN_WORKERS = 'scan_workers'                      # how many threads used to scan local directories
+    REMOTE_TREE_CACHE_SECONDS = 'remote_tree_cache_seconds'  # how long to reuse cached remote project trees
+    VERIFY_DOWNLOADS = 'verify_downloads'              # compare md5 of downloaded files against the data service
+    DOWNLOAD_RETRIES = 'download_retries'              # how many times to retry a download that failed verification
+    DOWNLOAD_ALLOCATION = 'download_allocation'        # how space for downloaded files is allocated
+    DOWNLOAD_URL_PREFETCH = 'download_url_prefetch'    # how many files ahead to fetch download urls for
+    TRANSFER_RATE_LIMIT = 'transfer_rate_limit'        # bytes per second allowed for all uploads/downloads combined
+    TRANSFER_RATE_BURST = 'transfer_rate_burst'        # bytes that can be transferred at once after being idle
+    AUTOTUNE_WORKERS = 'autotune_workers'              # adjust upload/download workers from observed throughput
+    UPLOAD_COMPRESSION_LEVEL = 'upload_compression_level'  # gzip level for compressible files (0 disables)
+    STREAM_UPLOADS = 'stream_uploads'                  # start uploading files while local folders are still scanned
+    UPLOAD_STAGING_DIR = 'upload_staging_dir'          # directory for bundles/compressed files made while uploading
 
     def __init__(self):
         self.values = {}
@@ -127,6 +164,29 @@ class Config(object):
         value = self.values.get(Config.UPLOAD_BYTES_PER_CHUNK, DDS_DEFAULT_UPLOAD_CHUNKS)
         return Config.parse_bytes_str(value)
 
+    @property
+    def upload_max_bytes_per_chunk(self):
+        """
+        Return the largest chunk size large files may be split into.
+        Each upload worker holds a whole chunk in memory so when this isn't configured the default is lowered
+        to keep upload_workers chunks within DDS_DEFAULT_UPLOAD_CHUNK_MEMORY_BYTES.
+        Never less than upload_bytes_per_chunk.
+        :return: int bytes per upload chunk
+        """
+        value = self.values.get(Config.UPLOAD_MAX_BYTES_PER_CHUNK)
+        if value is None:
+            upload_workers = max(self.upload_workers or 1, 1)
+            value = min(DDS_DEFAULT_UPLOAD_MAX_CHUNK_BYTES, DDS_DEFAULT_UPLOAD_CHUNK_MEMORY_BYTES // upload_workers)
+        return max(Config.parse_bytes_str(value), self.upload_bytes_per_chunk)
+
+    @property
+    def upload_max_chunks(self):
+        """
+        Return the most chunks a single file upload may be split into.
+        :return: int number of chunks
+        """
+        return self.values.get(Config.UPLOAD_MAX_CHUNKS, DDS_DEFAULT_UPLOAD_MAX_CHUNKS)
+
     @property
     def upload_workers(self):
         """
@@ -135,6 +195,14 @@ class Config(object):
         """
         return self.values.get(Config.UPLOAD_WORKERS, default_num_workers())
 
+    @property
+    def upload_small_file_batch_size(self):
+        """
+        Return the most small files with the same parent to send in a single upload task.
+        :return: int number of files. Specify 1 to send each small file in its own task
+        """
+        return max(self.values.get(Config.UPLOAD_SMALL_FILE_BATCH_SIZE, DEFAULT_UPLOAD_SMALL_FILE_BATCH_SIZE), 1)
+
     @property
     def download_workers(self):
         """
@@ -184,3 +252,175 @@ class Config(object):
         :return: str: regex that when matches we should exclude a file from uploading.
         """
         return self.values.get(Config.FILE_EXCLUDE_REGEX, FILE_EXCLUDE_REGEX_DEFAULT)
+
+    @property
+    def cache_dir(self):
+        """
+        Returns the directory where ddsclient stores local caches or None if caching is disabled.
+        :return: str: path to the cache directory
+        """
+        cache_dir = self.values.get(Config.CACHE_DIR, DEFAULT_CACHE_DIR)
+        if not cache_dir:
+            return None
+        return os.path.expanduser(cache_dir)
+
+    @property
+    def hash_cache_max_entries(self):
+        """
+        Returns the maximum number of file hashes to keep in the local hash cache.
+        :return: int: number of entries
+        """
+        return self.values.get(Config.HASH_CACHE_MAX_ENTRIES, DEFAULT_HASH_CACHE_MAX_ENTRIES)
+
+    @property
+    def hash_cache_filename(self):
+        """
+        Returns path to the file used to cache local file hashes or None if the hash cache is disabled.
+        :return: str: path to the hash cache file
+        """
+        if self.cache_dir and self.hash_cache_max_entries:
+            return os.path.join(self.cache_dir, HASH_CACHE_FILENAME)
+        return None
+
+    @property
+    def file_hash_algorithms(self):
+        """
+        Returns names of the hash algorithms to calculate for files we upload.
+        Algorithms earlier in the list are preferred when comparing against remote files.
+        Names must be supported by hashlib. md5 will always be calculated since DukeDS requires it.
+        :return: [str]: list of hash algorithm names
+        """
+        value = self.values.get(Config.FILE_HASH_ALGORITHMS, DEFAULT_FILE_HASH_ALGORITHMS)
+        if type(value) == str:
+            value = [alg.strip() for alg in value.split(',')]
+        if hasattr(hashlib, 'algorithms_available'):
+            available = set(alg.lower() for alg in hashlib.algorithms_available)
+        else:
+            available = set(hashlib.algorithms)  # python 2.7 before 2.7.9
+        invalid_algs = [alg for alg in value if alg.lower() not in available]
+        if invalid_algs:
+            msg = "Invalid {} config setting: {}. Valid values: {}"
+            raise ValueError(msg.format(Config.FILE_HASH_ALGORITHMS, ', '.join(invalid_algs),
+                                        ', '.join(sorted(available))))
+        return value
+
+    @property
+    def scan_workers(self):
+        """
+        Return the number of threads to use when scanning local directories before an upload.
+        More than one thread helps on network filesystems where each directory listing/stat is slow.
+        :return: int number of threads. Specify 1 to scan directories serially.
+        """
+        return self.values.get(Config.SCAN_WORKERS, DEFAULT_SCAN_WORKERS)
+
+    @property
+    def remote_tree_cache_seconds(self):
+        """
+        Returns how many seconds a locally cached remote project tree may be reused.
+        Changes made to a project by other clients are not seen until the cached tree expires.
+        :return: int: seconds, 0 disables the remote tree cache
+        """
+        return self.values.get(Config.REMOTE_TREE_CACHE_SECONDS, DEFAULT_REMOTE_TREE_CACHE_SECONDS)
+
+    @property
+    def remote_tree_cache_dir(self):
+        """
+        Returns directory used to cache remote project trees or None if the remote tree cache is disabled.
+        :return: str: path to the remote tree cache directory
+        """
+        if self.cache_dir and self.remote_tree_cache_seconds:
+            return os.path.join(self.cache_dir, REMOTE_TREE_CACHE_DIRNAME)
+        return None
+
+    @property
+    def verify_downloads(self):
+        """
+        Should downloaded files have their md5 checked against the hash stored in the data service.
+        :return: bool: True if downloads should be verified
+        """
+        return self.values.get(Config.VERIFY_DOWNLOADS, True)
+
+    @property
+    def download_retries(self):
+        """
+        Returns how many times a file download will be retried after it fails verification.
+        :return: int: number of retries, 0 disables retrying
+        """
+        return self.values.get(Config.DOWNLOAD_RETRIES, DEFAULT_DOWNLOAD_RETRIES)
+
+    @property
+    def download_allocation(self):
+        """
+        Returns how disk space should be allocated for files being downloaded.
+        :return: str: one of DOWNLOAD_ALLOCATION_STRATEGIES
+        """
+        value = self.values.get(Config.DOWNLOAD_ALLOCATION, DOWNLOAD_ALLOCATION_FALLOCATE)
+        if value not in DOWNLOAD_ALLOCATION_STRATEGIES:
+            msg = "Invalid {} config setting: {}. Valid values: {}"
+            raise ValueError(msg.format(Config.DOWNLOAD_ALLOCATION, value, ', '.join(DOWNLOAD_ALLOCATION_STRATEGIES)))
+        return value
+
+    @property
+    def download_url_prefetch(self):
+        """
+        Returns how many files ahead of the current download to fetch download urls for.
+        :return: int: number of files, 0 disables prefetching
+        """
+        return self.values.get(Config.DOWNLOAD_URL_PREFETCH, DEFAULT_DOWNLOAD_URL_PREFETCH)
+
+    @property
+    def transfer_rate_limit(self):
+        """
+        Returns the combined bytes per second allowed for all upload and download workers.
+        :return: int: bytes per second, 0 does not limit transfers
+        """
+        return Config.parse_bytes_str(self.values.get(Config.TRANSFER_RATE_LIMIT, 0))
+
+    @property
+    def transfer_rate_burst(self):
+        """
+        Returns how many bytes can be transferred at once when transfers have been idle.
+        Defaults to one second of transfer_rate_limit.
+        :return: int: bytes
+        """
+        value = self.values.get(Config.TRANSFER_RATE_BURST)
+        if value:
+            return Config.parse_bytes_str(value)
+        return self.transfer_rate_limit
+
+    @property
+    def autotune_workers(self):
+        """
+        Returns whether the number of upload/download workers should be adjusted based on observed throughput.
+        The number of workers learned is saved in cache_dir per server url.
+        :return: bool: True to adjust workers
+        """
+        return self.values.get(Config.AUTOTUNE_WORKERS, False)
+
+    @property
+    def upload_compression_level(self):
+        """
+        Returns the gzip compression level used for compressible files when uploading.
+        :return: int: level from 1 (fastest) to 9 (smallest) or 0 to upload files as they are
+        """
+        return min(max(int(self.values.get(Config.UPLOAD_COMPRESSION_LEVEL, 0)), 0), 9)
+
+    @property
+    def stream_uploads(self):
+        """
+        Returns whether uploads should start sending files while local folders are still being scanned.
+        The totals of what will be sent are not known until the upload finishes.
+        :return: bool: True to upload while scanning
+        """
+        return self.values.get(Config.STREAM_UPLOADS, False)
+
+    @property
+    def upload_staging_dir(self):
+        """
+        Returns the directory bundles and compressed files are written to while uploading.
+        :return: str: path to the directory or None to use the system temporary directory
+        """
+        staging_dir = self.values.get(Config.UPLOAD_STAGING_DIR)
+        if not staging_dir:
+            return None
+        return os.path.expanduser(staging_dir)
@@ -0,0 +1,97 @@
+"""
+Tunes the number of transfer workers from observed throughput and errors.
+Uses additive increase / multiplicative decrease and remembers the result per server url.
+"""
+import os
+import json
+from ddsc.core.util import write_file_atomically
+from ddsc.core.remotetreecache import get_server_key
+
+AUTOTUNE_FILENAME = 'autotune_{}.json'
+MAX_AUTOTUNE_WORKERS = 32
+MIN_AUTOTUNE_SAMPLE_BYTES = 64 * 1024 * 1024  # smaller transfers are dominated by latency
+THROUGHPUT_TOLERANCE = 0.1
+THROUGHPUT_DECREASE_FACTOR = 0.75
+ERROR_DECREASE_FACTOR = 0.5
+UPLOAD_TRANSFER = 'upload_workers'
+DOWNLOAD_TRANSFER = 'download_workers'
+
+
+def create_worker_autotuner(config, transfer_type, initial_workers):
+    """
+    Create a worker autotuner based on config settings.
+    :param config: ddsc.config.Config: settings that determine if autotuning is enabled and where results are saved
+    :param transfer_type: str: UPLOAD_TRANSFER or DOWNLOAD_TRANSFER
+    :param initial_workers: int: number of workers to start with if nothing has been learned for this server
+    :return: WorkerAutotuner or None if autotuning is disabled
+    """
+    if config.autotune_workers and config.cache_dir:
+        filename = os.path.join(config.cache_dir, AUTOTUNE_FILENAME.format(get_server_key(config.url)))
+        return WorkerAutotuner(filename, transfer_type, initial_workers)
+    return None
+
+
+class WorkerAutotuner(object):
+    """
+    Chooses how many workers to use for the next transfer.
+    Adds a worker after each transfer unless throughput dropped, which cuts workers by THROUGHPUT_DECREASE_FACTOR.
+    Errors cut workers by ERROR_DECREASE_FACTOR.
+    Only transfers that used the current number of workers and are at least MIN_AUTOTUNE_SAMPLE_BYTES are counted.
+    """
+    def __init__(self, filename, transfer_type, initial_workers, max_workers=MAX_AUTOTUNE_WORKERS):
+        """
+        Setup autotuner loading the number of workers learned in a previous run.
+        :param filename: str: path to JSON file where learned worker counts are saved
+        :param transfer_type: str: UPLOAD_TRANSFER or DOWNLOAD_TRANSFER
+        :param initial_workers: int: number of workers to start with if filename has no value for transfer_type
+        :param max_workers: int: most workers to ever use
+        """
+        self.filename = filename
+        self.transfer_type = transfer_type
+        self.max_workers = max_workers
+        self.workers = self._clamp(self._load_saved_workers().get(transfer_type) or initial_workers)
+        self.last_rate = None
+
+    def _load_saved_workers(self):
+        try:
+            with open(self.filename, 'rb') as infile:
+                return json.loads(infile.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _clamp(self, workers):
+        return min(max(int(workers), 1), self.max_workers)
+
+    def record_transfer(self, num_bytes, seconds, num_workers):
+        """
+        Update the number of workers based on how long a transfer took.
+        :param num_bytes: int: size of the transfer
+        :param seconds: float: how long the transfer took
+        :param num_workers: int: number of workers the transfer used
+        """
+        if num_workers != self.workers or num_bytes < MIN_AUTOTUNE_SAMPLE_BYTES or seconds <= 0:
+            return
+        rate = num_bytes / float(seconds)
+        if self.last_rate is not None and rate < self.last_rate * (1 - THROUGHPUT_TOLERANCE):
+            self.workers = self._clamp(self.workers * THROUGHPUT_DECREASE_FACTOR)
+        else:
+            self.workers = self._clamp(self.workers + 1)
+        self.last_rate = rate
+
+    def record_error(self):
+        """
+        Reduce the number of workers after a transfer failed.
+        """
+        self.workers = self._clamp(self.workers * ERROR_DECREASE_FACTOR)
+        self.last_rate = None
+
+    def save(self):
+        """
+        Save the current number of workers so the next run starts with it.
+        """
+        saved_workers = self._load_saved_workers()
+        saved_workers[self.transfer_type] = self.workers
+        try:
+            write_file_atomically(self.filename, json.dumps(saved_workers).encode('utf-8'))
+        except (IOError, OSError):
+            pass  # failing to save just means we start from the configured workers next time
@@ -0,0 +1,144 @@
+"""
+Packs folders of many small files into a single tar file (bundle) so they can be uploaded as one large file.
+Each bundle is uploaded with a JSON manifest listing the files it contains.
+Downloads unpack bundles back into the folder they were created from.
+"""
+import os
+import json
+import tarfile
+from ddsc.core.localstore import FileFilter, HashUtil
+
+BUNDLE_SUFFIX = '.ddsclient-bundle.tar'
+MANIFEST_SUFFIX = '.ddsclient-bundle.json'
+
+
+def is_bundle(filename):
+    return filename.endswith(BUNDLE_SUFFIX)
+
+
+def is_bundle_manifest(filename):
+    return filename.endswith(MANIFEST_SUFFIX)
+
+
+def create_bundles(paths, staging_dir, file_exclude_regex, followsymlinks=False):
+    """
+    Replace each folder in paths with a bundle and manifest written to staging_dir.
+    :param paths: [str]: paths to files and folders that were going to be uploaded
+    :param staging_dir: str: directory to write bundles and manifests into
+    :param file_exclude_regex: str: regex that matches files we do not want to add to bundles
+    :param followsymlinks: bool: add the contents of symbolic linked directories
+    :return: [str]: paths to upload, files are unchanged and each folder replaced by its bundle and manifest
+    """
+    file_include = FileFilter(file_exclude_regex).include
+    upload_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            name = os.path.basename(os.path.abspath(path))
+            bundle_path = os.path.join(staging_dir, name + BUNDLE_SUFFIX)
+            manifest_path = os.path.join(staging_dir, name + MANIFEST_SUFFIX)
+            if os.path.exists(bundle_path):
+                raise ValueError("Unable to bundle more than one folder named {}.".format(name))
+            write_bundle(path, bundle_path, manifest_path, file_include, followsymlinks)
+            upload_paths.extend([bundle_path, manifest_path])
+        else:
+            upload_paths.append(path)
+    return upload_paths
+
+
+def write_bundle(folder, bundle_path, manifest_path, file_include, followsymlinks=False):
+    """
+    Write the contents of folder to a tar file at bundle_path and a JSON list of its files to manifest_path.
+    Entries are added in sorted order so bundling an unchanged folder produces an identical file
+    that will not be uploaded again.
+    :param folder: str: path to the folder to bundle
+    :param bundle_path: str: path of the tar file to create
+    :param manifest_path: str: path of the manifest to create
+    :param file_include: func(str) -> bool: returns True for file names that should be added
+    :param followsymlinks: bool: add the contents of symbolic linked directories
+    """
+    manifest_files = []
+    bundle = tarfile.open(bundle_path, 'w', format=tarfile.PAX_FORMAT, dereference=True)
+    try:
+        for dirpath, dirnames, filenames in os.walk(folder, followlinks=followsymlinks):
+            dirnames.sort()
+            rel_dirpath = os.path.relpath(dirpath, folder)
+            if rel_dirpath != os.curdir:
+                bundle.add(dirpath, arcname=_archive_name(rel_dirpath), recursive=False)
+            for filename in sorted(filenames):
+                if file_include(filename):
+                    path = os.path.join(dirpath, filename)
+                    arcname = _archive_name(os.path.join(rel_dirpath, filename))
+                    manifest_files.append(_add_file(bundle, path, arcname))
+    finally:
+        bundle.close()
+    manifest = {
+        'bundle': os.path.basename(bundle_path),
+        'format': 'tar',
+        'files': manifest_files,
+    }
+    with open(manifest_path, 'w') as outfile:
+        json.dump(manifest, outfile, indent=2, sort_keys=True)
+
+
+def _archive_name(rel_path):
+    return os.path.normpath(rel_path).replace(os.sep, '/')
+
+
+def _add_file(bundle, path, arcname):
+    """
+    Add a single file to bundle hashing it as it is read.
+    :return: dict: manifest entry for the file
+    """
+    tarinfo = bundle.gettarinfo(path, arcname)
+    with open(path, 'rb') as infile:
+        reader = HashingReader(infile)
+        bundle.addfile(tarinfo, reader)
+    hash_alg, hash_value = reader.hash_util.hexdigest()
+    return {'path': arcname, 'size': tarinfo.size, hash_alg: hash_value}
+
+
+class HashingReader(object):
+    """
+    File wrapper that hashes the data read through it.
+    """
+    def __init__(self, infile):
+        self.infile = infile
+        self.hash_util = HashUtil()
+
+    def read(self, size=-1):
+        data = self.infile.read(size)
+        self.hash_util.add_chunk(data)
+        return data
+
+
+def extract_bundle(bundle_path):
+    """
+    Unpack a downloaded bundle into a folder next to it named for the bundle and remove the bundle.
+    :param bundle_path: str: path to a downloaded bundle
+    :return: str: path to the folder the bundle was unpacked into
+    """
+    folder = bundle_path[:-len(BUNDLE_SUFFIX)]
+    bundle = tarfile.open(bundle_path, 'r')
+    try:
+        members = bundle.getmembers()
+        for member in members:
+            _check_member(member)
+        extract_args = {}
+        if hasattr(tarfile, 'data_filter'):
+            extract_args['filter'] = 'data'
+        bundle.extractall(folder, members=members, **extract_args)
+    finally:
+        bundle.close()
+    os.remove(bundle_path)
+    return folder
+
+
+def _check_member(member):
+    """
+    Raise ValueError unless member is a file or directory that stays within the folder we unpack into.
+    """
+    if not (member.isfile() or member.isdir()):
+        raise ValueError("Unsupported bundle entry {}.".format(member.name))
+    parts = member.name.split('/')
+    if member.name.startswith('/') or os.path.isabs(member.name) or '..' in parts:
+        raise ValueError("Bundle entry {} is outside of the bundle folder.".format(member.name))
@@ -0,0 +1,330 @@
+"""
+Gzip compresses text files (VCF, SAM, FASTQ, etc) before they are uploaded so less data crosses the network.
+Compressed files are stored under their name plus COMPRESSED_SUFFIX which tells downloads to decompress them.
+"""
+import os
+import math
+import gzip
+import shutil
+import tempfile
+from ddsc.core.util import KindType
+from ddsc.core.localstore import PathData, HashData, HashUtil
+from ddsc.core.filedownloader import PARTIAL_DOWNLOAD_SUFFIX, replace_file
+
+COMPRESSED_SUFFIX = '.ddsclient.gz'
+COMPRESSIBLE_EXTENSIONS = set([
+    '.bed', '.csv', '.fa', '.fasta', '.fastq', '.fq', '.gff', '.gtf', '.sam', '.tsv', '.txt', '.vcf',
+])
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def is_compressible(filename):
+    return os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def is_compressed(filename):
+    return filename.endswith(COMPRESSED_SUFFIX)
+
+
+def compress_local_files(parent, compression_level, staging_dir):
+    """
+    Replace compressible files below parent with CompressedLocalFile so they are uploaded gzip compressed.
+    Must be called before matching the local files against the remote project since this changes their names.
+    :param parent: LocalProject/LocalFolder: item whose children we will replace
+    :param compression_level: int: gzip level from 1 (fastest) to 9 (smallest)
+    :param staging_dir: str: directory to write compressed files into
+    """
+    for index, child in enumerate(parent.children):
+        if KindType.is_file(child):
+            if is_compressible(child.name):
+                parent.children[index] = CompressedLocalFile(child, compression_level, staging_dir)
+        else:
+            compress_local_files(child, compression_level, staging_dir)
+
+
+def compress_file(source_path, dest_path, compression_level):
+    """
+    Write a gzip compressed copy of source_path to dest_path.
+    The header contains no name or timestamp so compressing an unchanged file always produces the same bytes.
+    :param source_path: str: path to the file to compress
+    :param dest_path: str: path of the compressed file to create
+    :param compression_level: int: gzip level from 1 (fastest) to 9 (smallest)
+    :return: (str, int): md5 and size of the compressed file
+    """
+    with open(source_path, 'rb') as infile:
+        with open(dest_path, 'wb') as outfile:
+            writer = HashingWriter(outfile)
+            gzip_file = gzip.GzipFile(filename='', mode='wb', compresslevel=compression_level, fileobj=writer,
+                                      mtime=0)
+            try:
+                shutil.copyfileobj(infile, gzip_file, COPY_BLOCK_SIZE)
+            finally:
+                gzip_file.close()
+    hash_alg, hash_value = writer.hash_util.hexdigest()
+    return hash_value, writer.size
+
+
+def decompress_file(path):
+    """
+    Replace a downloaded compressed file with its original contents and name.
+    :param path: str: path to a downloaded file ending in COMPRESSED_SUFFIX
+    :return: str: path to the decompressed file
+    """
+    dest_path = path[:-len(COMPRESSED_SUFFIX)]
+    partial_path = dest_path + PARTIAL_DOWNLOAD_SUFFIX
+    gzip_file = gzip.open(path, 'rb')
+    try:
+        with open(partial_path, 'wb') as outfile:
+            shutil.copyfileobj(gzip_file, outfile, COPY_BLOCK_SIZE)
+    finally:
+        gzip_file.close()
+    replace_file(partial_path, dest_path)
+    os.remove(path)
+    return dest_path
+
+
+class HashingWriter(object):
+    """
+    File wrapper that hashes and counts the data written through it.
+    """
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.hash_util = HashUtil()
+        self.size = 0
+
+    def write(self, data):
+        self.hash_util.add_chunk(data)
+        self.size += len(data)
+        self.outfile.write(data)
+
+    def flush(self):
+        self.outfile.flush()
+
+
+class CompressedLocalFile(object):
+    """
+    Stands in for a LocalFile that is uploaded gzip compressed under its name plus COMPRESSED_SUFFIX.
+    Each file is compressed once into staging_dir by whichever process uploads it and the copy is removed once sent.
+    Until then the size of the original file stands in for the compressed size when deciding how to send it.
+    Comparing against a remote file needs the md5 and size of the compressed file which come from the hash cache
+    or from compressing the file, the compressed copy is kept for uploading when it differs from the remote file.
+    The md5 and size are saved in the hash cache against the original file so unchanged files aren't compressed again.
+    """
+    kind = KindType.file_str
+    is_file = True
+
+    def __init__(self, local_file, compression_level, staging_dir):
+        """
+        :param local_file: LocalFile: file on disk we will upload compressed
+        :param compression_level: int: gzip level from 1 (fastest) to 9 (smallest)
+        :param staging_dir: str: directory to write the compressed file into
+        """
+        self.local_file = local_file
+        self.compression_level = compression_level
+        self.staging_dir = staging_dir
+        self.name = local_file.name + COMPRESSED_SUFFIX
+        self.need_to_send = True
+        self.remote_id = ''
+        self.sent_to_remote = False
+        self.compressed_info = None
+        self.cache_checked = False
+        self.info_from_cache = False
+        self.upload_path_data = None
+        self.counted_size = None
+
+    @property
+    def path(self):
+        """
+        Path of the original file with the suffix it is stored under.
+        :return: str: path
+        """
+        return self.local_file.path + COMPRESSED_SUFFIX
+
+    @property
+    def staged_path(self):
+        """
+        Path the compressed copy is written to or None if it hasn't been requested.
+        :return: str: path
+        """
+        if self.upload_path_data:
+            return self.upload_path_data.path
+        return None
+
+    @property
+    def size(self):
+        """
+        Size of the compressed file when known otherwise the size of the original file.
+        :return: int: size in bytes
+        """
+        compressed_info = self._get_known_info()
+        if compressed_info:
+            return compressed_info[1]
+        return self.local_file.size
+
+    @property
+    def path_data(self):
+        return self.get_path_data()
+
+    @property
+    def mimetype(self):
+        return PathData(self.path).mime_type()
+
+    def get_path_data(self):
+        """
+        PathData for the compressed copy of the file, the file is compressed the first time its contents are read.
+        :return: CompressedPathData
+        """
+        if not self.upload_path_data:
+            staged_path = os.path.join(tempfile.mkdtemp(dir=self.staging_dir), self.name)
+            self.upload_path_data = CompressedPathData(self.local_file.path, staged_path, self.compression_level,
+                                                       self.local_file.hash_cache, self.local_file.hash_algs,
+                                                       self._cache_keys())
+        return self.upload_path_data
+
+    def get_hash_value(self):
+        return self._get_compressed_info()[0]
+
+    def update_remote_ids(self, remote_file, compare_stats):
+        """
+        Based on a remote file assign a remote_id and compare size then md5 of the compressed file.
+        :param remote_file: RemoteFile remote data pull remote_id from
+        :param compare_stats: FileCompareStats: records how this file was compared
+        """
+        self.remote_id = remote_file.id
+        hash_value, size = self._get_compressed_info()
+        if size != remote_file.size:
+            compare_stats.size_differs += 1
+            return
+        remote_hash_value = remote_file.hashes.get(HashUtil.HASH_NAME)
+        if not remote_hash_value:
+            compare_stats.no_remote_hash += 1
+            return
+        if self.info_from_cache:
+            compare_stats.cached_hash += 1
+        else:
+            compare_stats.computed_hash += 1
+        if hash_value == remote_hash_value:
+            self.need_to_send = False
+            self.remove_staged_file()
+
+    def set_remote_id_after_send(self, remote_id):
+        self.sent_to_remote = True
+        self.remote_id = remote_id
+
+    def remove_staged_file(self, path_data=None):
+        """
+        Delete the compressed copy made for uploading this file keeping the md5 and size found while compressing it.
+        :param path_data: CompressedPathData: copy of our path data that was used to upload in another process
+        """
+        uploaded_path_data = path_data or self.upload_path_data
+        if uploaded_path_data and uploaded_path_data.compressed_info:
+            self.compressed_info = uploaded_path_data.compressed_info
+        if self.upload_path_data:
+            shutil.rmtree(os.path.dirname(self.upload_path_data.path), ignore_errors=True)
+            self.upload_path_data = None
+
+    def count_chunks(self, bytes_per_chunk):
+        """
+        Progress is counted using the size at the first call so totals still add up once the file is compressed.
+        """
+        if self.counted_size is None:
+            self.counted_size = self.size
+        return math.ceil(float(self.counted_size) / float(bytes_per_chunk))
+
+    def _cache_keys(self):
+        prefix = 'gzip{}-'.format(self.compression_level)
+        return prefix + HashUtil.HASH_NAME, prefix + 'size'
+
+    def _get_known_info(self):
+        """
+        Return md5 and size of the compressed file if they are in the hash cache or the file has been compressed.
+        :return: (str, int): md5 and size of the compressed file or None
+        """
+        if not self.compressed_info and not self.cache_checked:
+            self.cache_checked = True
+            self.compressed_info = self._get_cached_info()
+            self.info_from_cache = self.compressed_info is not None
+        if not self.compressed_info and self.upload_path_data:
+            self.compressed_info = self.upload_path_data.compressed_info
+        return self.compressed_info
+
+    def _get_compressed_info(self):
+        """
+        Return md5 and size of the compressed file from the hash cache or by compressing the file.
+        :return: (str, int): md5 and size of the compressed file
+        """
+        if not self._get_known_info():
+            self.compressed_info = self.get_path_data().stage()
+        return self.compressed_info
+
+    def _get_cached_info(self):
+        hash_cache = self.local_file.hash_cache
+        if hash_cache:
+            stat_info = os.stat(self.local_file.path)
+            hash_key, size_key = self._cache_keys()
+            hash_value = hash_cache.get(stat_info, hash_key)
+            size = hash_cache.get(stat_info, size_key)
+            if hash_value and size:
+                return hash_value, int(size)
+        return None
+
+    def __str__(self):
+        return 'file:{}'.format(self.name)
+
+
+class CompressedPathData(PathData):
+    """
+    PathData for the compressed copy of a file which is written the first time its size or contents are needed.
+    Can be passed to another process so small files are compressed by the upload worker that sends them.
+    """
+    def __init__(self, source_path, staged_path, compression_level, hash_cache, hash_algs, cache_keys):
+        """
+        :param source_path: str: path to the original file
+        :param staged_path: str: path to write the compressed file to
+        :param compression_level: int: gzip level from 1 (fastest) to 9 (smallest)
+        :param hash_cache: HashCache: cache to save the md5 and size of the compressed file in (None to skip)
+        :param hash_algs: [str]: hash algorithms to report for the compressed file
+        :param cache_keys: (str, str): hash cache algorithm names for the md5 and size of the compressed file
+        """
+        super(CompressedPathData, self).__init__(staged_path, hash_algs=hash_algs)
+        self.source_path = source_path
+        self.compression_level = compression_level
+        self.source_hash_cache = hash_cache
+        self.cache_keys = cache_keys
+        self.compressed_info = None
+
+    def stage(self):
+        """
+        Compress the original file into our path unless that has already been done.
+        :return: (str, int): md5 and size of the compressed file
+        """
+        if not self.compressed_info:
+            stat_info = os.stat(self.source_path)
+            self.compressed_info = compress_file(self.source_path, self.path, self.compression_level)
+            # Only cache the results if the file didn't change while we were reading it.
+            if self.source_hash_cache and PathData._same_stat(stat_info, os.stat(self.source_path)):
+                hash_value, size = self.compressed_info
+                hash_key, size_key = self.cache_keys
+                self.source_hash_cache.set(stat_info, hash_key, hash_value)
+                self.source_hash_cache.set(stat_info, size_key, str(size))
+        return self.compressed_info
+
+    def size(self):
+        return self.stage()[1]
+
+    def get_cached_hash(self, hash_alg=None):
+        """
+        The md5 is found while compressing so only other hash algorithms need to read the compressed file.
+        """
+        hash_alg = hash_alg or HashUtil.HASH_NAME
+        if hash_alg == HashUtil.HASH_NAME:
+            return HashData(hash_alg, self.stage()[0])
+        return None
+
+    def read_whole_file(self):
+        self.stage()
+        return super(CompressedPathData, self).read_whole_file()
+
+    def _hash_file(self, hash_algs):
+        self.stage()
+        return super(CompressedPathData, self)._hash_file(hash_algs)
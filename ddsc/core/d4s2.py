@@ -197,27 +197,17 @@ class D4S2Project(object):
         self.remote_store = remote_store
         self.print_func = print_func
 
-    def share(self, project_name, to_user, force_send, auth_role):
+    def share(self, project, to_user, force_send, auth_role):
         """
         Send mail and give user specified access to the project.
-        :param project_name: str name of the project to share
+        :param project: RemoteProject project to share
         :param to_user: RemoteUser user to receive email/access
         :param auth_role: str project role eg 'project_admin' to give to the user
         :return: str email we share the project with
         """
-        project = self.fetch_remote_project(project_name, must_exist=True)
         self.set_user_project_permission(project, to_user, auth_role)
         return self._share_project(D4S2Api.SHARE_DESTINATION, project, to_user, force_send, auth_role)
 
-    def fetch_remote_project(self, project_name, must_exist=False):
-        """
-        Download project metadata from a remote store.
-        :param project_name: str project to download
-        :param must_exist: bool is it ok if the project doesn't exist
-        :return: RemoteProject
-        """
-        return self.remote_store.fetch_remote_project(project_name, must_exist=must_exist)
-
     def set_user_project_permission(self, project, user, auth_role):
         """
         Give user access permissions for a project.
@@ -227,21 +217,20 @@ class D4S2Project(object):
         """
         self.remote_store.set_user_project_permission(project, user, auth_role)
 
-    def deliver(self, project_name, new_project_name, to_user, force_send, path_filter):
+    def deliver(self, project, new_project_name, to_user, force_send, path_filter):
         """
-        Remove access to project_name for to_user, copy to new_project_name if not None,
+        Remove access to project for to_user, copy to new_project_name if not None,
         send message to service to email user so they can have access.
-        :param project_name: str name of the pre-existing project
-        :param new_project_name: str name of non-existing project to copy project_name to, if None we don't copy
+        :param project: RemoteProject pre-existing project to deliver
+        :param new_project_name: str name of non-existing project to copy project to, if None we don't copy
         :param to_user: RemoteUser user we are handing over the project to
         :param force_send: boolean enables resending of email for existing projects
         :param path_filter: PathFilter: filters what files are shared
         :return: str email we sent deliver to
         """
-        project = self.fetch_remote_project(project_name, must_exist=True)
         self.remove_user_permission(project, to_user)
         if new_project_name:
-            project = self._copy_project(project_name, new_project_name, path_filter)
+            project = self._copy_project(project, new_project_name, path_filter)
         return self._share_project(D4S2Api.DELIVER_DESTINATION, project, to_user, force_send)
 
     def remove_user_permission(self, project, user):
@@ -271,10 +260,10 @@ class D4S2Project(object):
         sent = item.send(self.api, force_send)
         return to_user.email
 
-    def _copy_project(self, project_name, new_project_name, path_filter):
+    def _copy_project(self, project, new_project_name, path_filter):
         """
-        Copy pre-existing project with name project_name to non-existing project new_project_name.
-        :param project_name: str project to copy from
+        Copy pre-existing project to non-existing project new_project_name.
+        :param project: RemoteProject project to copy from
         :param new_project_name: str project to copy to
         :param path_filter: PathFilter: filters what files are shared
         :return: RemoteProject new project we copied data to
@@ -283,20 +272,20 @@ class D4S2Project(object):
         remote_project = self.remote_store.fetch_remote_project(new_project_name)
         if remote_project:
             raise ValueError("A project with name '{}' already exists.".format(new_project_name))
-        self._download_project(project_name, temp_directory, path_filter)
-        self._upload_project(new_project_name, temp_directory)
+        self._download_project(project, temp_directory, path_filter)
+        new_project_id = self._upload_project(new_project_name, temp_directory)
         shutil.rmtree(temp_directory)
-        return self.remote_store.fetch_remote_project(new_project_name, must_exist=True)
+        return self.remote_store.fetch_remote_project_by_id(new_project_id)
 
-    def _download_project(self, project_name, temp_directory, path_filter):
+    def _download_project(self, project, temp_directory, path_filter):
         """
-        Download the project with project_name to temp_directory.
-        :param project_name: str name of the pre-existing project
+        Download the project to temp_directory.
+        :param project: RemoteProject pre-existing project
         :param temp_directory: str path to directory we can download into
         :param path_filter: PathFilter: filters what files are shared
         """
-        self.print_func("Downloading a copy of '{}'.".format(project_name))
-        downloader = ProjectDownload(self.remote_store, project_name, temp_directory, path_filter)
+        self.print_func("Downloading a copy of '{}'.".format(project.name))
+        downloader = ProjectDownload(self.remote_store, project, temp_directory, path_filter)
         downloader.run()
 
     def _upload_project(self, project_name, temp_directory):
@@ -304,8 +293,13 @@ class D4S2Project(object):
         Upload the contents of temp_directory into project_name
         :param project_name: str project name we will upload files to
         :param temp_directory: str path to directory who's files we will upload
+        :return: str uuid of the project we uploaded to
         """
         self.print_func("Uploading to '{}'.".format(project_name))
         items_to_send = [os.path.join(temp_directory, item) for item in os.listdir(os.path.abspath(temp_directory))]
         project_upload = ProjectUpload(self.config, project_name, items_to_send)
-        project_upload.run()
+        try:
+            project_upload.run()
+        finally:
+            project_upload.cleanup()
+        return project_upload.local_project.remote_id
@@ -432,6 +432,20 @@ class DataServiceApi(object):
         }
         return self._put("/uploads/" + upload_id + "/complete", data, content_type=ContentType.form)
 
+    def report_upload_hash(self, upload_id, hash_value, hash_alg):
+        """
+        Report an additional hash for the contents of an upload.
+        :param upload_id: str uuid of the upload
+        :param hash_value: str hash value of the entire upload
+        :param hash_alg: str algorithm used to create hash
+        :return: requests.Response containing the successful result
+        """
+        data = {
+            "hash[value]": hash_value,
+            "hash[algorithm]": hash_alg
+        }
+        return self._put("/uploads/" + upload_id + "/hashes", data, content_type=ContentType.form)
+
     def create_file(self, parent_kind, parent_id, upload_id):
         """
         Create a new file after completing an upload.
@@ -1,32 +1,41 @@
 import os
+from multiprocessing.pool import ThreadPool
 from ddsc.core.util import ProgressPrinter
-from ddsc.core.filedownloader import FileDownloader
+from ddsc.core.filedownloader import FileDownloader, DownloadHashMismatch
 from ddsc.core.pathfilter import PathFilteredProject
+from ddsc.core.ratelimit import install_rate_limiter
+from ddsc.core.autotune import create_worker_autotuner, DOWNLOAD_TRANSFER
+from ddsc.core.bundle import is_bundle, is_bundle_manifest, extract_bundle
+from ddsc.core.compression import is_compressed, decompress_file
 
 
 class ProjectDownload(object):
     """
     Creates local version of remote content.
     """
-    def __init__(self, remote_store, project_name, dest_directory, path_filter):
+    def __init__(self, remote_store, project, dest_directory, path_filter):
         """
         Setup for downloading a remote project.
         :param remote_store: RemoteStore: which remote store to download the project from
-        :param project_name: str: name of the project to download
+        :param project: RemoteProject: project to download (children are fetched when run)
         :param dest_directory: str: path to where we will save the project contents
         :param path_filter: PathFilter: determines which files will be downloaded
         """
         self.remote_store = remote_store
-        self.project_name = project_name
+        self.project = project
         self.dest_directory = dest_directory
         self.path_filter = path_filter
         self.watcher = None
+        self.url_prefetcher = None
+        self.autotuner = None
 
     def run(self):
         """
-        Download the contents of the specified project_name to dest_directory.
+        Download the contents of the specified project to dest_directory.
         """
-        remote_project = self.remote_store.fetch_remote_project(self.project_name, must_exist=True)
+        install_rate_limiter(self.remote_store.config)
+        remote_project = self.remote_store.fetch_remote_project_by_id(self.project.id, include_children=True,
+                                                                      include_paths=self.path_filter.include_paths)
         self.walk_project(remote_project)
 
     def walk_project(self, project):
@@ -39,8 +48,17 @@ class ProjectDownload(object):
         path_filtered_project.run(project) # calls visit_project, visit_folder, visit_file in RemoteContentCounter
 
         self.watcher = ProgressPrinter(counter.count, msg_verb='downloading')
-        path_filtered_project = PathFilteredProject(self.path_filter, self)
-        path_filtered_project.run(project)  # calls visit_project, visit_folder, visit_file below
+        config = self.remote_store.config
+        self.url_prefetcher = FileUrlPrefetcher(self.remote_store.data_service, counter.files,
+                                                config.download_url_prefetch)
+        self.autotuner = create_worker_autotuner(config, DOWNLOAD_TRANSFER, config.download_workers)
+        try:
+            path_filtered_project = PathFilteredProject(self.path_filter, self)
+            path_filtered_project.run(project)  # calls visit_project, visit_folder, visit_file below
+        finally:
+            self.url_prefetcher.close()
+            if self.autotuner:
+                self.autotuner.save()
         self.watcher.finished()
         warnings = self.check_warnings()
         if warnings:
@@ -76,12 +94,39 @@ class ProjectDownload(object):
     def visit_file(self, item, parent):
         """
         Download the file associated with item and make sure we received all of it.
+        Retries the download when the file doesn't match the hash stored in the data service.
+        Bundles are unpacked into a folder and their manifests are not downloaded.
+        Files uploaded compressed are decompressed to their original name.
         :param item: RemoteFile file we will download
         :param parent: RemoteProject/RemoteFolder parent of item
         """
+        if is_bundle_manifest(item.name):
+            return
         path = os.path.join(self.dest_directory, item.remote_path)
-        url_json = self.remote_store.data_service.get_file_url(item.id).json()
-        downloader = FileDownloader(self.remote_store.config, item, url_json, path, self.watcher)
+        retries = self.remote_store.config.download_retries
+        while True:
+            try:
+                self.download_file(item, path)
+                if is_bundle(item.name):
+                    extract_bundle(path)
+                elif is_compressed(item.name):
+                    decompress_file(path)
+                return
+            except DownloadHashMismatch as ex:
+                if retries <= 0:
+                    raise
+                retries -= 1
+                self.watcher.show_warning('\n{} Retrying.'.format(ex))
+
+    def download_file(self, item, path):
+        """
+        Download a single file and make sure we received all of it.
+        The first attempt uses a prefetched url, retries fetch a new url.
+        :param item: RemoteFile file we will download
+        :param path: str: path where we will save the file
+        """
+        url_json = self.url_prefetcher.get_url(item)
+        downloader = FileDownloader(self.remote_store.config, item, url_json, path, self.watcher, self.autotuner)
         downloader.run()
         ProjectDownload.check_file_size(item, path)
 
@@ -105,9 +150,67 @@ class ProjectDownload(object):
         return None
 
 
+class FileUrlPrefetcher(object):
+    """
+    Fetches download urls in background threads for the files after the one currently being downloaded.
+    The data service requires a request per file url so this keeps that latency out of the way of small files.
+    Urls expire so only prefetch_count files ahead are fetched.
+    """
+    def __init__(self, data_service, remote_files, prefetch_count):
+        """
+        :param data_service: DataServiceApi: used to fetch file urls
+        :param remote_files: [RemoteFile]: files in the order they will be downloaded
+        :param prefetch_count: int: how many files ahead to fetch urls for (0 disables prefetching)
+        """
+        self.data_service = data_service
+        self.remote_files = remote_files
+        self.prefetch_count = prefetch_count
+        self.file_id_to_index = dict((remote_file.id, index) for index, remote_file in enumerate(remote_files))
+        self.next_index = 0
+        self.pending = {}
+        self.pool = None
+        if prefetch_count > 0:
+            self.pool = ThreadPool(prefetch_count)
+
+    def get_url(self, remote_file):
+        """
+        Returns url details for downloading remote_file starting prefetches for the files after it.
+        Only the first call for a file can use a prefetched url, later calls fetch a new url.
+        :param remote_file: RemoteFile: file we are about to download
+        :return: dict: url details ('http_verb','host','url','http_headers')
+        """
+        self._prefetch_after(remote_file)
+        pending_result = self.pending.pop(remote_file.id, None)
+        if pending_result:
+            return pending_result.get()
+        return self._fetch_url(remote_file.id)
+
+    def _prefetch_after(self, remote_file):
+        index = self.file_id_to_index.get(remote_file.id)
+        if self.pool and index is not None:
+            self.next_index = max(self.next_index, index + 1)
+            stop_index = min(index + 1 + self.prefetch_count, len(self.remote_files))
+            while self.next_index < stop_index:
+                file_id = self.remote_files[self.next_index].id
+                self.pending[file_id] = self.pool.apply_async(self._fetch_url, (file_id,))
+                self.next_index += 1
+
+    def _fetch_url(self, file_id):
+        return self.data_service.get_file_url(file_id).json()
+
+    def close(self):
+        """
+        Stop the background threads waiting for any requests in progress.
+        """
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
 class RemoteContentCounter(object):
     """
-    Counts up how many bytes we have to download to retrieve the entire project.
+    Counts up how many bytes we have to download to retrieve the entire project and records which files.
     """
     def __init__(self, project):
         """
@@ -115,6 +218,7 @@ class RemoteContentCounter(object):
         :param project: LocalProject project who's contents we want to walk/count.
         """
         self.count = 0
+        self.files = []
         self.project = project
 
     def visit_project(self, item):
@@ -132,4 +236,6 @@ class RemoteContentCounter(object):
         :param parent: RemoteProject/RemoteFolder parent of item
         :return:
         """
-        self.count += item.size
\ No newline at end of file
+        if not is_bundle_manifest(item.name):
+            self.count += item.size
+            self.files.append(item)
\ No newline at end of file
@@ -1,23 +1,62 @@
 """
 Downloads a file based on ranges.
 """
+import os
 import math
-import tempfile
+import time
+import ctypes
+import threading
 import requests
-from multiprocessing import Process, Queue
+from multiprocessing import Process, Queue, Value
+try:
+    from queue import Queue as ThreadQueue
+except ImportError:
+    from Queue import Queue as ThreadQueue
 from ddsc.core.util import ProgressQueue, wait_for_processes
+from ddsc.core.localstore import HashUtil
+from ddsc.core.ratelimit import get_rate_limiter, set_rate_limiter, limit_transfer
+from ddsc.config import DOWNLOAD_ALLOCATION_SPARSE, DOWNLOAD_ALLOCATION_SEQUENTIAL
 
 DOWNLOAD_FILE_CHUNK_SIZE = 20 * 1024 * 1024
 MIN_DOWNLOAD_CHUNK_SIZE = DOWNLOAD_FILE_CHUNK_SIZE
+VERIFY_HASH_BLOCK_SIZE = 1024 * 1024
+MIN_DOWNLOAD_RANGE_SIZE = 4 * 1024 * 1024
+MAX_DOWNLOAD_RANGE_SIZE = 256 * 1024 * 1024
+TARGET_RANGE_SECONDS = 10.0
+THROUGHPUT_SMOOTHING = 0.5
+PARTIAL_DOWNLOAD_SUFFIX = '.ddsclient_partial'
+# smaller reads when bandwidth is limited so workers take turns instead of transferring large bursts
+RATE_LIMITED_READ_SIZE = 256 * 1024
+# binary mode flag needed for os.open on Windows
+O_BINARY = getattr(os, 'O_BINARY', 0)
+
+# Used for files downloaded in this process so connections are kept alive from one file to the next.
+# Worker processes create their own session so they never share a connection with this process.
+requests_session = requests.Session()
+
+
+class DownloadHashMismatch(ValueError):
+    """
+    Raised when the contents of a downloaded file do not match the hash stored in the data service.
+    """
+    pass
 
 
 class FileDownloader(object):
     """
-    Downloads a file using a number of worker processes who download different ranges.
+    Downloads a file using a number of worker processes who claim ranges of the file from a DownloadRangeQueue.
+    Files that only need a single worker are downloaded in this process avoiding process and connection setup.
     Creates an empty file.
-    Each worker seeks to their spot and streams the data from their url data into the file.
+    Each worker seeks to the start of the range it claimed and streams the data from the url into the file.
+    Workers size their ranges from their own throughput so a slow connection never holds up a large part of the file.
+    When the data service has an md5 for the file the result is verified.
+    A file downloaded by a single worker is hashed while it streams,
+    otherwise ranges arrive out of order so the finished file is hashed in one sequential pass.
+    Data is written to partial_path which is renamed to path once the download is complete,
+    so a partially downloaded file never appears under its final name.
+    When given a WorkerAutotuner it chooses the number of workers and is told how each download went.
     """
-    def __init__(self, config, remote_file, url_parts, path, watcher):
+    def __init__(self, config, remote_file, url_parts, path, watcher, autotuner=None):
         """
         Setup details on what to download and watcher to notify of progress.
         :param config: Config: configuration settings for download (number workers)
@@ -25,6 +64,7 @@ class FileDownloader(object):
         :param url_parts: dictionary of fields related to url ('http_verb','host','http_headers') received from duke_data_service
         :param path: str: path to where we will save the file
         :param watcher: ProgressPrinter: we notify of our progress
+        :param autotuner: WorkerAutotuner: optional tuner that overrides config.download_workers
         """
         self.config = config
         self.remote_file = remote_file
@@ -32,7 +72,7 @@ class FileDownloader(object):
         self.url_parts = url_parts
         self.path = path
         self.watcher = watcher
-        self.file_parts = []
+        self.autotuner = autotuner
 
     @property
     def http_verb(self):
@@ -53,125 +93,384 @@ class FileDownloader(object):
     def http_headers(self):
         return self.url_parts['http_headers']
 
-    def make_ranges(self):
+    @property
+    def partial_path(self):
         """
-        Divides file size into an array of ranges to be downloaded by workers.
-        :return: [(int,int)]: array of (start, end) tuples
+        Returns the path the file is written to until the download is complete.
         """
-        size = int(self.file_size)
-        bytes_per_chunk = self.determine_bytes_per_chunk()
-        start = 0
-        ranges = []
-        while size > 0:
-            amount = bytes_per_chunk
-            if amount > size:
-                amount = size
-            ranges.append((start, start + amount - 1))
-            start += amount
-            size -= amount
-        return ranges
-
-    def determine_bytes_per_chunk(self):
-        """
-        Calculate the size of chunk a worker should download.
-        The last worker may download less than this depending on file size.
-        :return: int: byte size for a worker
+        return self.path + PARTIAL_DOWNLOAD_SUFFIX
+
+    def determine_num_workers(self):
+        """
+        Calculate how many workers should download this file.
+        Files smaller than MIN_DOWNLOAD_CHUNK_SIZE per worker use fewer workers.
+        The sequential allocation strategy always uses a single worker so the file is written in order.
+        :return: int: number of worker processes (0 for an empty file)
         """
         workers = self.config.download_workers
-        if not workers or workers == 'None':
+        if self.autotuner:
+            workers = self.autotuner.workers
+        if not workers or workers == 'None' or self.config.download_allocation == DOWNLOAD_ALLOCATION_SEQUENTIAL:
             workers = 1
         size = int(self.file_size)
-        bytes_per_chunk = int(math.ceil(size / float(workers)))
-        if bytes_per_chunk < MIN_DOWNLOAD_CHUNK_SIZE:
-            bytes_per_chunk = MIN_DOWNLOAD_CHUNK_SIZE
-        return bytes_per_chunk
+        useful_workers = int(math.ceil(size / float(MIN_DOWNLOAD_CHUNK_SIZE)))
+        return min(workers, useful_workers)
 
     def run(self):
         """
         Download a file using separate processes.
         """
-        self.file_parts = []
-        ranges = self.make_ranges()
+        num_workers = self.determine_num_workers()
+        start_time = time.time()
+        try:
+            self.download_partial_file(num_workers)
+        except:
+            self.remove_partial_file()
+            if self.autotuner:
+                self.autotuner.record_error()
+            raise
+        if self.autotuner:
+            self.autotuner.record_transfer(int(self.file_size), time.time() - start_time, num_workers)
+        self.move_partial_file()
+
+    def download_partial_file(self, num_workers):
+        """
+        Download the file to partial_path verifying the result.
+        :param num_workers: int: number of workers to download the file with
+        """
+        expected_hash = self.get_expected_hash()
+        stream_hash_alg = None
+        if expected_hash and num_workers == 1:
+            stream_hash_alg = HashUtil.HASH_NAME
+        range_queue = DownloadRangeQueue(int(self.file_size), num_workers)
         processes = []
-        progress_queue = ProgressQueue(Queue())
+        inline_thread = None
         self.make_big_empty_file()
-        for range_start, range_end in ranges:
-            (temp_handle, temp_path) = tempfile.mkstemp()
-            self.file_parts.append(temp_path)
-            processes.append(self.make_and_start_process(range_start, range_end, progress_queue))
-        wait_for_processes(processes, int(self.file_size), progress_queue, self.watcher, self.remote_file)
+        if num_workers == 1:
+            progress_queue = ProgressQueue(ThreadQueue())
+            # download on a thread so we can report progress while the file downloads
+            inline_thread = threading.Thread(target=download_inline,
+                                             args=(self.url, self.get_range_http_headers(), self.partial_path,
+                                                   range_queue, progress_queue, stream_hash_alg))
+            inline_thread.daemon = True
+            inline_thread.start()
+        else:
+            progress_queue = ProgressQueue(Queue())
+            for _ in range(num_workers):
+                processes.append(self.make_and_start_process(range_queue, progress_queue, stream_hash_alg))
+        hashes = wait_for_processes(processes, int(self.file_size), progress_queue, self.watcher, self.remote_file)
+        if inline_thread:
+            inline_thread.join()
+        if expected_hash:
+            self.verify_hash(expected_hash, hashes)
+
+    def remove_partial_file(self):
+        """
+        Remove the partially downloaded file if it exists.
+        """
+        try:
+            os.remove(self.partial_path)
+        except OSError:
+            pass
+
+    def move_partial_file(self):
+        """
+        Rename the completed download to its final name replacing any existing file.
+        """
+        replace_file(self.partial_path, self.path)
+
+    def get_expected_hash(self):
+        """
+        Returns the md5 we should check the downloaded file against.
+        :return: str: md5 hex digest or None if verification is disabled or the data service has no md5
+        """
+        if self.config.verify_downloads:
+            return self.remote_file.hashes.get(HashUtil.HASH_NAME)
+        return None
+
+    def verify_hash(self, expected_hash, hashes):
+        """
+        Raise DownloadHashMismatch if the downloaded file doesn't match expected_hash.
+        :param expected_hash: str: md5 hex digest from the data service
+        :param hashes: [(str, str)]: (hash_alg, hash_value) calculated while streaming (empty if not calculated)
+        """
+        if hashes:
+            hash_alg, hash_value = hashes[0]
+        else:
+            hash_util = HashUtil()
+            hash_util.add_file(self.partial_path, block_size=VERIFY_HASH_BLOCK_SIZE)
+            hash_alg, hash_value = hash_util.hexdigest()
+        if hash_value != expected_hash:
+            format_str = "Error occurred downloading {}. Got {} {}. Expected {}."
+            raise DownloadHashMismatch(format_str.format(self.path, hash_alg, hash_value, expected_hash))
 
     def make_big_empty_file(self):
         """
-        Write out a empty file so the workers can seek to where they should write and write their data.
+        Write out a empty file so the workers can write their ranges into it.
+        The space allocated depends on the download_allocation config setting:
+        fallocate - disk space for the whole file is allocated up front (falls back to sparse if unsupported)
+        sparse - a sparse file of the full size is created
+        sequential - an empty file is created and the single worker appends to it
         """
-        with open(self.path, "wb") as outfile:
-            if self.file_size > 0:
-                outfile.seek(int(self.file_size) - 1)
-                outfile.write(b'\0')
+        size = int(self.file_size)
+        allocation = self.config.download_allocation
+        fd = os.open(self.partial_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | O_BINARY, 0o666)
+        try:
+            if size > 0 and allocation != DOWNLOAD_ALLOCATION_SEQUENTIAL:
+                if allocation == DOWNLOAD_ALLOCATION_SPARSE or not preallocate_file(fd, size):
+                    os.lseek(fd, size - 1, os.SEEK_SET)
+                    os.write(fd, b'\0')
+        finally:
+            os.close(fd)
 
-    def make_and_start_process(self, range_start, range_end, progress_queue):
+    def get_range_http_headers(self):
         """
-        Create a process that will download the specified range and notify progress_queue of progress or errors.
-        :param range_start: int: file offset to download
-        :param range_end: int: file ending offset to download
-        :param progress_queue: ProgressQueue: queue to notify as we make progress
-        :return: Process: the process we created
+        Returns headers to send with each range request (a Range header is added for each range).
+        :return: dict: http headers
         """
-        http_headers = {'Range': 'bytes={}-{}'.format(range_start, range_end)}
+        http_headers = {}
         if self.http_headers:
             http_headers.update(self.http_headers)
-        seek_amt = range_start
+        return http_headers
+
+    def make_and_start_process(self, range_queue, progress_queue, hash_alg=None):
+        """
+        Create a process that will download ranges claimed from range_queue and notify progress_queue of progress or errors.
+        :param range_queue: DownloadRangeQueue: shared source of ranges to download
+        :param progress_queue: ProgressQueue: queue to notify as we make progress
+        :param hash_alg: str: name of hash algorithm the process should report for the data (None to skip hashing)
+        :return: Process: the process we created
+        """
         process = Process(target=download_async,
-                          args=(self.url, http_headers, self.path, seek_amt, progress_queue))
+                          args=(self.url, self.get_range_http_headers(), self.partial_path, range_queue, progress_queue,
+                                hash_alg, get_rate_limiter()))
         process.start()
         return process
 
 
-def download_async(url, headers, path, seek_amt, progress_queue):
+def preallocate_file(fd, size):
+    """
+    Allocate disk space for a file so parallel writes don't fragment it.
+    :param fd: int: file descriptor open for writing
+    :param size: int: size the file should be
+    :return: bool: True if space was allocated, False if this platform or filesystem doesn't support it
+    """
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return True
+        except OSError:
+            pass  # filesystem doesn't support fallocate
+    return False
+
+
+def replace_file(source_path, dest_path):
+    """
+    Rename source_path to dest_path replacing dest_path if it exists.
+    :param source_path: str: path to the file to rename
+    :param dest_path: str: new path for the file
+    """
+    if hasattr(os, 'replace'):
+        os.replace(source_path, dest_path)
+    else:
+        # python 2 on Windows can't rename over an existing file
+        if os.name == 'nt' and os.path.exists(dest_path):
+            os.remove(dest_path)
+        os.rename(source_path, dest_path)
+
+
+def write_at(fd, data, offset):
+    """
+    Write all of data to a file descriptor at offset.
+    Uses pwrite where available so the file position isn't shared state.
+    :param fd: int: file descriptor open for writing
+    :param data: bytes: data to write
+    :param offset: int: position in the file to write data
+    """
+    view = memoryview(data)
+    while view:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, view, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+class DownloadRangeQueue(object):
+    """
+    Hands out ranges of a file to download workers from an offset shared between processes.
+    Fast workers come back for ranges more often so no range is tied to a slow connection ahead of time.
+    Ranges are limited to an even share of what remains so workers finish at about the same time.
+    """
+    def __init__(self, file_size, num_workers):
+        """
+        :param file_size: int: size of the file being downloaded
+        :param num_workers: int: number of workers that will claim ranges
+        """
+        self.file_size = file_size
+        self.num_workers = max(num_workers, 1)
+        self.next_offset = Value(ctypes.c_longlong, 0)
+
+    def claim(self, range_size):
+        """
+        Claim the next range of the file.
+        :param range_size: int: number of bytes the worker would like to download
+        :return: (int, int): inclusive (start, end) offsets or None when the whole file has been claimed
+        """
+        with self.next_offset.get_lock():
+            start = self.next_offset.value
+            remaining = self.file_size - start
+            if remaining <= 0:
+                return None
+            fair_share = max(int(math.ceil(remaining / float(self.num_workers))), MIN_DOWNLOAD_RANGE_SIZE)
+            amount = min(range_size, fair_share, remaining)
+            self.next_offset.value = start + amount
+        return start, start + amount - 1
+
+
+class DownloadThroughput(object):
     """
-    Called in separate process to download a chunk of a file.
+    Estimates the throughput of a single connection to determine how large a range it should claim next.
+    Ranges are sized to take about TARGET_RANGE_SECONDS to download.
+    """
+    def __init__(self):
+        self.bytes_per_second = None
+
+    def add_sample(self, num_bytes, seconds):
+        """
+        Update the estimate with the time taken to download a range.
+        :param num_bytes: int: size of the range
+        :param seconds: float: time it took to download the range
+        """
+        if seconds <= 0:
+            return
+        rate = num_bytes / seconds
+        if self.bytes_per_second is None:
+            self.bytes_per_second = rate
+        else:
+            self.bytes_per_second = THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * self.bytes_per_second
+
+    def next_range_size(self):
+        """
+        Returns the number of bytes to claim for the next range.
+        :return: int: range size between MIN_DOWNLOAD_RANGE_SIZE and MAX_DOWNLOAD_RANGE_SIZE
+        """
+        if self.bytes_per_second is None:
+            return MIN_DOWNLOAD_RANGE_SIZE
+        range_size = int(self.bytes_per_second * TARGET_RANGE_SECONDS)
+        return min(max(range_size, MIN_DOWNLOAD_RANGE_SIZE), MAX_DOWNLOAD_RANGE_SIZE)
+
+
+def download_async(url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
+    """
+    Called in separate process to download ranges of a file.
     :param url: str: url to file we should download
-    :param headers: dict: header to use with url, should contain Range to limit what we download
-    :param path: str: path to where we should save our chunk we download
-    :param seek_amt: int: offset to seek before writing our chunk out to path
+    :param headers: dict: headers to use with url, a Range header is added for each range we download
+    :param path: str: path to where we should save the ranges we download
+    :param range_queue: DownloadRangeQueue: shared source of ranges to download
     :param progress_queue: ProgressQueue: queue of tuples we will add progress/errors to
+    :param hash_alg: str: name of hash algorithm to report for the data (None to skip hashing)
+    :param rate_limiter: TokenBucket: limits bandwidth shared with other workers (None for no limit)
     :return:
     """
-    downloader = ChunkDownloader(url, headers, path, seek_amt, progress_queue)
+    set_rate_limiter(rate_limiter)
+    downloader = RangeDownloader(url, headers, path, range_queue, progress_queue, hash_alg)
     downloader.run()
 
 
-class ChunkDownloader(object):
+def download_inline(url, headers, path, range_queue, progress_queue, hash_alg=None):
     """
-    Downloads part of a file and writes it to a location in a local pre-existing file.
+    Download ranges of a file on a thread in this process reusing the connections in requests_session.
+    Errors are reported to progress_queue as the last thing it receives so the file is closed by then.
+    Takes the same parameters as download_async.
+    """
+    downloader = RangeDownloader(url, headers, path, range_queue, progress_queue, hash_alg, session=requests_session)
+    downloader.run()
+
+
+class RangeDownloader(object):
+    """
+    Downloads ranges of a file and writes them to their location in a local pre-existing file.
+    Keeps claiming ranges sized from its measured throughput until the whole file has been claimed.
     This runs in a separate process from the main application.
     """
-    def __init__(self, url, http_headers, path, seek_amt, progress_queue):
+    def __init__(self, url, http_headers, path, range_queue, progress_queue, hash_alg=None, session=None):
         """
-        Setup for downloading part of a file.
+        Setup for downloading ranges of a file.
         :param url: str: url to the file
-        :param http_headers: dict: headers for use with the url should contain byte Range
+        :param http_headers: dict: headers for use with the url
         :param path: str: path to file to write data to
-        :param seek_amt: int: offset amount to seek into the file
+        :param range_queue: DownloadRangeQueue: shared source of ranges to download
         :param progress_queue: ProgressQueue: queue we notify of progress or errors
+        :param hash_alg: str: name of hash algorithm to report for the data (only valid for a single worker)
+        :param session: requests.Session: session to download with (a new session is created when None)
         """
         self.url = url
         self.http_headers = http_headers
         self.path = path
-        self.seek_amt = seek_amt
+        self.range_queue = range_queue
         self.progress_queue = progress_queue
+        self.hash_alg = hash_alg
+        self.session = session
+        self.hash_util = None
+        self.pending_amt = 0
 
     def run(self):
         try:
-            response = requests.get(self.url, headers=self.http_headers, stream=True)
-            # open file for read/write without truncating
-            with open(self.path, 'r+b') as outfile:
-                outfile.seek(self.seek_amt)
-                for chunk in response.iter_content(chunk_size=DOWNLOAD_FILE_CHUNK_SIZE):
-                    if chunk:  # filter out keep-alive chunks
-                        outfile.write(chunk)
-                        self.progress_queue.processed(len(chunk))
+            if self.hash_alg:
+                self.hash_util = HashUtil(self.hash_alg)
+            session = self.session
+            if not session:
+                session = requests.Session()
+            throughput = DownloadThroughput()
+            # open file for writing without truncating
+            fd = os.open(self.path, os.O_WRONLY | O_BINARY)
+            try:
+                claimed_range = self.range_queue.claim(throughput.next_range_size())
+                while claimed_range:
+                    range_start, range_end = claimed_range
+                    start_time = time.time()
+                    self.download_range(session, fd, range_start, range_end)
+                    throughput.add_sample(range_end - range_start + 1, time.time() - start_time)
+                    claimed_range = self.range_queue.claim(throughput.next_range_size())
+            finally:
+                os.close(fd)
+            # progress for the last chunk is held back so the hash arrives before the download looks complete
+            if self.hash_util:
+                self.progress_queue.hashed(*self.hash_util.hexdigest())
+            if self.pending_amt:
+                self.progress_queue.processed(self.pending_amt)
         except Exception as ex:
             self.progress_queue.error(str(ex))
 
+    def download_range(self, session, fd, range_start, range_end):
+        """
+        Download a single range of the file writing it to fd.
+        :param session: requests.Session: session reused for each range so the connection is kept alive
+        :param fd: int: file descriptor opened for writing
+        :param range_start: int: file offset to download
+        :param range_end: int: file ending offset to download
+        """
+        http_headers = {'Range': 'bytes={}-{}'.format(range_start, range_end)}
+        http_headers.update(self.http_headers)
+        response = session.get(self.url, headers=http_headers, stream=True)
+        received = 0
+        read_size = DOWNLOAD_FILE_CHUNK_SIZE
+        if get_rate_limiter():
+            read_size = RATE_LIMITED_READ_SIZE
+        for chunk in response.iter_content(chunk_size=read_size):
+            if chunk:  # filter out keep-alive chunks
+                limit_transfer(len(chunk))
+                write_at(fd, chunk, range_start + received)
+                if self.hash_util:
+                    self.hash_util.add_chunk(chunk)
+                if self.pending_amt:
+                    self.progress_queue.processed(self.pending_amt)
+                self.pending_amt = len(chunk)
+                received += len(chunk)
+        expected = range_end - range_start + 1
+        if received != expected:
+            format_str = "Error occurred downloading range {}-{}. Received {} bytes expected {}."
+            raise ValueError(format_str.format(range_start, range_end, received, expected))
@@ -3,10 +3,17 @@ Objects to upload a number of chunks from a file to a remote store as part of an
 """
 
 import math
-from multiprocessing import Process, Queue
+import time
+import ctypes
+from multiprocessing import Process, Queue, Value
 from ddsc.core.ddsapi import DataServiceAuth, DataServiceApi
 from ddsc.core.util import ProgressQueue, wait_for_processes
-from ddsc.core.localstore import HashData
+from ddsc.core.localstore import HashData, HashUtil
+from ddsc.core.ratelimit import get_rate_limiter, set_rate_limiter, limit_transfer
+
+CHUNKS_PER_WORKER = 4  # enough chunks that workers finish close together without many extra upload urls
+TARGET_CHUNK_SECONDS = 60.0  # with a measured throughput keep each chunk to about this long
+CHUNK_SIZE_ALIGNMENT = 1024 * 1024
 
 
 class FileUploader(object):
@@ -18,13 +25,15 @@ class FileUploader(object):
     3) Sends the complete message to finalize the 'upload'
     4) Sends create_file message to remote store with the 'upload' id
     """
-    def __init__(self, config, data_service, local_file, watcher):
+    def __init__(self, config, data_service, local_file, watcher, autotuner=None, bytes_per_second=None):
         """
         Setup for sending to remote store.
         :param config: ddsc.config.Config user configuration settings from YAML file/environment
         :param data_service: DataServiceApi data service we are sending the content to.
         :param local_file: LocalFile file we are sending to remote store
         :param watcher: ProgressPrinter we notify of our progress
+        :param autotuner: WorkerAutotuner optional tuner that overrides config.upload_workers
+        :param bytes_per_second: float throughput measured uploading a previous file (None if unknown)
         """
         self.config = config
         self.data_service = data_service
@@ -32,6 +41,8 @@ class FileUploader(object):
         self.local_file = local_file
         self.upload_id = None
         self.watcher = watcher
+        self.autotuner = autotuner
+        self.bytes_per_second = bytes_per_second
 
     def upload(self, project_id, parent_kind, parent_id):
         """
@@ -42,11 +53,13 @@ class FileUploader(object):
         :return: str uuid of the newly uploaded file
         """
         path_data = self.local_file.get_path_data()
-        hash_data = path_data.get_hash()
+        hash_data_list = path_data.get_hashes()
+        hash_data = HashData.find(hash_data_list, HashUtil.HASH_NAME)
         self.upload_id = self.upload_operations.create_upload(project_id, path_data, hash_data)
-        ParallelChunkProcessor(self).run()
+        self.bytes_per_second = ParallelChunkProcessor(self).run()
         parent_data = ParentData(parent_kind, parent_id)
-        return self.upload_operations.finish_upload(self.upload_id, hash_data, parent_data, self.local_file.remote_id)
+        return self.upload_operations.finish_upload(self.upload_id, hash_data, parent_data, self.local_file.remote_id,
+                                                    hash_data_list)
 
 
 class ParentData(object):
@@ -118,20 +131,35 @@ class FileUploadOperations(object):
         host = url_json['host']
         url = url_json['url']
         http_headers = url_json['http_headers']
+        limit_transfer(len(chunk))
         resp = self.data_service.send_external(http_verb, host, url, http_headers, chunk)
         if resp.status_code != 200 and resp.status_code != 201:
             raise ValueError("Failed to send file to external store. Error:" + str(resp.status_code))
 
-    def finish_upload(self, upload_id, hash_data, parent_data, remote_file_id):
+    def finish_upload(self, upload_id, hash_data, parent_data, remote_file_id, additional_hash_data_list=()):
         """
         Complete the upload and create or update the file.
         :param upload_id: str: uuid of the upload we are completing
         :param hash_data: HashData: hash info about the file
         :param parent_data: ParentData: info about the parent of this file
         :param remote_file_id: str: uuid of this file if it already exists or None if it is a new file
+        :param additional_hash_data_list: [HashData]: other hashes of the file to report (hash_data is skipped)
         :return: str: uuid of this file
         """
         self.data_service.complete_upload(upload_id, hash_data.value, hash_data.alg)
+        for additional_hash_data in additional_hash_data_list:
+            if additional_hash_data.alg != hash_data.alg:
+                self.data_service.report_upload_hash(upload_id, additional_hash_data.value, additional_hash_data.alg)
+        return self.create_or_update_file(upload_id, parent_data, remote_file_id)
+
+    def create_or_update_file(self, upload_id, parent_data, remote_file_id):
+        """
+        Create a new file or a new version of an existing file from a completed upload.
+        :param upload_id: str: uuid of the completed upload
+        :param parent_data: ParentData: info about the parent of this file
+        :param remote_file_id: str: uuid of this file if it already exists or None if it is a new file
+        :return: str: uuid of this file
+        """
         if remote_file_id:
             self.data_service.update_file(remote_file_id, upload_id)
             return remote_file_id
@@ -142,7 +170,8 @@ class FileUploadOperations(object):
 
 class ParallelChunkProcessor(object):
     """
-    Uploads grouped chunks in separate processes.
+    Uploads chunks in separate processes that pull chunks to send from a shared UploadChunkQueue.
+    The chunk size is chosen per file by choose_chunk_size.
     """
     def __init__(self, file_uploader):
         """
@@ -154,19 +183,69 @@ class ParallelChunkProcessor(object):
         self.upload_id = file_uploader.upload_id
         self.watcher = file_uploader.watcher
         self.local_file = file_uploader.local_file
+        self.autotuner = file_uploader.autotuner
+        self.bytes_per_second = file_uploader.bytes_per_second
 
     def run(self):
         """
         Sends contents of a local file to a remote data service.
+        :return: float bytes per second the file was uploaded at
         """
         processes = []
         progress_queue = ProgressQueue(Queue())
-        num_chunks = ParallelChunkProcessor.determine_num_chunks(self.config.upload_bytes_per_chunk,
-                                                                 self.local_file.size)
-        work_parcels = ParallelChunkProcessor.make_work_parcels(self.config.upload_workers, num_chunks)
-        for (index, num_items) in work_parcels:
-            processes.append(self.make_and_start_process(index, num_items, progress_queue))
-        wait_for_processes(processes, num_chunks, progress_queue, self.watcher, self.local_file)
+        upload_workers = self.config.upload_workers
+        if self.autotuner:
+            upload_workers = self.autotuner.workers
+        chunk_size = ParallelChunkProcessor.choose_chunk_size(self.local_file.size, upload_workers,
+                                                              self.config.upload_bytes_per_chunk,
+                                                              self.config.upload_max_bytes_per_chunk,
+                                                              self.config.upload_max_chunks, self.bytes_per_second)
+        num_chunks = ParallelChunkProcessor.determine_num_chunks(chunk_size, self.local_file.size)
+        # progress totals count the file in upload_bytes_per_chunk sized units
+        watcher = ChunkProgressWatcher(self.watcher, num_chunks,
+                                       self.local_file.count_chunks(self.config.upload_bytes_per_chunk))
+        chunk_queue = UploadChunkQueue(num_chunks)
+        num_processes = min(max(upload_workers or 1, 1), num_chunks)
+        start_time = time.time()
+        for _ in range(num_processes):
+            processes.append(self.make_and_start_process(chunk_size, chunk_queue, progress_queue))
+        try:
+            wait_for_processes(processes, num_chunks, progress_queue, watcher, self.local_file)
+        except:
+            if self.autotuner:
+                self.autotuner.record_error()
+            raise
+        seconds = time.time() - start_time
+        if self.autotuner:
+            self.autotuner.record_transfer(self.local_file.size, seconds, num_processes)
+        return self.local_file.size / max(seconds, 0.001)
+
+    @staticmethod
+    def choose_chunk_size(file_size, upload_workers, min_chunk_size, max_chunk_size, max_chunks,
+                          bytes_per_second=None):
+        """
+        Pick the chunk size to upload a file with.
+        Aims for CHUNKS_PER_WORKER chunks per worker so the file is spread across all workers,
+        using as few chunks (and therefore create upload url calls) as that allows.
+        When bytes_per_second is known chunks are kept to about TARGET_CHUNK_SECONDS for a single worker.
+        The result is between min_chunk_size and max_chunk_size unless that would exceed max_chunks.
+        :param file_size: int size of the file being uploaded
+        :param upload_workers: int number of processes that will upload chunks
+        :param min_chunk_size: int smallest chunk size to use
+        :param max_chunk_size: int largest chunk size to use (each worker holds a chunk in memory)
+        :param max_chunks: int most chunks the data service allows for a single upload
+        :param bytes_per_second: float throughput of all workers measured on a previous file (None if unknown)
+        :return: int chunk size in bytes
+        """
+        upload_workers = max(upload_workers or 1, 1)
+        chunk_size = int(math.ceil(float(file_size) / (upload_workers * CHUNKS_PER_WORKER)))
+        if bytes_per_second:
+            chunk_size = min(chunk_size, int(bytes_per_second / upload_workers * TARGET_CHUNK_SECONDS))
+        chunk_size = min(max(chunk_size, min_chunk_size), max_chunk_size)
+        chunk_size = max(chunk_size, int(math.ceil(float(file_size) / max_chunks)))
+        if chunk_size > min_chunk_size:
+            chunk_size = int(math.ceil(float(chunk_size) / CHUNK_SIZE_ALIGNMENT)) * CHUNK_SIZE_ALIGNMENT
+        return chunk_size
 
     @staticmethod
     def determine_num_chunks(chunk_size, file_size):
@@ -178,81 +257,100 @@ class ParallelChunkProcessor(object):
             return 1
         return int(math.ceil(float(file_size) / float(chunk_size)))
 
-    @staticmethod
-    def make_work_parcels(upload_workers, num_chunks):
-        """
-        Make groups so we can split up num_chunks into similar sizes.
-        Rounds up trying to keep work evenly split so sometimes it will not use all workers.
-        For very small numbers it can result in (upload_workers-1) total workers.
-        For example if there are two few items to distribute.
-        :param upload_workers: int target number of workers
-        :param num_chunks: int number of total items we need to send
-        :return [(index, num_items)] -  an array of tuples where array element will be in a separate process.
-        """
-        chunks_per_worker = int(math.ceil(float(num_chunks) / float(upload_workers)))
-        return ParallelChunkProcessor.divide_work(range(num_chunks), chunks_per_worker)
-
-    @staticmethod
-    def divide_work(list_of_indexes, batch_size):
+    def make_and_start_process(self, chunk_size, chunk_queue, progress_queue):
         """
-        Given a sequential list of indexes split them into num_parts.
-        :param list_of_indexes: [int] list of indexes to be divided up
-        :param batch_size: number of items to put in batch(not exact obviously)
-        :return: [(int,int)] list of (index, num_items) to be processed
-        """
-        grouped_indexes = [list_of_indexes[i:i + batch_size] for i in range(0, len(list_of_indexes), batch_size)]
-        return [(batch[0], len(batch)) for batch in grouped_indexes]
-
-    def make_and_start_process(self, index, num_items, progress_queue):
-        """
-        Create and start a process to upload num_items chunks from our file starting at index.
-        :param index: int offset into file(must be multiplied by upload_bytes_per_chunk to get actual location)
-        :param num_items: int number chunks to send
+        Create and start a process to upload chunks from our file it claims from chunk_queue.
+        :param chunk_size: int size of each chunk
+        :param chunk_queue: UploadChunkQueue shared source of chunk numbers to send
         :param progress_queue: ProgressQueue queue to send notifications of progress or errors
         """
         process = Process(target=upload_async,
                        args=(self.data_service.auth.get_auth_data(), self.config, self.upload_id,
-                             self.local_file.path, index, num_items, progress_queue))
+                             self.local_file.get_path_data().path, chunk_size, chunk_queue, progress_queue,
+                             get_rate_limiter()))
         process.start()
         return process
 
 
 def upload_async(data_service_auth_data, config, upload_id,
-                 filename, index, num_chunks_to_send, progress_queue):
+                 filename, chunk_size, chunk_queue, progress_queue, rate_limiter=None):
     """
     Method run in another process called from ParallelChunkProcessor.make_and_start_process.
     :param data_service_auth_data: tuple of auth data for rebuilding DataServiceAuth
     :param config: dds.Config configuration settings to use during upload
     :param upload_id: uuid unique id of the 'upload' we are uploading chunks into
     :param filename: str path to file who's contents we will be uploading
-    :param index: int offset into filename where we will start sending bytes from (must multiply by upload_bytes_per_chunk)
-    :param num_chunks_to_send: int number of chunks of config.upload_bytes_per_chunk size to send.
+    :param chunk_size: int size of each chunk
+    :param chunk_queue: UploadChunkQueue shared source of chunk numbers to send
     :param progress_queue: ProgressQueue queue to send notifications of progress or errors
+    :param rate_limiter: TokenBucket limits bandwidth shared with other workers (None for no limit)
     """
+    set_rate_limiter(rate_limiter)
     auth = DataServiceAuth(config)
     auth.set_auth_data(data_service_auth_data)
     data_service = DataServiceApi(auth, config.url)
-    sender = ChunkSender(data_service, upload_id, filename, config.upload_bytes_per_chunk, index, num_chunks_to_send,
-                         progress_queue)
+    sender = ChunkSender(data_service, upload_id, filename, chunk_size, chunk_queue, progress_queue)
     return sender.send()
 
 
+class UploadChunkQueue(object):
+    """
+    Hands out chunk numbers to upload workers from a counter shared between processes.
+    Fast workers come back for chunks more often so no chunk is tied to a slow connection ahead of time.
+    Each chunk is handed out exactly once so DukeDS only ever gets one upload url per chunk.
+    """
+    def __init__(self, num_chunks):
+        """
+        :param num_chunks: int number of chunks in the file
+        """
+        self.num_chunks = num_chunks
+        self.next_chunk = Value(ctypes.c_long, 0)
+
+    def claim(self):
+        """
+        Claim the next chunk to send.
+        :return: int chunk number or None when every chunk has been claimed
+        """
+        with self.next_chunk.get_lock():
+            chunk_num = self.next_chunk.value
+            if chunk_num < self.num_chunks:
+                self.next_chunk.value = chunk_num + 1
+                return chunk_num
+        return None
+
+
+class ChunkProgressWatcher(object):
+    """
+    Passes progress on to a watcher converting chunks sent into the units the watcher's total was counted in.
+    """
+    def __init__(self, watcher, num_chunks, num_units):
+        """
+        :param watcher: ProgressPrinter we pass progress on to
+        :param num_chunks: int number of chunks the file is actually sent in
+        :param num_units: int number of units the watcher expects for the file
+        """
+        self.watcher = watcher
+        self.units_per_chunk = float(num_units) / num_chunks
+
+    def transferring_item(self, item, increment_amt=1):
+        self.watcher.transferring_item(item, increment_amt=increment_amt * self.units_per_chunk)
+
+
 class ChunkSender(object):
     """
-    Receives an index and seeks to that part of the file to upload.
+    Claims a chunk number from a chunk queue and seeks to that part of the file to upload.
     Creates an upload url with the data_service.
     Uploads the bytes at that point in the file.
-    Repeats last two steps for each chunk it is supposed to send.
+    Repeats until the chunk queue has nothing left to send.
     """
-    def __init__(self, data_service, upload_id, filename, chunk_size, index, num_chunks_to_send, progress_queue):
+    def __init__(self, data_service, upload_id, filename, chunk_size, chunk_queue, progress_queue):
         """
-        Sends num_chunks_to_send from filename at offset index*chunk_size.
+        Sends chunks claimed from chunk_queue from filename at offset chunk_num*chunk_size.
         :param data_service: DataServiceApi remote service we will be uploading to
         :param upload_id: str upload uuid we are sending chunks part of
         :param filename: str path to file on disk we are uploading parts of
         :param chunk_size: int size of block we will upload
-        :param index: int index into filename content(must multiply by chunk_size during seek)
-        :param num_chunks_to_send: how many chunks of chunk_size should we upload
+        :param chunk_queue: UploadChunkQueue shared source of chunk numbers to send
         :param progress_queue: ProgressQueue queue we will send updates or errors to.
         """
         self.data_service = data_service
@@ -260,26 +358,21 @@ class ChunkSender(object):
         self.upload_id = upload_id
         self.filename = filename
         self.chunk_size = chunk_size
-        self.index = index
-        self.num_chunks_to_send = num_chunks_to_send
+        self.chunk_queue = chunk_queue
         self.progress_queue = progress_queue
 
     def send(self):
         """
-        For each chunk we need to send, create upload url and send bytes.
-        :return None when everything is ok otherwise returns a string error message.
+        For each chunk we claim, create upload url and send bytes.
         """
-        sent_chunks = 0
-        chunk_num = self.index
         with open(self.filename, 'rb') as infile:
-            infile.seek(self.index * self.chunk_size)
-            while sent_chunks != self.num_chunks_to_send:
+            chunk_num = self.chunk_queue.claim()
+            while chunk_num is not None:
+                infile.seek(chunk_num * self.chunk_size)
                 chunk = infile.read(self.chunk_size)
                 self._send_chunk(chunk, chunk_num)
                 self.progress_queue.processed(1)
-                chunk_num += 1
-                sent_chunks += 1
-        return None
+                chunk_num = self.chunk_queue.claim()
 
     def _send_chunk(self, chunk, chunk_num):
         """
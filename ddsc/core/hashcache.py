@@ -0,0 +1,139 @@
+"""
+Persistent cache of local file hashes so unchanged files are not re-read every time we upload.
+"""
+import sqlite3
+import threading
+from ddsc.core.util import make_parent_directory
+
+SQLITE_TIMEOUT_SECONDS = 30
+CREATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS file_hashes (
+    device INTEGER,
+    inode INTEGER,
+    size INTEGER,
+    mtime_ns INTEGER,
+    algorithm TEXT,
+    value TEXT,
+    PRIMARY KEY (device, inode, size, mtime_ns, algorithm))"""
+SELECT_HASH_SQL = """SELECT value FROM file_hashes
+    WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?"""
+INSERT_HASH_SQL = """INSERT OR REPLACE INTO file_hashes (device, inode, size, mtime_ns, algorithm, value)
+    VALUES (?, ?, ?, ?, ?, ?)"""
+PRUNE_SQL = """DELETE FROM file_hashes WHERE rowid NOT IN
+    (SELECT rowid FROM file_hashes ORDER BY rowid DESC LIMIT ?)"""
+
+
+def create_hash_cache(config):
+    """
+    Create a hash cache based on config settings.
+    :param config: ddsc.config.Config: settings that determine where the cache lives and how big it can get
+    :return: HashCache or None if the hash cache is disabled
+    """
+    filename = config.hash_cache_filename
+    if filename:
+        return HashCache(filename, config.hash_cache_max_entries)
+    return None
+
+
+def get_mtime_ns(stat_info):
+    """
+    Return the modification time of a file in nanoseconds.
+    Falls back to the float st_mtime where st_mtime_ns is missing (python 2).
+    :param stat_info: os.stat_result: stat info for the file
+    :return: int: modification time in nanoseconds
+    """
+    mtime_ns = getattr(stat_info, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stat_info.st_mtime * 1000000000)
+    return mtime_ns
+
+
+class HashCache(object):
+    """
+    Stores hash values of local files in a sqlite database.
+    Entries are keyed on the device, inode, size and modification time of a file so changing a file results in a miss.
+    Once there are more than max_entries the oldest entries are removed by prune.
+    The database is opened lazily so this object can be passed to other processes.
+    Each thread opens its own connection since sqlite connections can only be used by the thread that created them.
+    """
+    def __init__(self, filename, max_entries):
+        """
+        Setup cache to be stored in filename.
+        :param filename: str: path to the sqlite database (created if necessary)
+        :param max_entries: int: number of hashes to keep when pruning
+        """
+        self.filename = filename
+        self.max_entries = max_entries
+        self._thread_local = threading.local()
+
+    def __getstate__(self):
+        return self.filename, self.max_entries
+
+    def __setstate__(self, state):
+        self.filename, self.max_entries = state
+        self._thread_local = threading.local()
+
+    def _connect(self):
+        """
+        Open the database creating the parent directory and table if necessary.
+        :return: sqlite3.Connection: open connection to the cache
+        """
+        connection = getattr(self._thread_local, 'connection', None)
+        if not connection:
+            make_parent_directory(self.filename)
+            connection = sqlite3.connect(self.filename, timeout=SQLITE_TIMEOUT_SECONDS)
+            # Losing recent entries after a crash only costs us a re-hash so skip the fsync.
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(CREATE_TABLE_SQL)
+            connection.commit()
+            self._thread_local.connection = connection
+        return connection
+
+    @staticmethod
+    def _make_key(stat_info, hash_alg):
+        """
+        Create lookup key based on file system info about a file.
+        :param stat_info: os.stat_result: stat info for the file
+        :param hash_alg: str: name of the hash algorithm
+        :return: tuple: values for the key columns
+        """
+        return stat_info.st_dev, stat_info.st_ino, stat_info.st_size, get_mtime_ns(stat_info), hash_alg
+
+    def get(self, stat_info, hash_alg):
+        """
+        Lookup hash value for a file.
+        :param stat_info: os.stat_result: stat info for the file
+        :param hash_alg: str: name of the hash algorithm
+        :return: str: hash value or None if not found
+        """
+        try:
+            row = self._connect().execute(SELECT_HASH_SQL, HashCache._make_key(stat_info, hash_alg)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row:
+            return row[0]
+        return None
+
+    def set(self, stat_info, hash_alg, hash_value):
+        """
+        Save hash value for a file.
+        :param stat_info: os.stat_result: stat info for the file when it was hashed
+        :param hash_alg: str: name of the hash algorithm
+        :param hash_value: str: hash value of the file contents
+        """
+        try:
+            connection = self._connect()
+            connection.execute(INSERT_HASH_SQL, HashCache._make_key(stat_info, hash_alg) + (hash_value,))
+            connection.commit()
+        except sqlite3.Error:
+            pass  # failing to cache a hash just means we will hash this file again
+
+    def prune(self):
+        """
+        Remove the oldest entries so the cache only contains max_entries hashes.
+        """
+        try:
+            connection = self._connect()
+            connection.execute(PRUNE_SQL, (self.max_entries,))
+            connection.commit()
+        except sqlite3.Error:
+            pass
@@ -3,8 +3,25 @@ import math
 import mimetypes
 import os
 import re
+import threading
 
 from ddsc.core.util import KindType
+from ddsc.core.hashcache import get_mtime_ns
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from sys import intern
+except ImportError:
+    pass  # python 2 has intern as a builtin
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
 
 
 class LocalProject(object):
@@ -12,11 +29,16 @@ class LocalProject(object):
     Represents a list of folder/file trees on the filesystem.
     Has kind property to allow project tree traversal with ProjectWalker.
     """
-    def __init__(self, followsymlinks, file_exclude_regex):
+    def __init__(self, followsymlinks, file_exclude_regex, hash_cache=None, hash_algs=None, scan_workers=1,
+                 scan_progress=None):
         """
         Creates a list of local file system content that can be sent to a remote project.
         :param followsymlinks: bool follow symbolic links when looking for content
         :param file_exclude_regex: str: regex that should be used to filter out files we do not want to upload
+        :param hash_cache: HashCache: optional cache used to avoid re-hashing unchanged files
+        :param hash_algs: [str]: hash algorithms to calculate for files (md5 is always included)
+        :param scan_workers: int: number of threads used to scan directories (1 scans serially)
+        :param scan_progress: ScanProgressPrinter: optional object notified of each item found
         """
         self.remote_id = ''
         self.kind = KindType.project_str
@@ -24,6 +46,11 @@ class LocalProject(object):
         self.sent_to_remote = False
         self.followsymlinks = followsymlinks
         self.file_include = FileFilter(file_exclude_regex).include
+        self.hash_cache = hash_cache
+        self.hash_algs = hash_algs
+        self.scan_workers = scan_workers
+        self.scan_progress = scan_progress
+        self.compare_stats = FileCompareStats()
 
     def add_path(self, path):
         """
@@ -31,7 +58,9 @@ class LocalProject(object):
         :param path: str path to add
         """
         abspath = os.path.abspath(path)
-        self.children.append(_build_project_tree(abspath, self.followsymlinks, self.file_include))
+        self.children.append(_build_project_tree(abspath, self.followsymlinks, self.file_include,
+                                                 self.hash_cache, self.hash_algs, self.scan_workers,
+                                                 self.scan_progress))
 
     def add_paths(self, path_list):
         """
@@ -41,14 +70,42 @@ class LocalProject(object):
         for path in path_list:
             self.add_path(path)
 
+    def scan_paths(self, path_list):
+        """
+        Lazily scan a list of paths yielding each LocalFolder/LocalFile as it is found
+        so items can be compared and uploaded before the scan finishes.
+        Parents are yielded before their children and top level items have this project as their parent.
+        Items are not added to the tree, the caller is responsible for adding each child to its parent's children.
+        :param path_list: [str] list of file system paths
+        :return: generator of (LocalFolder/LocalFile, LocalProject/LocalFolder): each item and its parent
+        """
+        for path in path_list:
+            abspath = os.path.abspath(path)
+            if os.path.isfile(abspath):
+                yield LocalFile(abspath, self.hash_cache, self.hash_algs), self
+            else:
+                if self.scan_workers > 1:
+                    scanner = ParallelFolderScanner(self.followsymlinks, self.file_include, self.hash_cache,
+                                                    self.hash_algs, self.scan_workers)
+                    found_items = scanner.scan(abspath)
+                else:
+                    found_items = _scan_folder_tree(abspath, self.followsymlinks, self.file_include,
+                                                    self.hash_cache, self.hash_algs)
+                for parent, child in found_items:
+                    yield child, parent or self
+
     def update_remote_ids(self, remote_project):
         """
         Compare against remote_project saving off the matching uuids of of matching content.
         :param remote_project: RemoteProject project to compare against
         """
+        self.compare_stats = FileCompareStats()
         if remote_project:
             self.remote_id = remote_project.id
-            _update_remote_children(remote_project, self.children)
+            _update_remote_children(remote_project, self.children, self.compare_stats)
+        else:
+            for child in self.children:
+                self.compare_stats.add_missing(child)
 
     def set_remote_id_after_send(self, remote_id):
         """
@@ -75,81 +132,299 @@ def _name_to_child_map(children):
     return name_to_child
 
 
-def _update_remote_children(remote_parent, children):
+def _update_remote_children(remote_parent, children, compare_stats):
     """
     Update remote_ids based on on parent matching up the names of children.
     :param remote_parent: RemoteProject/RemoteFolder who has children
     :param children: [LocalFolder,LocalFile] children to set remote_ids based on remote children
+    :param compare_stats: FileCompareStats: records how each file was compared
     """
     name_to_child = _name_to_child_map(children)
     for remote_child in remote_parent.children:
-        local_child = name_to_child.get(remote_child.name)
+        local_child = name_to_child.pop(remote_child.name, None)
         if local_child:
-            local_child.update_remote_ids(remote_child)
+            local_child.update_remote_ids(remote_child, compare_stats)
+    for local_child in name_to_child.values():
+        compare_stats.add_missing(local_child)
 
 
-def _build_project_tree(path, followsymlinks, file_include):
+def _build_project_tree(path, followsymlinks, file_include, hash_cache=None, hash_algs=None, scan_workers=1,
+                        scan_progress=None):
     """
     Build a tree of LocalFolder with children or just a LocalFile based on a path.
     :param path: str path to a directory to walk
     :param followsymlinks: bool should we follow symlinks when walking
     :param file_include: func returns True if we should include a file
+    :param hash_cache: HashCache: optional cache of file hashes passed to each LocalFile
+    :param hash_algs: [str]: hash algorithms passed to each LocalFile
+    :param scan_workers: int: number of threads used to scan directories (1 scans serially)
+    :param scan_progress: ScanProgressPrinter: optional object notified of each item found
     :return: the top node of the tree LocalFile or LocalFolder
     """
     result = None
     if os.path.isfile(path):
-        result = LocalFile(path)
+        result = LocalFile(path, hash_cache, hash_algs)
     else:
-        result = _build_folder_tree(os.path.abspath(path), followsymlinks, file_include)
+        result = _build_folder_tree(os.path.abspath(path), followsymlinks, file_include, hash_cache, hash_algs,
+                                    scan_workers, scan_progress)
     return result
 
 
-def _build_folder_tree(top_abspath, followsymlinks, file_include):
+def _build_folder_tree(top_abspath, followsymlinks, file_include, hash_cache=None, hash_algs=None, scan_workers=1,
+                       scan_progress=None):
     """
     Build a tree of LocalFolder with children based on a path.
+    Serial and parallel scanning produce the same tree.
     :param top_abspath: str path to a directory to walk
     :param followsymlinks: bool should we follow symlinks when walking
     :param file_include: func returns True if we should include a file
+    :param hash_cache: HashCache: optional cache of file hashes passed to each LocalFile
+    :param hash_algs: [str]: hash algorithms passed to each LocalFile
+    :param scan_workers: int: number of threads used to scan directories (1 scans serially)
+    :param scan_progress: ScanProgressPrinter: optional object notified of each item found
     :return: the top node of the tree LocalFolder
     """
-    path_to_content = {}
-    child_to_parent = {}
-    for dir_name, child_dirs, child_files in os.walk(top_abspath, followlinks=followsymlinks):
-        abspath = os.path.abspath(dir_name)
-        folder = LocalFolder(abspath)
-        path_to_content[abspath] = folder
-        # If we have a parent add us to it.
-        parent_path = child_to_parent.get(abspath)
-        if parent_path:
-            path_to_content[parent_path].add_child(folder)
-        for child_dir in child_dirs:
-            # Record dir_name as the parent of child_dir so we can call add_child when get to it.
-            abs_child_path = os.path.abspath(os.path.join(dir_name, child_dir))
-            child_to_parent[abs_child_path] = abspath
-        for child_filename in child_files:
-            if file_include(child_filename):
-                folder.add_child(LocalFile(os.path.join(dir_name, child_filename)))
-    return path_to_content.get(top_abspath)
+    if scan_workers > 1:
+        scanner = ParallelFolderScanner(followsymlinks, file_include, hash_cache, hash_algs, scan_workers,
+                                        scan_progress)
+        return scanner.run(top_abspath)
+    top_folder = None
+    for parent, child in _scan_folder_tree(top_abspath, followsymlinks, file_include, hash_cache, hash_algs):
+        if parent:
+            parent.add_child(child)
+            if scan_progress:
+                scan_progress.found_item(child)
+        else:
+            top_folder = child
+    return top_folder
+
+
+def _scan_folder_tree(top_abspath, followsymlinks, file_include, hash_cache=None, hash_algs=None):
+    """
+    Lazily walk a directory yielding (parent, child) pairs for each LocalFolder/LocalFile found.
+    The first pair is (None, top_folder). Within a folder files are yielded before folders, each sorted by name.
+    Uses scandir so each file only requires a single stat (for its size).
+    :param top_abspath: str path to a directory to walk
+    :param followsymlinks: bool should we follow symlinks to directories when walking
+    :param file_include: func returns True if we should include a file
+    :param hash_cache: HashCache: optional cache of file hashes passed to each LocalFile
+    :param hash_algs: [str]: hash algorithms passed to each LocalFile
+    """
+    top_folder = LocalFolder(top_abspath)
+    yield None, top_folder
+    folders_to_scan = [top_folder]
+    while folders_to_scan:
+        folder = folders_to_scan.pop()
+        files, child_folders = _scan_folder(folder, followsymlinks, file_include, hash_cache, hash_algs)
+        for child in files + child_folders:
+            yield folder, child
+        # Reverse so we scan child folders in name order.
+        folders_to_scan.extend(reversed(child_folders))
+
+
+def _scan_folder(folder, followsymlinks, file_include, hash_cache=None, hash_algs=None):
+    """
+    Read the immediate contents of a single folder.
+    :param folder: LocalFolder: folder to read
+    :param followsymlinks: bool should we include symlinks to directories
+    :param file_include: func returns True if we should include a file
+    :param hash_cache: HashCache: optional cache of file hashes passed to each LocalFile
+    :param hash_algs: [str]: hash algorithms passed to each LocalFile
+    :return: ([LocalFile], [LocalFolder]): files and child folders each sorted by name
+    """
+    files = []
+    child_folders = []
+    for entry in _sorted_dir_entries(folder.path):
+        if entry.is_dir():
+            if followsymlinks or not entry.is_symlink():
+                child_folders.append(LocalFolder(entry.path))
+        elif file_include(entry.name):
+            files.append(LocalFile(entry.path, hash_cache, hash_algs, size=entry.stat().st_size))
+    return files, child_folders
+
+
+class ParallelFolderScanner(object):
+    """
+    Builds a LocalFolder tree using multiple threads to read directories.
+    Threads pull folders from a shared queue and push the child folders they find back onto it.
+    Each folder's children are assigned in name order, so the tree matches the serial scan.
+    """
+    def __init__(self, followsymlinks, file_include, hash_cache=None, hash_algs=None, scan_workers=2,
+                 scan_progress=None):
+        """
+        :param followsymlinks: bool should we follow symlinks when walking
+        :param file_include: func returns True if we should include a file
+        :param hash_cache: HashCache: optional cache of file hashes passed to each LocalFile
+        :param hash_algs: [str]: hash algorithms passed to each LocalFile
+        :param scan_workers: int: number of threads to use
+        :param scan_progress: ScanProgressPrinter: optional object notified of each item found
+        """
+        self.followsymlinks = followsymlinks
+        self.file_include = file_include
+        self.hash_cache = hash_cache
+        self.hash_algs = hash_algs
+        self.scan_workers = scan_workers
+        self.scan_progress = scan_progress
+        self.folder_queue = queue.Queue()
+        self.found_queue = None
+        self.errors = []
+
+    def run(self, top_abspath):
+        """
+        Scan top_abspath and all directories below it.
+        Raises the first error any thread encountered.
+        :param top_abspath: str path to a directory to walk
+        :return: LocalFolder: top of the tree
+        """
+        top_folder = LocalFolder(top_abspath)
+        self.folder_queue.put(top_folder)
+        threads = []
+        for _ in range(self.scan_workers):
+            thread = threading.Thread(target=self._scan_folders)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        self.folder_queue.join()
+        for _ in threads:
+            self.folder_queue.put(None)
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+        return top_folder
+
+    def scan(self, top_abspath):
+        """
+        Scan top_abspath and all directories below it yielding (parent, child) pairs as each folder is read
+        like _scan_folder_tree. Folders are not filled in, the caller is responsible for adding each child to its parent.
+        Raises the first error any thread encountered once the scan has finished.
+        :param top_abspath: str path to a directory to walk
+        :return: generator of (LocalFolder, LocalFolder/LocalFile): the first pair is (None, top_folder)
+        """
+        top_folder = LocalFolder(top_abspath)
+        yield None, top_folder
+        self.found_queue = queue.Queue()
+        self.folder_queue.put(top_folder)
+        waiter = threading.Thread(target=self._scan_and_wait)
+        waiter.daemon = True
+        waiter.start()
+        while True:
+            found = self.found_queue.get()
+            if found is None:
+                break
+            folder, children = found
+            for child in children:
+                yield folder, child
+        if self.errors:
+            raise self.errors[0]
+
+    def _scan_and_wait(self):
+        """
+        Thread that runs the scanning threads and tells scan we are done by putting None into found_queue.
+        """
+        threads = []
+        for _ in range(self.scan_workers):
+            thread = threading.Thread(target=self._scan_folders)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        self.folder_queue.join()
+        for _ in threads:
+            self.folder_queue.put(None)
+        for thread in threads:
+            thread.join()
+        self.found_queue.put(None)
+
+    def _scan_folders(self):
+        """
+        Thread loop: scan folders from the queue until we receive None.
+        """
+        while True:
+            folder = self.folder_queue.get()
+            if folder is None:
+                self.folder_queue.task_done()
+                break
+            try:
+                if not self.errors:
+                    self._scan_one_folder(folder)
+            except Exception as ex:
+                self.errors.append(ex)
+            finally:
+                self.folder_queue.task_done()
+
+    def _scan_one_folder(self, folder):
+        """
+        Fill in children of folder and queue up its child folders to be scanned.
+        :param folder: LocalFolder: folder to scan
+        """
+        files, child_folders = _scan_folder(folder, self.followsymlinks, self.file_include, self.hash_cache,
+                                            self.hash_algs)
+        children = files + child_folders
+        if self.found_queue:
+            # put children before scanning child folders so scan yields parents before their children
+            self.found_queue.put((folder, children))
+        else:
+            folder.children = children
+        for child_folder in child_folders:
+            self.folder_queue.put(child_folder)
+        if self.scan_progress:
+            for child in children:
+                self.scan_progress.found_item(child)
+
+
+def _sorted_dir_entries(path):
+    """
+    Return scandir entries for path sorted by name. Unreadable directories are treated as empty like os.walk.
+    :param path: str path to a directory
+    :return: [DirEntry]: entries in the directory
+    """
+    try:
+        entries = list(scandir(path))
+    except OSError:
+        return []
+    entries.sort(key=lambda entry: entry.name)
+    return entries
+
+
+def _split_path(path):
+    """
+    Split an absolute version of path into parent directory and name.
+    The parent directory is interned so siblings share a single string.
+    :param path: str: filesystem path
+    :return: (str, str): parent directory path, name
+    """
+    parent_path, name = os.path.split(os.path.abspath(path))
+    return intern(parent_path), name
 
 
 class LocalFolder(object):
     """
     A folder on disk.
     Has kind property to allow project tree traversal with ProjectWalker.
+    Uses __slots__ and stores the parent path separately so large trees stay small in memory.
     """
+    __slots__ = ('parent_path', 'name', 'children', 'remote_id', 'sent_to_remote')
+    kind = KindType.folder_str
+    is_file = False
+
     def __init__(self, path):
         """
         Setup folder based on a path.
         :param path: str path to filesystem directory
         """
-        self.path = os.path.abspath(path)
-        self.name = os.path.basename(self.path)
+        self.parent_path, self.name = _split_path(path)
         self.children = []
         self.remote_id = ''
-        self.is_file = False
-        self.kind = KindType.folder_str
         self.sent_to_remote = False
 
+    @property
+    def path(self):
+        """
+        Absolute path to this folder.
+        :return: str: path
+        """
+        return os.path.join(self.parent_path, self.name)
+
     def add_child(self, child):
         """
         Add a child to this folder.
@@ -157,13 +432,14 @@ class LocalFolder(object):
         """
         self.children.append(child)
 
-    def update_remote_ids(self, remote_folder):
+    def update_remote_ids(self, remote_folder, compare_stats):
         """
         Set remote id based on remote_folder and check children against this folder's children.
         :param remote_folder: RemoteFolder to compare against
+        :param compare_stats: FileCompareStats: records how each file was compared
         """
         self.remote_id = remote_folder.id
-        _update_remote_children(remote_folder, self.children)
+        _update_remote_children(remote_folder, self.children, compare_stats)
 
     def set_remote_id_after_send(self, remote_id):
         """
@@ -182,23 +458,55 @@ class LocalFile(object):
     """
     Represents a file on disk.
     Has kind property to allow project tree traversal with ProjectWalker.
+    Uses __slots__ and stores the parent path separately so large trees stay small in memory.
     """
-    def __init__(self, path):
+    __slots__ = ('parent_path', 'name', 'size', 'hash_cache', 'hash_algs', 'need_to_send', 'remote_id',
+                 'sent_to_remote')
+    kind = KindType.file_str
+    is_file = True
+
+    def __init__(self, path, hash_cache=None, hash_algs=None, size=None):
         """
         Setup file based on filesystem path.
         :param path: path to a file on the filesystem
-        """
-        self.path = os.path.abspath(path)
-        self.path_data = PathData(self.path)
-        self.name = self.path_data.name()
-        self.size = self.path_data.size()
-        self.mimetype = self.path_data.mime_type()
+        :param hash_cache: HashCache: optional cache of file hashes
+        :param hash_algs: [str]: hash algorithms to calculate for this file (md5 is always included)
+        :param size: int: size of the file if already known (avoids another stat)
+        """
+        self.parent_path, self.name = _split_path(path)
+        self.hash_cache = hash_cache
+        self.hash_algs = hash_algs
+        if size is None:
+            size = os.path.getsize(self.path)
+        self.size = size
         self.need_to_send = True
         self.remote_id = ''
-        self.is_file = True
-        self.kind = KindType.file_str
         self.sent_to_remote = False
 
+    @property
+    def path(self):
+        """
+        Absolute path to this file.
+        :return: str: path
+        """
+        return os.path.join(self.parent_path, self.name)
+
+    @property
+    def path_data(self):
+        """
+        PathData for this file. Created on demand rather than stored with each file.
+        :return: PathData
+        """
+        return PathData(self.path, self.hash_cache, self.hash_algs)
+
+    @property
+    def mimetype(self):
+        """
+        Guess the mimetype of this file. Not done while scanning since it is only needed when uploading.
+        :return: str: mimetype
+        """
+        return self.path_data.mime_type()
+
     def get_path_data(self):
         """
         Return PathData created from internal path.
@@ -212,14 +520,30 @@ class LocalFile(object):
         """
         return self.path_data.get_hash().value
 
-    def update_remote_ids(self, remote_file):
+    def update_remote_ids(self, remote_file, compare_stats):
         """
-        Based on a remote file try to assign a remote_id and compare hash info.
+        Based on a remote file try to assign a remote_id and compare size then hash info.
+        Files whose size differs from the remote file are never read.
         :param remote_file: RemoteFile remote data pull remote_id from
+        :param compare_stats: FileCompareStats: records how this file was compared
         """
         self.remote_id = remote_file.id
-        hash_data = self.path_data.get_hash()
-        if hash_data.matches(remote_file.hash_alg, remote_file.file_hash):
+        if self.size != remote_file.size:
+            compare_stats.size_differs += 1
+            return
+        path_data = self.path_data
+        remote_hashes = remote_file.hashes
+        hash_alg = path_data.select_hash_alg(remote_hashes)
+        if not hash_alg:
+            compare_stats.no_remote_hash += 1
+            return
+        hash_data = path_data.get_cached_hash(hash_alg)
+        if hash_data:
+            compare_stats.cached_hash += 1
+        else:
+            hash_data = path_data.get_hash(hash_alg)
+            compare_stats.computed_hash += 1
+        if hash_data.matches(hash_alg, remote_hashes[hash_alg]):
             self.need_to_send = False
 
     def set_remote_id_after_send(self, remote_id):
@@ -230,6 +554,13 @@ class LocalFile(object):
         self.sent_to_remote = True
         self.remote_id = remote_id
 
+    def remove_staged_file(self, path_data=None):
+        """
+        Files are uploaded from their own path so there is no copy to remove once they have been sent.
+        :param path_data: PathData: path data that was used to upload this file
+        """
+        pass
+
     def count_chunks(self, bytes_per_chunk):
         return math.ceil(float(self.size) / float(bytes_per_chunk))
 
@@ -237,16 +568,55 @@ class LocalFile(object):
         return 'file:{}'.format(self.name)
 
 
+class FileCompareStats(object):
+    """
+    Counts how local files were compared against the remote project.
+    Each file is checked by existence, then size, then cached hash and finally by hashing its contents.
+    """
+    def __init__(self):
+        self.missing_remote = 0
+        self.size_differs = 0
+        self.no_remote_hash = 0
+        self.cached_hash = 0
+        self.computed_hash = 0
+
+    def add_missing(self, local_item):
+        """
+        Count local_item and any files below it as not existing remotely.
+        :param local_item: LocalFolder/LocalFile: item that has no remote counterpart
+        """
+        if KindType.is_file(local_item):
+            self.missing_remote += 1
+        else:
+            for child in local_item.children:
+                self.add_missing(child)
+
+    def compared_files(self):
+        """
+        Number of local files that had a remote file with the same name.
+        :return: int: number of files
+        """
+        return self.size_differs + self.no_remote_hash + self.cached_hash + self.computed_hash
+
+    def result_str(self):
+        """
+        Return a string describing how many files were decided by each check.
+        :return: str: counts for each check
+        """
+        return '{} new, {} changed size, {} without remote hash, {} matched cached hash, {} hashed'.format(
+            self.missing_remote, self.size_differs, self.no_remote_hash, self.cached_hash, self.computed_hash)
+
+
 class HashData(object):
     """
     Hash info about a file.
     """
-    def __init__(self, hash_util):
+    def __init__(self, alg, value):
         """
-        Create hash info from hash_util with data already loaded.
-        :param hash_util: HashUtil with data populated
+        Create hash info from an algorithm and value.
+        :param alg: str: hash algorithm
+        :param value: str: hash value
         """
-        alg, value = hash_util.hexdigest()
         self.alg = alg
         self.value = value
 
@@ -268,7 +638,35 @@ class HashData(object):
         """
         hash_util = HashUtil()
         hash_util.add_file(path)
-        return HashData(hash_util)
+        return HashData.create_from_hash_util(hash_util)
+
+    @staticmethod
+    def create_list_from_path(path, hash_algs):
+        """
+        Hash the local file at path with multiple algorithms reading the file only once.
+        :param path: str: path to file we will hash
+        :param hash_algs: [str]: names of the hash algorithms to use
+        :return: [HashData]: hash alg and value for each of hash_algs
+        """
+        hash_utils = [HashUtil(hash_alg) for hash_alg in hash_algs]
+        with open(path, "rb") as infile:
+            for chunk in iter(lambda: infile.read(HashUtil.BLOCK_SIZE), b""):
+                for hash_util in hash_utils:
+                    hash_util.add_chunk(chunk)
+        return [HashData.create_from_hash_util(hash_util) for hash_util in hash_utils]
+
+    @staticmethod
+    def find(hash_data_list, hash_alg):
+        """
+        Find the HashData in hash_data_list for a particular algorithm.
+        :param hash_data_list: [HashData]: list to search
+        :param hash_alg: str: name of the hash algorithm to look for
+        :return: HashData or None if not found
+        """
+        for hash_data in hash_data_list:
+            if hash_data.alg == hash_alg:
+                return hash_data
+        return None
 
     @staticmethod
     def create_from_chunk(chunk):
@@ -279,19 +677,35 @@ class HashData(object):
         """
         hash_util = HashUtil()
         hash_util.add_chunk(chunk)
-        return HashData(hash_util)
+        return HashData.create_from_hash_util(hash_util)
+
+    @staticmethod
+    def create_from_hash_util(hash_util):
+        """
+        Create HashData from hash_util with data already loaded.
+        :param hash_util: HashUtil with data populated
+        :return: HashData: hash alg and value
+        """
+        alg, value = hash_util.hexdigest()
+        return HashData(alg, value)
 
 
 class PathData(object):
     """
     Various information that can be derived from a filesystem path to a file.
     """
-    def __init__(self, path):
+    def __init__(self, path, hash_cache=None, hash_algs=None):
         """
         Setup with path pointing to existing file.
         :param path: str: path
+        :param hash_cache: HashCache: optional cache to check before hashing the file
+        :param hash_algs: [str]: hash algorithms to calculate in one pass over the file (md5 is always included)
         """
         self.path = path
+        self.hash_cache = hash_cache
+        self.hash_algs = list(hash_algs or [])
+        if HashUtil.HASH_NAME not in self.hash_algs:
+            self.hash_algs.append(HashUtil.HASH_NAME)
 
     def name(self):
         """
@@ -317,12 +731,85 @@ class PathData(object):
         """
         return os.path.getsize(self.path)
 
-    def get_hash(self):
+    def select_hash_alg(self, available_hash_algs):
+        """
+        Choose which hash algorithm to use when comparing against a set of existing hashes.
+        Prefers algorithms in the order of hash_algs.
+        :param available_hash_algs: [str]: names of algorithms we have hash values for
+        :return: str: name of the hash algorithm or None if there are no algorithms in common
+        """
+        for hash_alg in self.hash_algs:
+            if hash_alg in available_hash_algs:
+                return hash_alg
+        return None
+
+    def get_hash(self, hash_alg=None):
         """
-        Create HashData for the file
+        Create HashData for the file using the hash cache when possible.
+        When the file must be read all of our hash algorithms are calculated.
+        :param hash_alg: str: name of the hash algorithm (defaults to md5)
         :return: HashData: alg and value of contents of the file
         """
-        return HashData.create_from_path(self.path)
+        hash_alg = hash_alg or HashUtil.HASH_NAME
+        hash_data = self.get_cached_hash(hash_alg)
+        if hash_data:
+            return hash_data
+        hash_algs = self.hash_algs
+        if hash_alg not in hash_algs:
+            hash_algs = [hash_alg]
+        return HashData.find(self._hash_file(hash_algs), hash_alg)
+
+    def get_hashes(self):
+        """
+        Create HashData for each of our hash algorithms reading the file at most once.
+        :return: [HashData]: alg and value of contents of the file for each of hash_algs
+        """
+        hash_data_list = [self.get_cached_hash(hash_alg) for hash_alg in self.hash_algs]
+        if all(hash_data_list):
+            return hash_data_list
+        return self._hash_file(self.hash_algs)
+
+    def get_cached_hash(self, hash_alg=None):
+        """
+        Lookup HashData for the file in the hash cache without reading the file.
+        :param hash_alg: str: name of the hash algorithm (defaults to md5)
+        :return: HashData: alg and value of contents of the file or None if not cached
+        """
+        hash_alg = hash_alg or HashUtil.HASH_NAME
+        if self.hash_cache:
+            hash_value = self.hash_cache.get(os.stat(self.path), hash_alg)
+            if hash_value:
+                return HashData(hash_alg, hash_value)
+        return None
+
+    def _hash_file(self, hash_algs):
+        """
+        Read the file creating HashData for each of hash_algs and save the results in the hash cache.
+        :param hash_algs: [str]: names of the hash algorithms to use
+        :return: [HashData]: alg and value of contents of the file for each of hash_algs
+        """
+        if not self.hash_cache:
+            return HashData.create_list_from_path(self.path, hash_algs)
+        stat_info = os.stat(self.path)
+        hash_data_list = HashData.create_list_from_path(self.path, hash_algs)
+        # Only cache the results if the file didn't change while we were reading it.
+        if PathData._same_stat(stat_info, os.stat(self.path)):
+            for hash_data in hash_data_list:
+                self.hash_cache.set(stat_info, hash_data.alg, hash_data.value)
+        return hash_data_list
+
+    @staticmethod
+    def _same_stat(stat_info, other_stat_info):
+        """
+        Do two stat results refer to the same unmodified file.
+        Compares the same values the hash cache is keyed on.
+        :param stat_info: os.stat_result: first stat info
+        :param other_stat_info: os.stat_result: second stat info
+        :return: bool: True if the file is the same
+        """
+        return (stat_info.st_dev, stat_info.st_ino, stat_info.st_size, get_mtime_ns(stat_info)) == \
+               (other_stat_info.st_dev, other_stat_info.st_ino, other_stat_info.st_size,
+                get_mtime_ns(other_stat_info))
 
     def read_whole_file(self):
         """
@@ -338,13 +825,19 @@ class PathData(object):
 
 class HashUtil(object):
     HASH_NAME = "md5"
+    BLOCK_SIZE = 4096
     """
     Utility to create hash pair (name, hash) for a file or chunk.
     """
-    def __init__(self):
-        self.hash = hashlib.md5()
+    def __init__(self, hash_name=HASH_NAME):
+        """
+        Setup to hash data with a hashlib algorithm.
+        :param hash_name: str: name of the hash algorithm (any name supported by hashlib.new)
+        """
+        self.hash_name = hash_name
+        self.hash = hashlib.new(hash_name)
 
-    def add_file(self, filename, block_size=4096):
+    def add_file(self, filename, block_size=BLOCK_SIZE):
         """
         Add an entire file to this hash.
         :param filename: str filename of the file to hash
@@ -367,7 +860,7 @@ class HashUtil(object):
         return a hash pair
         :return: (str,str) -> (algorithm,value)
         """
-        return HashUtil.HASH_NAME, self.hash.hexdigest()
+        return self.hash_name, self.hash.hexdigest()
 
 
 class FileFilter(object):
@@ -90,6 +90,7 @@ class TaskRunner(object):
         self.waiting_task_list = WaitingTaskList()
         self.executor = executor
         self.next_id = 1
+        self.started = False
 
     def _claim_next_id(self):
         """
@@ -103,12 +104,17 @@ class TaskRunner(object):
     def add(self, parent_task_id, command):
         """
         Create a task for the command that will wait for parent_task_id before starting.
+        Once the runner has been started tasks without a parent are sent straight to the executor.
         :param parent_task_id: int: id of task to wait for or None if it can start immediately
         :param command: TaskCommand: contains data function to run
         :return: int: task id we created for this command
         """
         task_id = self._claim_next_id()
-        self.waiting_task_list.add(Task(task_id, parent_task_id, command))
+        task = Task(task_id, parent_task_id, command)
+        if self.started and parent_task_id is None:
+            self.executor.add_task(task, None)
+        else:
+            self.waiting_task_list.add(task)
         return task_id
 
     def get_next_tasks(self, finished_task_id):
@@ -119,14 +125,32 @@ class TaskRunner(object):
         """
         return self.waiting_task_list.get_next_tasks(None)
 
+    def start(self):
+        """
+        Send tasks that are not waiting on another task to the executor.
+        Tasks may still be added after this, call poll until it returns False to run them.
+        """
+        self.started = True
+        for task in self.get_next_tasks(None):
+            self.executor.add_task(task, None)
+
+    def poll(self):
+        """
+        Start as many tasks as we can and add sub tasks of the tasks that have finished without blocking.
+        :return: bool: True if there are tasks running or waiting to be run
+        """
+        self.executor.start_tasks()
+        for task, task_result in self.executor.get_finished_results():
+            self._add_sub_tasks_to_executor(task, task_result)
+        return not self.executor.is_done()
+
     def run(self):
         """
         Runs all tasks in this runner on the executor.
         Blocks until all tasks have been completed.
         :return:
         """
-        for task in self.get_next_tasks(None):
-            self.executor.add_task(task, None)
+        self.start()
         while not self.executor.is_done():
             done_task_and_result = self.executor.wait_for_tasks()
             for task, task_result in done_task_and_result:
@@ -146,12 +170,14 @@ class TaskExecutor(object):
     """
     Executes tasks in a pool of processes.
     """
-    def __init__(self, tasks_at_once):
+    def __init__(self, tasks_at_once, initializer=None, initargs=()):
         """
         Setup to run tasks in background limiting to tasks_at_once processes.
         :param tasks_at_once: int: number of tasks we can run at once
+        :param initializer: function: called with initargs when each process in the pool starts
+        :param initargs: tuple: arguments for initializer
         """
-        self.pool = Pool()
+        self.pool = Pool(initializer=initializer, initargs=initargs)
         self.tasks = deque()
         self.task_id_to_task = {}
         self.pending_results = []
@@ -28,6 +28,9 @@ class PathFilter(object):
             path_filter = ExcludeFilter(exclude_paths)
 
         self.filter = path_filter
+        self.include_paths = None
+        if include_paths:
+            self.include_paths = path_filter.paths
         self.seen_paths = set()
 
     def include_path(self, path):
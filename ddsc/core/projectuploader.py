@@ -1,10 +1,19 @@
+import time
 import requests
-from ddsc.core.util import ProjectWalker
-from ddsc.core.ddsapi import DataServiceAuth, DataServiceApi
+from multiprocessing.pool import ThreadPool
+from ddsc.core.util import ProjectWalker, KindType
+from ddsc.core.ddsapi import DataServiceAuth, DataServiceApi, DataServiceError
 from ddsc.core.fileuploader import FileUploader, FileUploadOperations, ParentData
+from ddsc.core.localstore import HashData, HashUtil
 from ddsc.core.parallel import TaskExecutor, TaskRunner
+from ddsc.core.ratelimit import get_rate_limiter, set_rate_limiter
+from ddsc.core.autotune import create_worker_autotuner, UPLOAD_TRANSFER
 
 requests_session = requests.Session()
+# files from a batch sent at once by each worker, below the requests default of 10 pooled connections per host
+SMALL_FILE_UPLOAD_THREADS = 8
+# seconds to wait for more scanned items before checking on running upload tasks
+STREAM_WAIT_SECONDS = 0.1
 
 
 class UploadSettings(object):
@@ -78,24 +87,91 @@ class ProjectUploader(object):
         Setup to talk to the data service based on settings.
         :param settings: UploadSettings: settings to use for uploading.
         """
-        self.runner = TaskRunner(TaskExecutor(settings.config.upload_workers))
+        executor = TaskExecutor(settings.config.upload_workers, initializer=set_rate_limiter,
+                                initargs=(get_rate_limiter(),))
+        self.runner = TaskRunner(executor)
         self.settings = settings
         self.small_item_task_builder = SmallItemUploadTaskBuilder(self.settings, self.runner)
         self.small_items = []
         self.large_items = []
+        self.autotuner = None
+        self.upload_bytes_per_second = None
+        self.duplicate_uploads = DuplicateUploads(settings.data_service, settings.config.upload_bytes_per_chunk)
 
-    def run(self, local_project):
+    def run(self, local_project, remote_project=None):
         """
         Upload a project by uploading project, folders, and small files then uploading the large files.
         :param local_project: LocalProject: project to upload
+        :param remote_project: RemoteProject: existing project whose files large files may be created from
         """
+        if remote_project:
+            self.duplicate_uploads.add_remote_files(remote_project)
         # Walk project adding small items to runner saving large items to large_items
         ProjectWalker.walk_project(local_project, self)
+        self.small_item_task_builder.add_small_file_batches()
         # Run small items in parallel
         self.runner.run()
         # Run parts of each large item in parallel
         self.upload_large_items()
 
+    def run_streaming(self, planner, counter):
+        """
+        Upload items as planner finds them so files are sent while local folders are still being scanned.
+        The project, folders and small files are sent in parallel as they arrive.
+        Large files are sent one at a time whenever the small items have caught up.
+        :param planner: StreamingUploadPlanner: supplies the project then each folder/file after its parent
+        :param counter: LocalOnlyCounter: counts the items to send, the watcher's total grows to match it
+        """
+        config = self.settings.config
+        self.autotuner = create_worker_autotuner(config, UPLOAD_TRANSFER, config.upload_workers)
+        self.runner.start()
+        try:
+            planner_done = False
+            while True:
+                if not planner_done:
+                    planner_done = self._add_planned_items(planner, counter)
+                runner_busy = self.runner.poll()
+                if not runner_busy:
+                    # send partially filled batches instead of waiting on the scan to fill them
+                    self.small_item_task_builder.add_small_file_batches()
+                    runner_busy = self.runner.poll()
+                if not runner_busy:
+                    if self.large_items:
+                        local_file, parent = self.large_items.pop(0)
+                        self.send_large_file(local_file, parent)
+                    elif planner_done:
+                        break
+                elif planner_done:
+                    # poll doesn't block and get_items no longer waits for us so wait on the running tasks
+                    time.sleep(STREAM_WAIT_SECONDS)
+        finally:
+            if self.autotuner:
+                self.autotuner.save()
+
+    def _add_planned_items(self, planner, counter):
+        """
+        Add tasks for the items planner has found since we last checked.
+        :param planner: StreamingUploadPlanner: supplies (item, parent) pairs, parent is None for the project
+        :param counter: LocalOnlyCounter: counts the items to send
+        :return: bool: True once planner has supplied every item
+        """
+        items, planner_done = planner.get_items(STREAM_WAIT_SECONDS)
+        for item, parent in items:
+            total_items = counter.total_items()
+            if parent is None:
+                counter.visit_project(item)
+                self.visit_project(item)
+                if planner.remote_project:
+                    self.duplicate_uploads.add_remote_files(planner.remote_project)
+            elif KindType.is_file(item):
+                counter.visit_file(item, parent)
+                self.visit_file(item, parent)
+            else:
+                counter.visit_folder(item, parent)
+                self.visit_folder(item, parent)
+            self.settings.watcher.increase_total(counter.total_items() - total_items)
+        return planner_done
+
     # Methods called by ProjectWalker.walk_project
     def visit_project(self, item):
         """
@@ -126,9 +202,23 @@ class ProjectUploader(object):
         """
         Upload files that were too large.
         """
-        for local_file, parent in self.large_items:
-            if local_file.need_to_send:
-                self.process_large_file(local_file, parent)
+        config = self.settings.config
+        self.autotuner = create_worker_autotuner(config, UPLOAD_TRANSFER, config.upload_workers)
+        try:
+            for local_file, parent in self.large_items:
+                self.send_large_file(local_file, parent)
+        finally:
+            if self.autotuner:
+                self.autotuner.save()
+
+    def send_large_file(self, local_file, parent):
+        """
+        Send local_file if it has changed, creating it from an earlier upload of the same contents when possible.
+        :param local_file: LocalFile: large file we are uploading
+        :param parent: LocalFolder/LocalProject: parent of the file
+        """
+        if local_file.need_to_send and not self.reuse_upload(local_file, parent):
+            self.process_large_file(local_file, parent)
 
     def process_large_file(self, local_file, parent):
         """
@@ -138,10 +228,127 @@ class ProjectUploader(object):
         :param parent: LocalFolder/LocalProject: parent of the file
         """
         file_content_sender = FileUploader(self.settings.config, self.settings.data_service, local_file,
-                                           self.settings.watcher)
-        remote_id = file_content_sender.upload(self.settings.project_id, parent.kind, parent.remote_id)
+                                           self.settings.watcher, self.autotuner, self.upload_bytes_per_second)
+        try:
+            remote_id = file_content_sender.upload(self.settings.project_id, parent.kind, parent.remote_id)
+        finally:
+            local_file.remove_staged_file()
+        self.upload_bytes_per_second = file_content_sender.bytes_per_second
+        self.duplicate_uploads.add_upload(local_file, file_content_sender.upload_id)
         local_file.set_remote_id_after_send(remote_id)
 
+    def reuse_upload(self, local_file, parent):
+        """
+        Create or update local_file from the upload of an identical file sent earlier.
+        :param local_file: LocalFile: file we are uploading
+        :param parent: LocalFolder/LocalProject: parent of the file
+        :return: bool: True if the file was created from an earlier upload, False if it must be sent
+        """
+        remote_id = self.duplicate_uploads.reuse_upload(local_file, ParentData(parent.kind, parent.remote_id))
+        if not remote_id:
+            return False
+        increment_amt = local_file.count_chunks(self.settings.config.upload_bytes_per_chunk)
+        self.settings.watcher.transferring_item(local_file, increment_amt=increment_amt)
+        local_file.set_remote_id_after_send(remote_id)
+        return True
+
+
+class DuplicateUploads(object):
+    """
+    Indexes the uploads of large files and of the large files in the remote project by size so byte identical files
+    can be created from an existing upload instead of sending the same contents again.
+    This lets files that were moved or renamed locally reuse the data already stored in the remote project.
+    Files are only hashed when there is an upload of the same size, so files with a unique size are never read.
+    """
+    def __init__(self, data_service, bytes_per_chunk):
+        """
+        :param data_service: DataServiceApi: where we create files from earlier uploads
+        :param bytes_per_chunk: int: files larger than this are indexed
+        """
+        self.data_service = data_service
+        self.bytes_per_chunk = bytes_per_chunk
+        self.uploads_by_size = {}
+        self.reuse_refused = False
+
+    def add_remote_files(self, remote_project):
+        """
+        Add the upload of each large file in remote_project to the index.
+        :param remote_project: RemoteProject: project tree we are uploading into
+        """
+        ProjectWalker.walk_project(remote_project, self)
+
+    def visit_project(self, item):
+        pass
+
+    def visit_folder(self, item, parent):
+        pass
+
+    def visit_file(self, item, parent):
+        hash_value = item.hashes.get(HashUtil.HASH_NAME)
+        if item.upload_id and hash_value and item.size > self.bytes_per_chunk:
+            self._add(item.size, UploadedContents(item.upload_id, hash_value=hash_value))
+
+    def _add(self, size, uploaded_contents):
+        if not self.reuse_refused:
+            self.uploads_by_size.setdefault(size, []).append(uploaded_contents)
+
+    def add_upload(self, local_file, upload_id):
+        """
+        Save upload_id so later files with the same contents as local_file can reuse it.
+        :param local_file: LocalFile: file that was sent, only hashed if a later file has the same size
+        :param upload_id: str: uuid of the completed upload for local_file
+        """
+        self._add(local_file.size, UploadedContents(upload_id, local_file=local_file))
+
+    def _find_upload_id(self, local_file):
+        candidates = self.uploads_by_size.get(local_file.size)
+        if candidates:
+            hash_value = local_file.get_hash_value()
+            for uploaded_contents in candidates:
+                if uploaded_contents.get_hash_value() == hash_value:
+                    return uploaded_contents.upload_id
+        return None
+
+    def reuse_upload(self, local_file, parent_data):
+        """
+        Create or update local_file in the data service from an upload of the same contents.
+        Stops reusing uploads if the data service refuses to use an upload for more than one file.
+        :param local_file: LocalFile: file we are uploading
+        :param parent_data: ParentData: info about the parent of the file
+        :return: str: uuid of the file or None if the file must be sent
+        """
+        upload_id = self._find_upload_id(local_file)
+        if not upload_id:
+            return None
+        upload_operations = FileUploadOperations(self.data_service)
+        try:
+            return upload_operations.create_or_update_file(upload_id, parent_data, local_file.remote_id)
+        except DataServiceError:
+            self.uploads_by_size = {}
+            self.reuse_refused = True
+            return None
+
+
+class UploadedContents(object):
+    """
+    Upload of a file's contents whose md5 is calculated the first time it is compared.
+    """
+    def __init__(self, upload_id, hash_value=None, local_file=None):
+        """
+        :param upload_id: str: uuid of the completed upload
+        :param hash_value: str: md5 of the contents if known
+        :param local_file: LocalFile: file that was uploaded, used to calculate the md5 if hash_value is None
+        """
+        self.upload_id = upload_id
+        self.hash_value = hash_value
+        self.local_file = local_file
+
+    def get_hash_value(self):
+        if not self.hash_value:
+            self.hash_value = self.local_file.get_hash_value()
+            self.local_file = None
+        return self.hash_value
+
 
 class SmallItemUploadTaskBuilder(object):
     """
@@ -153,13 +360,15 @@ class SmallItemUploadTaskBuilder(object):
         self.task_runner = task_runner
         self.tasks = []
         self.item_to_id = {}
+        self.small_file_batches = {}
 
     def walk_project(self, project):
         """
-        Calls visit_* methods of self.
+        Calls visit_* methods of self then adds any partially filled batches of small files.
         :param project: project we will visit children of.
         """
         ProjectWalker.walk_project(project, self)
+        self.add_small_file_batches()
 
     def visit_project(self, item):
         """
@@ -181,16 +390,44 @@ class SmallItemUploadTaskBuilder(object):
 
     def visit_file(self, item, parent):
         """
-        If file is small add create small file command otherwise raise error.
+        If file is small add it to the batch of small files for parent otherwise raise error.
         Large files shouldn't be passed to SmallItemUploadTaskBuilder.
+        A batch is added as a create small files command once it holds upload_small_file_batch_size files
+        or adding the file would put it over upload_bytes_per_chunk bytes.
         """
         if item.need_to_send:
-            if item.size > self.settings.config.upload_bytes_per_chunk:
+            bytes_per_chunk = self.settings.config.upload_bytes_per_chunk
+            if item.size > bytes_per_chunk:
                 msg = "Programmer Error: Trying to upload large file as small item size:{} name:{}"
                 raise ValueError(msg.format(item.size, item.name))
             else:
-                command = CreateSmallFileCommand(self.settings, item, parent)
-                self.task_runner_add(parent, item, command)
+                batch = self.small_file_batches.get(parent, [])
+                if batch and sum(batch_item.size for batch_item in batch) + item.size > bytes_per_chunk:
+                    self.add_small_file_batch(parent, batch)
+                    batch = []
+                batch.append(item)
+                self.small_file_batches[parent] = batch
+                if len(batch) >= self.settings.config.upload_small_file_batch_size:
+                    self.add_small_file_batch(parent, batch)
+                    del self.small_file_batches[parent]
+
+    def add_small_file_batches(self):
+        """
+        Add create small files commands for the batches that have not filled up.
+        Must be called after all files have been visited.
+        """
+        for parent, batch in self.small_file_batches.items():
+            self.add_small_file_batch(parent, batch)
+        self.small_file_batches = {}
+
+    def add_small_file_batch(self, parent, batch):
+        """
+        Add create small files command to task runner for a batch of files with the same parent.
+        :param parent: object: parent of the files
+        :param batch: [object]: files to upload
+        """
+        command = CreateSmallFilesCommand(self.settings, batch, parent)
+        self.task_runner_add(parent, command, command)
 
     def task_runner_add(self, parent, item, command):
         """
@@ -200,7 +437,10 @@ class SmallItemUploadTaskBuilder(object):
         :param item: object: item we are running command on
         :param command: parallel TaskCommand we want to have run
         """
-        parent_task_id = self.item_to_id.get(parent)
+        parent_task_id = None
+        # a parent with a remote id already exists or its task has finished so there is nothing to wait for
+        if parent is not None and not parent.remote_id:
+            parent_task_id = self.item_to_id.get(parent)
         task_id = self.task_runner.add(parent_task_id, command)
         self.item_to_id[item] = task_id
 
@@ -302,66 +542,99 @@ def upload_folder_run(upload_context):
     return result.json()['id']
 
 
-class CreateSmallFileCommand(object):
+class CreateSmallFilesCommand(object):
     """
-    Creates a small file in the data service.
-    This includes:
+    Creates a batch of small files with the same parent in the data service.
+    Each file requires:
      1) creating an upload
      2) creating an upload url
      3) posting the contents of the file
      4) completing the upload
      5) creating or updating file version
+    The files in a batch are sent from a single task so these round trips overlap instead of running one at a time.
     """
-    def __init__(self, settings, local_file, parent):
+    def __init__(self, settings, local_files, parent):
         """
-        Setup passing in all necessary data to create file and update external state.
+        Setup passing in all necessary data to create files and update external state.
         :param settings: UploadSettings: contains data_service connection info
-        :param local_file: object: information about the file we will upload
-        :param parent: object: parent of the file (folder or project)
+        :param local_files: [object]: information about the files we will upload
+        :param parent: object: parent of the files (folder or project)
         """
         self.settings = settings
-        self.local_file = local_file
+        self.local_files = local_files
         self.parent = parent
-        self.func = create_small_file
+        self.func = create_small_files
 
     def before_run(self, parent_task_result):
         pass
 
     def create_context(self):
         """
-        Create values to be used by create_small_file function.
+        Create values to be used by create_small_files function.
         """
         parent_data = ParentData(self.parent.kind, self.parent.remote_id)
-        path_data = self.local_file.get_path_data()
-        params = parent_data, path_data, self.local_file.remote_id
+        file_params = [(local_file.get_path_data(), local_file.remote_id) for local_file in self.local_files]
+        params = parent_data, file_params
         return UploadContext(self.settings, params)
 
-    def after_run(self, remote_file_id):
+    def after_run(self, results):
         """
-        Save uuid of file to our LocalFile
-        :param remote_file_id: uuid of the file we just created/updated.
+        Save uuid of each file to our LocalFiles and remove any copies staged for uploading them.
+        :param results: [(str, PathData)]: uuid and path data of the files we just created/updated
+        in the same order as local_files.
         """
-        self.settings.watcher.transferring_item(self.local_file)
-        self.local_file.set_remote_id_after_send(remote_file_id)
+        for local_file, (remote_file_id, path_data) in zip(self.local_files, results):
+            self.settings.watcher.transferring_item(local_file)
+            local_file.set_remote_id_after_send(remote_file_id)
+            local_file.remove_staged_file(path_data)
 
 
-def create_small_file(upload_context):
+def create_small_files(upload_context):
     """
-    Function run by CreateSmallFileCommand to create the file.
-    Runs in a background process.
+    Function run by CreateSmallFilesCommand to create the files.
+    Runs in a background process sending up to SMALL_FILE_UPLOAD_THREADS files at a time.
+    The path data of each file is returned since it may have learned about the file while sending it,
+    for example the md5 and size of a file that was compressed for uploading.
     :param upload_context: UploadContext: contains data service setup and file details.
+    :return: [(str, PathData)]: uuid and path data of the files created in the same order as the files in upload_context
     """
     data_service = upload_context.make_data_service()
-    parent_data, path_data, remote_file_id = upload_context.params
+    parent_data, file_params = upload_context.params
+
+    def upload_file(params):
+        path_data, remote_file_id = params
+        remote_id = create_small_file(data_service, upload_context.project_id, parent_data, path_data, remote_file_id)
+        return remote_id, path_data
+
+    if len(file_params) == 1:
+        return [upload_file(file_params[0])]
+    pool = ThreadPool(min(len(file_params), SMALL_FILE_UPLOAD_THREADS))
+    try:
+        return pool.map(upload_file, file_params)
+    finally:
+        pool.close()
+        pool.join()
 
+
+def create_small_file(data_service, project_id, parent_data, path_data, remote_file_id):
+    """
+    Upload a single small file and create or update it in the data service.
+    :param data_service: DataServiceApi: where we will upload to
+    :param project_id: str: uuid of the project we are uploading into
+    :param parent_data: ParentData: parent of the file
+    :param path_data: PathData: file to upload
+    :param remote_file_id: str: uuid of the existing remote file or None to create a new file
+    :return: str: uuid of the file we created/updated
+    """
     # The small file will fit into one chunk so read into memory and hash it.
     chunk_num = 1
     chunk = path_data.read_whole_file()
-    hash_data = path_data.get_hash()
+    hash_data_list = path_data.get_hashes()
+    hash_data = HashData.find(hash_data_list, HashUtil.HASH_NAME)
 
     # Talk to data service uploading chunk and creating the file.
     upload_operations = FileUploadOperations(data_service)
-    upload_id = upload_operations.create_upload(upload_context.project_id, path_data, hash_data)
+    upload_id = upload_operations.create_upload(project_id, path_data, hash_data)
     url_info = upload_operations.create_file_chunk_url(upload_id, chunk_num, chunk)
     upload_operations.send_file_external(url_info, chunk)
-    return upload_operations.finish_upload(upload_id, hash_data, parent_data, remote_file_id)
+    return upload_operations.finish_upload(upload_id, hash_data, parent_data, remote_file_id, hash_data_list)
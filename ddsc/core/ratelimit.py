@@ -0,0 +1,91 @@
+"""
+Limits the combined bandwidth used by all upload and download workers.
+The parent process creates a TokenBucket from config and passes it to each worker process,
+which installs it with set_rate_limiter. Code that transfers data calls limit_transfer.
+"""
+import time
+import ctypes
+from multiprocessing import Array
+
+_rate_limiter = None
+
+
+def create_rate_limiter(config):
+    """
+    Create a rate limiter based on config settings.
+    :param config: ddsc.config.Config: settings that determine the transfer rate
+    :return: TokenBucket or None if transfers are not limited
+    """
+    bytes_per_second = config.transfer_rate_limit
+    if bytes_per_second:
+        return TokenBucket(bytes_per_second, config.transfer_rate_burst)
+    return None
+
+
+def install_rate_limiter(config):
+    """
+    Create and install a rate limiter for this process unless one is already installed.
+    Uploads and downloads in the same process share the same limit.
+    :param config: ddsc.config.Config: settings that determine the transfer rate
+    """
+    if not _rate_limiter:
+        set_rate_limiter(create_rate_limiter(config))
+
+
+def set_rate_limiter(rate_limiter):
+    """
+    Install rate_limiter for this process. Worker processes call this with the limiter passed from the parent.
+    :param rate_limiter: TokenBucket: limiter to use or None to not limit transfers
+    """
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+
+def get_rate_limiter():
+    """
+    Returns the rate limiter installed in this process so it can be passed to worker processes.
+    :return: TokenBucket or None if transfers are not limited
+    """
+    return _rate_limiter
+
+
+def limit_transfer(num_bytes):
+    """
+    Wait until we are allowed to transfer num_bytes. Returns immediately if transfers are not limited.
+    :param num_bytes: int: number of bytes about to be transferred
+    """
+    if _rate_limiter:
+        _rate_limiter.consume(num_bytes)
+
+
+class TokenBucket(object):
+    """
+    Token bucket whose state lives in shared memory so every process it is passed to draws from the same bucket.
+    Tokens refill at bytes_per_second up to burst_bytes.
+    Requests larger than the tokens available borrow against future tokens and sleep until they would have refilled,
+    so callers are served in order and chunks larger than burst_bytes are still allowed.
+    """
+    def __init__(self, bytes_per_second, burst_bytes):
+        """
+        :param bytes_per_second: int: sustained rate to allow
+        :param burst_bytes: int: most bytes that can be transferred at once after being idle
+        """
+        self.bytes_per_second = float(bytes_per_second)
+        self.burst_bytes = float(burst_bytes)
+        # [available tokens, time tokens were last updated]
+        self.state = Array(ctypes.c_double, [self.burst_bytes, time.time()])
+
+    def consume(self, num_bytes):
+        """
+        Take num_bytes tokens from the bucket sleeping if we have to wait for them.
+        :param num_bytes: int: number of bytes about to be transferred
+        """
+        with self.state.get_lock():
+            tokens, last_time = self.state[0], self.state[1]
+            now = time.time()
+            tokens = min(self.burst_bytes, tokens + max(now - last_time, 0) * self.bytes_per_second)
+            tokens -= num_bytes
+            self.state[0] = tokens
+            self.state[1] = now
+        if tokens < 0:
+            time.sleep(-tokens / self.bytes_per_second)
@@ -2,6 +2,7 @@ import os
 from ddsc.core.ddsapi import DataServiceApi, DataServiceError, DataServiceAuth
 from ddsc.core.util import KindType
 from ddsc.core.localstore import HashUtil
+from ddsc.core.remotetreecache import create_remote_tree_cache, create_project_name_index
 
 FETCH_ALL_USERS_PAGE_SIZE = 25
 DOWNLOAD_FILE_CHUNK_SIZE = 20 * 1024 * 1024
@@ -19,55 +20,130 @@ class RemoteStore(object):
         self.config = config
         auth = DataServiceAuth(self.config)
         self.data_service = DataServiceApi(auth, self.config.url)
+        self.remote_tree_cache = create_remote_tree_cache(config)
+        self.project_name_index = create_project_name_index(config)
 
-    def fetch_remote_project(self, project_name, must_exist=False, include_children=True):
+    def fetch_remote_project(self, project_name, must_exist=False, include_children=True, include_paths=None):
         """
         Retrieve the project via project_name.
         :param project_name: str name of the project to try and download
         :param must_exist: should we error if the project doesn't exist
         :param include_children: should we read children(folders/files)
+        :param include_paths: [str]: remote paths to limit children to (None reads all children)
         :return: RemoteProject project requested or None if not found(and must_exist=False)
         """
         project = self._get_my_project(project_name)
         if project:
             if include_children:
-                self._add_project_children(project)
+                self._add_children(project, include_paths)
         else:
             if must_exist:
                 raise ValueError(u'There is no project with the name {}'.format(project_name).encode('utf-8'))
         return project
 
-    def fetch_remote_project_by_id(self, id):
+    def fetch_remote_project_by_id(self, id, include_children=False, include_paths=None):
         """
         Retrieves project from via id
         :param id: str id of project from data service
+        :param include_children: should we read children(folders/files)
+        :param include_paths: [str]: remote paths to limit children to (None reads all children)
         :return: RemoteProject we downloaded
         """
         response = self.data_service.get_project_by_id(id).json()
-        return RemoteProject(response)
+        project = RemoteProject(response)
+        if self.project_name_index:
+            self.project_name_index.set(project.name, project.id)
+        if include_children:
+            self._add_children(project, include_paths)
+        return project
+
+    def _add_children(self, project, include_paths):
+        if include_paths:
+            self._add_project_children_for_paths(project, include_paths)
+        else:
+            self._add_project_children(project)
 
     def _get_my_project(self, project_name):
         """
         Return project tree root for project_name.
+        Tries the project name index before listing all projects.
         :param project_name: str name of the project to download
         :return: RemoteProject project we found or None
         """
+        project = self._get_indexed_project(project_name)
+        if project:
+            return project
         response = self.data_service.get_projects().json()
+        if self.project_name_index:
+            self.project_name_index.replace_all(response['results'])
         for project in response['results']:
             if project['name'] == project_name:
                 return RemoteProject(project)
         return None
 
+    def _get_indexed_project(self, project_name):
+        """
+        Fetch a project using the uuid stored in the project name index.
+        :param project_name: str name of the project
+        :return: RemoteProject or None if not in the index or the index was stale
+        """
+        if not self.project_name_index:
+            return None
+        project_id = self.project_name_index.get(project_name)
+        if not project_id:
+            return None
+        try:
+            response = self.data_service.get_project_by_id(project_id).json()
+        except DataServiceError as e:
+            if e.status_code in (403, 404):
+                return None
+            raise
+        if response['name'] != project_name or response['is_deleted']:
+            return None
+        return RemoteProject(response)
+
     def _add_project_children(self, project):
         """
         Add the rest of the project tree from the remote store to the project object.
+        Uses the remote tree cache when enabled.
         :param project: RemoteProject root of the project tree to add children too
         """
-        response = self.data_service.get_project_children(project.id, '').json()
-        project_children = RemoteProjectChildren(project.id, response['results'])
+        children_data = None
+        if self.remote_tree_cache:
+            children_data = self.remote_tree_cache.load(project)
+        if children_data is None:
+            children_data = self.data_service.get_project_children(project.id, '').json()['results']
+            if self.remote_tree_cache:
+                self.remote_tree_cache.save(project, children_data)
+        project_children = RemoteProjectChildren(project.id, children_data)
         for child in project_children.get_tree():
             project.add_child(child)
 
+    def _add_project_children_for_paths(self, project, include_paths):
+        """
+        Add only the parts of the project tree needed to reach include_paths and everything below them.
+        Walks down to each path one folder listing at a time then fetches that folder's subtree.
+        Paths that don't exist are left out of the tree.
+        :param project: RemoteProject root of the project tree to add children too
+        :param include_paths: [str]: remote paths (relative to the project) to include
+        """
+        if self.remote_tree_cache and self.remote_tree_cache.load(project) is not None:
+            # a cached full tree costs nothing to load
+            self._add_project_children(project)
+            return
+        subtree_fetcher = RemoteSubtreeFetcher(self.data_service, project)
+        # Add parents before their children so a folder's complete contents are only fetched once
+        for include_path in sorted(include_paths, key=len):
+            subtree_fetcher.add_path(include_path)
+
+    def project_changed(self, project_id):
+        """
+        Notify that we have changed the contents of a project so any cached tree is no longer valid.
+        :param project_id: str: uuid of the project
+        """
+        if self.remote_tree_cache:
+            self.remote_tree_cache.remove(project_id)
+
     def lookup_user_by_email_or_username(self, email, username):
         if username:
             return self.lookup_user_by_username(username)
@@ -197,6 +273,8 @@ class RemoteStore(object):
         """
         names = []
         response = self.data_service.get_projects().json()
+        if self.project_name_index:
+            self.project_name_index.replace_all(response['results'])
         for project in response['results']:
             names.append(project['name'])
         return names
@@ -208,10 +286,20 @@ class RemoteStore(object):
         """
         project = self._get_my_project(project_name)
         if project:
-            self.data_service.delete_project(project.id)
+            self.delete_project(project)
         else:
             raise ValueError("No project named '{}' found.\n".format(project_name))
 
+    def delete_project(self, project):
+        """
+        Delete a project we have already fetched.
+        :param project: RemoteProject: project to delete
+        """
+        self.data_service.delete_project(project.id)
+        self.project_changed(project.id)
+        if self.project_name_index:
+            self.project_name_index.remove(project.name)
+
     def get_active_auth_roles(self, context):
         """
         Retrieve non-deprecated authorization roles based on a context.
@@ -244,18 +332,20 @@ class RemoteProject(object):
     Represents the top of a tree.
     Has kind property to allow project tree traversal with ProjectWalker.
     """
+    __slots__ = ('id', 'name', 'description', 'is_deleted', 'children')
+    kind = KindType.project_str
+    remote_path = ''
+
     def __init__(self, json_data):
         """
         Set properties based on json_data.
         :param json_data: dict JSON data containing project info
         """
         self.id = json_data['id']
-        self.kind = json_data['kind']
         self.name = json_data['name']
         self.description = json_data['description']
         self.is_deleted = json_data['is_deleted']
         self.children = []
-        self.remote_path = ''
 
     def add_child(self, child):
         """
@@ -274,18 +364,28 @@ class RemoteFolder(object):
     Represents a leaf or branch in a project tree.
     Has kind property to allow project tree traversal with ProjectWalker.
     """
+    __slots__ = ('id', 'name', 'is_deleted', 'children', 'parent_remote_path')
+    kind = KindType.folder_str
+
     def __init__(self, json_data, parent_remote_path):
         """
         Set properties based on json_data.
         :param json_data: dict JSON data containing folder info
-        :param parent_remote_path: remote_path path to this folder's parent
+        :param parent_remote_path: remote_path path to this folder's parent (shared by siblings)
         """
         self.id = json_data['id']
-        self.kind = json_data['kind']
         self.name = json_data['name']
         self.is_deleted = json_data['is_deleted']
         self.children = []
-        self.remote_path = os.path.join(parent_remote_path, self.name)
+        self.parent_remote_path = parent_remote_path
+
+    @property
+    def remote_path(self):
+        """
+        Path to this folder within the project.
+        :return: str: remote path
+        """
+        return os.path.join(self.parent_remote_path, self.name)
 
     def add_child(self, child):
         """
@@ -304,18 +404,21 @@ class RemoteFile(object):
     Represents a leaf in a project tree.
     Has kind property to allow project tree traversal with ProjectWalker.
     """
+    __slots__ = ('id', 'name', 'is_deleted', 'size', 'file_hash', 'hash_alg', 'other_hashes', 'parent_remote_path',
+                 'upload_id')
+    kind = KindType.file_str
+
     def __init__(self, json_data, parent_remote_path):
         """
         Set properties based on json_data.
         :param json_data: dict JSON data containing file info
-        :param parent_remote_path: remote_path path to this file's parent
+        :param parent_remote_path: remote_path path to this file's parent (shared by siblings)
         """
         self.id = json_data['id']
-        self.kind = json_data['kind']
         self.name = json_data['name']
-        self.path = self.name # for compatibilty with ProgressPrinter
         self.is_deleted = json_data['is_deleted']
         upload = RemoteFile.get_upload_from_json(json_data)
+        self.upload_id = upload.get('id')
         self.size = upload['size']
         self.file_hash = None
         self.hash_alg = None
@@ -323,7 +426,39 @@ class RemoteFile(object):
         if hash_data:
             self.file_hash = hash_data.get('value')
             self.hash_alg = hash_data.get('algorithm')
-        self.remote_path = os.path.join(parent_remote_path, self.name)
+        # Only keep a dict of hashes when there is more than the primary hash(the common case)
+        self.other_hashes = None
+        hashes = RemoteFile.get_hashes_from_upload(upload)
+        if len(hashes) > 1:
+            self.other_hashes = hashes
+        self.parent_remote_path = parent_remote_path
+
+    @property
+    def path(self):
+        """
+        Name of the file for compatibility with ProgressPrinter.
+        """
+        return self.name
+
+    @property
+    def remote_path(self):
+        """
+        Path to this file within the project.
+        :return: str: remote path
+        """
+        return os.path.join(self.parent_remote_path, self.name)
+
+    @property
+    def hashes(self):
+        """
+        All hashes for this file.
+        :return: dict: hash algorithm name -> hash value
+        """
+        if self.other_hashes:
+            return self.other_hashes
+        if self.hash_alg:
+            return {self.hash_alg: self.file_hash}
+        return {}
 
     def set_hash(self, file_hash, hash_alg):
         """
@@ -333,6 +468,7 @@ class RemoteFile(object):
         """
         self.file_hash = file_hash
         self.hash_alg = hash_alg
+        self.other_hashes = None
 
     @staticmethod
     def get_upload_from_json(json_data):
@@ -365,6 +501,24 @@ class RemoteFile(object):
                     return hash_info
         return None
 
+    @staticmethod
+    def get_hashes_from_upload(upload):
+        """
+        Find all hash values in upload dictionary.
+        :param upload: dictionary: contains hash data in DukeDS upload format.
+        :return: dict: hash algorithm name -> hash value
+        """
+        hashes = {}
+        hash_info_list = upload.get('hashes') or []
+        if upload.get('hash'):
+            hash_info_list = [upload.get('hash')] + hash_info_list
+        for hash_info in hash_info_list:
+            algorithm = hash_info.get('algorithm')
+            value = hash_info.get('value')
+            if algorithm and value and algorithm not in hashes:
+                hashes[algorithm] = value
+        return hashes
+
     def __str__(self):
         return 'file: {} id:{} size:{}'.format(self.name, self.id, self.size)
 
@@ -419,6 +573,20 @@ class RemoteProjectChildren(object):
         """
         self.project_id = project_id
         self.data = data
+        self._parent_id_to_children = None
+
+    def _get_parent_id_to_children(self):
+        """
+        Build (once) a lookup of parent uuid to the list of child dictionaries in a single pass over data.
+        :return: dict: parent uuid -> [dict]
+        """
+        if self._parent_id_to_children is None:
+            parent_id_to_children = {}
+            for child in self.data:
+                parent_id = child['parent']['id']
+                parent_id_to_children.setdefault(parent_id, []).append(child)
+            self._parent_id_to_children = parent_id_to_children
+        return self._parent_id_to_children
 
     def _get_children_for_parent(self, parent_id):
         """
@@ -426,35 +594,97 @@ class RemoteProjectChildren(object):
         :param parent_id: str: uuid of the parent
         :return: [dict]: children in this list with parent_id parent
         """
-        children = []
-        for child in self.data:
-            parent = child['parent']
-            if parent['id'] == parent_id:
-                children.append(child)
-        return children
+        return self._get_parent_id_to_children().get(parent_id, [])
 
-    def get_tree(self):
+    def get_tree(self, parent_remote_path=''):
         """
         Return array of RemoteFolders(with appropriate children)/RemoteFiles based on the values from constructor.
+        Builds the tree iteratively so deeply nested projects don't hit the recursion limit.
+        :param parent_remote_path: str: remote path of the top parent (used when building a folder's subtree)
         :return: [RemoteFolder/RemoteFile]
         """
-        return self.get_tree_recur(self.project_id, '')
+        top_children = []
+        # Each entry is (parent uuid, parent remote path, list to append the parent's children to)
+        parents_to_fill = [(self.project_id, parent_remote_path, top_children)]
+        while parents_to_fill:
+            parent_id, parent_path, children = parents_to_fill.pop()
+            for child_data in self._get_children_for_parent(parent_id):
+                if child_data['kind'] == KindType.folder_str:
+                    folder = RemoteFolder(child_data, parent_path)
+                    parents_to_fill.append((folder.id, folder.remote_path, folder.children))
+                    children.append(folder)
+                else:
+                    children.append(RemoteFile(child_data, parent_path))
+        return top_children
+
+
+class RemoteSubtreeFetcher(object):
+    """
+    Adds specific paths and their contents to a RemoteProject without fetching the entire project tree.
+    """
+    def __init__(self, data_service, project):
+        """
+        :param data_service: DataServiceApi: where we will fetch folder listings from
+        :param project: RemoteProject: project to add children to
+        """
+        self.data_service = data_service
+        self.project = project
+        self.id_to_item = {project.id: project}
+        self.listings = {}
+        self.complete_folder_ids = set()
+
+    def add_path(self, remote_path):
+        """
+        Add the item at remote_path, its parent folders and (for folders) all of its contents to the project.
+        :param remote_path: str: path relative to the project
+        """
+        parent = self.project
+        for name in [part for part in remote_path.split(os.sep) if part]:
+            parent = self._get_child(parent, name)
+            if not parent or parent.id in self.complete_folder_ids:
+                return
+        if KindType.is_folder(parent):
+            self._add_folder_contents(parent)
+
+    def _get_child(self, parent, name):
+        """
+        Find (and add to the tree) the child named name of parent using a non-recursive listing.
+        :param parent: RemoteProject/RemoteFolder: parent to look in
+        :param name: str: name of the child
+        :return: RemoteFolder/RemoteFile or None if not found or parent is a file
+        """
+        if KindType.is_file(parent):
+            return None
+        for child_data in self._get_listing(parent):
+            if child_data['name'] == name:
+                child = self.id_to_item.get(child_data['id'])
+                if not child:
+                    if child_data['kind'] == KindType.folder_str:
+                        child = RemoteFolder(child_data, parent.remote_path)
+                    else:
+                        child = RemoteFile(child_data, parent.remote_path)
+                    self.id_to_item[child.id] = child
+                    parent.add_child(child)
+                return child
+        return None
+
+    def _get_listing(self, parent):
+        listing = self.listings.get(parent.id)
+        if listing is None:
+            if KindType.is_project(parent):
+                response = self.data_service.get_project_children(parent.id, None)
+            else:
+                response = self.data_service.get_folder_children(parent.id, None)
+            listing = response.json()['results']
+            self.listings[parent.id] = listing
+        return listing
 
-    def get_tree_recur(self, parent_id, parent_path):
+    def _add_folder_contents(self, folder):
         """
-        Recursively create array RemoteFolders/RemoteFiles.
-        :param parent_id: str: uuid if the parent to find children for
-        :param parent_path: str: remote path of parent to build child paths
-        :return: [RemoteFolder/RemoteFile]
+        Fetch all children below folder with one recursive request and add them to the tree.
+        :param folder: RemoteFolder: folder to fill in
         """
-        children = []
-        for child_data in self._get_children_for_parent(parent_id):
-            if child_data['kind'] == KindType.folder_str:
-                folder = RemoteFolder(child_data, parent_path)
-                for grand_child in self.get_tree_recur(child_data['id'], folder.remote_path):
-                    folder.add_child(grand_child)
-                children.append(folder)
-            else:
-                file = RemoteFile(child_data, parent_path)
-                children.append(file)
-        return children
+        response = self.data_service.get_folder_children(folder.id, '').json()
+        folder_children = RemoteProjectChildren(folder.id, response['results'])
+        folder.children = folder_children.get_tree(folder.remote_path)
+        self.complete_folder_ids.add(folder.id)
@@ -0,0 +1,215 @@
+"""
+Persistent caches of remote project data so repeated commands make fewer requests.
+RemoteTreeCache stores project children listings and ProjectNameIndex stores project name to id lookups.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from ddsc.core.util import KindType, write_file_atomically
+
+CACHE_FORMAT_VERSION = 2
+PROJECT_NAME_INDEX_FILENAME = 'project_names_{}.json'
+
+
+def create_remote_tree_cache(config):
+    """
+    Create a remote tree cache based on config settings.
+    :param config: ddsc.config.Config: settings that determine where the cache lives and how long entries are valid
+    :return: RemoteTreeCache or None if the remote tree cache is disabled
+    """
+    cache_dir = config.remote_tree_cache_dir
+    if cache_dir:
+        return RemoteTreeCache(cache_dir, config.url, config.remote_tree_cache_seconds)
+    return None
+
+
+def create_project_name_index(config):
+    """
+    Create a project name index based on config settings.
+    :param config: ddsc.config.Config: settings that determine where the index lives
+    :return: ProjectNameIndex or None if caching is disabled
+    """
+    if config.cache_dir:
+        filename = PROJECT_NAME_INDEX_FILENAME.format(get_server_key(config.url))
+        return ProjectNameIndex(os.path.join(config.cache_dir, filename))
+    return None
+
+
+def get_server_key(url):
+    """
+    Create a short string that can be used in filenames to keep data from different servers separate.
+    :param url: str: url of the data service
+    :return: str: key for the server
+    """
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+class RemoteTreeCache(object):
+    """
+    Stores the children listing of remote projects as gzipped JSON files, one per project and server url.
+    Only the fields needed to build RemoteFolder/RemoteFile objects are saved.
+    An entry is used until it is older than max_age_seconds.
+    DukeDS doesn't update anything on the project when files or folders below it change,
+    so changes made by other clients are not seen until the entry expires.
+    """
+    def __init__(self, cache_dir, url, max_age_seconds):
+        """
+        Setup cache to be stored in cache_dir.
+        :param cache_dir: str: directory to store cache files in (created if necessary)
+        :param url: str: url of the data service (keeps different servers separate)
+        :param max_age_seconds: int: how long a cached project tree may be used
+        """
+        self.cache_dir = cache_dir
+        self.url = url
+        self.max_age_seconds = max_age_seconds
+
+    def _get_filename(self, project_id):
+        return os.path.join(self.cache_dir, '{}_{}.json.gz'.format(get_server_key(self.url), project_id))
+
+    def load(self, project):
+        """
+        Lookup cached children for a project.
+        :param project: RemoteProject: project to find children for
+        :return: [dict]: children in DukeDS recursive project children format or None if not cached
+        """
+        try:
+            with gzip.open(self._get_filename(project.id), 'rb') as infile:
+                cache_data = json.loads(infile.read().decode('utf-8'))
+        except (IOError, OSError, ValueError, EOFError):
+            return None
+        if cache_data.get('version') != CACHE_FORMAT_VERSION:
+            return None
+        age = time.time() - cache_data.get('cached_on', 0)
+        if age < 0 or age > self.max_age_seconds:
+            return None
+        return cache_data['children']
+
+    def save(self, project, children):
+        """
+        Save children for a project replacing any previous entry.
+        :param project: RemoteProject: project the children belong to
+        :param children: [dict]: children in DukeDS recursive project children format
+        """
+        cache_data = {
+            'version': CACHE_FORMAT_VERSION,
+            'cached_on': time.time(),
+            'children': [RemoteTreeCache._compact_child(child) for child in children],
+        }
+        data = json.dumps(cache_data, separators=(',', ':')).encode('utf-8')
+        try:
+            write_file_atomically(self._get_filename(project.id), data, gzip.open)
+        except (IOError, OSError):
+            pass  # failing to cache just means we fetch the project children next time
+
+    def remove(self, project_id):
+        """
+        Remove any cached children for a project. Call after changing the project.
+        :param project_id: str: uuid of the project
+        """
+        try:
+            os.remove(self._get_filename(project_id))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _compact_child(child):
+        """
+        Reduce a project child dictionary to the fields used by RemoteFolder and RemoteFile.
+        :param child: dict: DukeDS file or folder
+        :return: dict: subset of child
+        """
+        compact_child = {
+            'id': child['id'],
+            'kind': child['kind'],
+            'name': child['name'],
+            'is_deleted': child['is_deleted'],
+            'parent': {'id': child['parent']['id']},
+        }
+        if child['kind'] == KindType.file_str:
+            if 'current_version' in child:
+                upload = child['current_version']['upload']
+            else:
+                upload = child['upload']
+            compact_child['upload'] = {
+                'id': upload.get('id'),
+                'size': upload['size'],
+                'hash': RemoteTreeCache._compact_hash(upload.get('hash')),
+                'hashes': [RemoteTreeCache._compact_hash(hash_info) for hash_info in upload.get('hashes') or []],
+            }
+        return compact_child
+
+    @staticmethod
+    def _compact_hash(hash_info):
+        if hash_info:
+            return {'algorithm': hash_info.get('algorithm'), 'value': hash_info.get('value')}
+        return None
+
+
+class ProjectNameIndex(object):
+    """
+    Stores a lookup of project name to project uuid in a JSON file.
+    Entries may be stale so callers must check the name of the project they fetch by id.
+    """
+    def __init__(self, filename):
+        """
+        Setup index to be stored in filename.
+        :param filename: str: path to the JSON file (created if necessary)
+        """
+        self.filename = filename
+        self._name_to_id = None
+
+    def _get_name_to_id(self):
+        if self._name_to_id is None:
+            try:
+                with open(self.filename, 'rb') as infile:
+                    self._name_to_id = json.loads(infile.read().decode('utf-8'))
+            except (IOError, OSError, ValueError):
+                self._name_to_id = {}
+        return self._name_to_id
+
+    def _save(self):
+        try:
+            write_file_atomically(self.filename, json.dumps(self._name_to_id).encode('utf-8'))
+        except (IOError, OSError):
+            pass  # failing to save just means we look up the project by listing all projects next time
+
+    def get(self, project_name):
+        """
+        Lookup the uuid last seen for a project name.
+        :param project_name: str: name of the project
+        :return: str: project uuid or None if not in the index
+        """
+        return self._get_name_to_id().get(project_name)
+
+    def set(self, project_name, project_id):
+        """
+        Record the uuid for a project name.
+        :param project_name: str: name of the project
+        :param project_id: str: uuid of the project
+        """
+        name_to_id = self._get_name_to_id()
+        if name_to_id.get(project_name) != project_id:
+            name_to_id[project_name] = project_id
+            self._save()
+
+    def remove(self, project_name):
+        """
+        Remove a project name from the index.
+        :param project_name: str: name of the project
+        """
+        if self._get_name_to_id().pop(project_name, None):
+            self._save()
+
+    def replace_all(self, projects):
+        """
+        Replace the contents of the index with a complete list of projects.
+        When names are duplicated the first project wins.
+        :param projects: [dict]: DukeDS project dictionaries
+        """
+        name_to_id = {}
+        for project in projects:
+            name_to_id.setdefault(project['name'], project['id'])
+        self._name_to_id = name_to_id
+        self._save()
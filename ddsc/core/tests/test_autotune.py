@@ -0,0 +1,96 @@
+from unittest import TestCase
+import os
+import json
+import shutil
+import tempfile
+from ddsc.core.autotune import WorkerAutotuner, create_worker_autotuner, MIN_AUTOTUNE_SAMPLE_BYTES, \
+    UPLOAD_TRANSFER, DOWNLOAD_TRANSFER
+
+SAMPLE_BYTES = MIN_AUTOTUNE_SAMPLE_BYTES
+
+
+class FakeConfig(object):
+    def __init__(self, autotune_workers, cache_dir, url='https://api.example.com/api/v1'):
+        self.autotune_workers = autotune_workers
+        self.cache_dir = cache_dir
+        self.url = url
+
+
+class TestWorkerAutotuner(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'autotune.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_increases_while_throughput_holds(self):
+        autotuner = WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 2)
+        autotuner.record_transfer(SAMPLE_BYTES, 10, 2)
+        self.assertEqual(3, autotuner.workers)
+        autotuner.record_transfer(SAMPLE_BYTES, 9.5, 3)
+        self.assertEqual(4, autotuner.workers)
+
+    def test_decreases_when_throughput_drops(self):
+        autotuner = WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 8)
+        autotuner.record_transfer(SAMPLE_BYTES, 10, 8)
+        self.assertEqual(9, autotuner.workers)
+        autotuner.record_transfer(SAMPLE_BYTES, 20, 9)
+        self.assertEqual(6, autotuner.workers)
+
+    def test_error_halves_workers(self):
+        autotuner = WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 8)
+        autotuner.record_error()
+        self.assertEqual(4, autotuner.workers)
+        autotuner.record_error()
+        autotuner.record_error()
+        autotuner.record_error()
+        self.assertEqual(1, autotuner.workers)
+
+    def test_ignores_small_or_mismatched_transfers(self):
+        autotuner = WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 4)
+        autotuner.record_transfer(SAMPLE_BYTES - 1, 1, 4)
+        autotuner.record_transfer(SAMPLE_BYTES, 1, 2)
+        self.assertEqual(4, autotuner.workers)
+
+    def test_max_workers(self):
+        autotuner = WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 10, max_workers=3)
+        self.assertEqual(3, autotuner.workers)
+        autotuner.record_transfer(SAMPLE_BYTES, 1, 3)
+        self.assertEqual(3, autotuner.workers)
+
+    def test_save_and_load(self):
+        autotuner = WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 2)
+        autotuner.record_transfer(SAMPLE_BYTES, 10, 2)
+        autotuner.save()
+        upload_autotuner = WorkerAutotuner(self.filename, UPLOAD_TRANSFER, 5)
+        self.assertEqual(5, upload_autotuner.workers)
+        upload_autotuner.save()
+        with open(self.filename) as infile:
+            self.assertEqual({DOWNLOAD_TRANSFER: 3, UPLOAD_TRANSFER: 5}, json.load(infile))
+        self.assertEqual(3, WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 2).workers)
+
+    def test_corrupt_file_uses_initial_workers(self):
+        with open(self.filename, 'w') as outfile:
+            outfile.write('{not json')
+        self.assertEqual(2, WorkerAutotuner(self.filename, DOWNLOAD_TRANSFER, 2).workers)
+
+
+class TestCreateWorkerAutotuner(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_disabled(self):
+        self.assertIsNone(create_worker_autotuner(FakeConfig(False, self.temp_dir), DOWNLOAD_TRANSFER, 2))
+        self.assertIsNone(create_worker_autotuner(FakeConfig(True, ''), DOWNLOAD_TRANSFER, 2))
+
+    def test_saved_per_server(self):
+        autotuner = create_worker_autotuner(FakeConfig(True, self.temp_dir), DOWNLOAD_TRANSFER, 2)
+        autotuner.record_transfer(SAMPLE_BYTES, 10, 2)
+        autotuner.save()
+        self.assertEqual(3, create_worker_autotuner(FakeConfig(True, self.temp_dir), DOWNLOAD_TRANSFER, 2).workers)
+        other_server = FakeConfig(True, self.temp_dir, url='https://other.example.com/api/v1')
+        self.assertEqual(2, create_worker_autotuner(other_server, DOWNLOAD_TRANSFER, 2).workers)
@@ -0,0 +1,90 @@
+from unittest import TestCase
+import os
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+from ddsc.core.bundle import create_bundles, extract_bundle, is_bundle, is_bundle_manifest, BUNDLE_SUFFIX, \
+    MANIFEST_SUFFIX
+
+
+class TestBundle(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.temp_dir, 'results')
+        os.makedirs(os.path.join(self.folder, 'sub', 'empty'))
+        self.write_file(os.path.join(self.folder, 'a.txt'), b'hello')
+        self.write_file(os.path.join(self.folder, 'sub', 'b.txt'), b'world!')
+        self.write_file(os.path.join(self.folder, '.DS_Store'), b'skip')
+        self.other_file = os.path.join(self.temp_dir, 'other.txt')
+        self.write_file(self.other_file, b'other')
+        self.staging_dir = os.path.join(self.temp_dir, 'staging')
+        os.mkdir(self.staging_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    @staticmethod
+    def write_file(path, data):
+        with open(path, 'wb') as outfile:
+            outfile.write(data)
+
+    def test_create_bundles(self):
+        paths = create_bundles([self.folder, self.other_file], self.staging_dir, '^\\.DS_Store$')
+        bundle_path = os.path.join(self.staging_dir, 'results' + BUNDLE_SUFFIX)
+        manifest_path = os.path.join(self.staging_dir, 'results' + MANIFEST_SUFFIX)
+        self.assertEqual([bundle_path, manifest_path, self.other_file], paths)
+        with open(manifest_path) as infile:
+            manifest = json.load(infile)
+        self.assertEqual('results' + BUNDLE_SUFFIX, manifest['bundle'])
+        self.assertEqual([
+            {'path': 'a.txt', 'size': 5, 'md5': '5d41402abc4b2a76b9719d911017c592'},
+            {'path': 'sub/b.txt', 'size': 6, 'md5': '08cf82251c975a5e9734699fadf5e9c0'},
+        ], manifest['files'])
+        bundle = tarfile.open(bundle_path)
+        self.assertEqual(['a.txt', 'sub', 'sub/b.txt', 'sub/empty'], sorted(bundle.getnames()))
+        bundle.close()
+
+    def test_bundle_unchanged_folder_is_identical(self):
+        create_bundles([self.folder], self.staging_dir, '')
+        bundle_path = os.path.join(self.staging_dir, 'results' + BUNDLE_SUFFIX)
+        with open(bundle_path, 'rb') as infile:
+            first_bundle = infile.read()
+        other_staging_dir = os.path.join(self.temp_dir, 'staging2')
+        os.mkdir(other_staging_dir)
+        create_bundles([self.folder], other_staging_dir, '')
+        with open(os.path.join(other_staging_dir, 'results' + BUNDLE_SUFFIX), 'rb') as infile:
+            self.assertEqual(first_bundle, infile.read())
+
+    def test_duplicate_folder_names(self):
+        with self.assertRaises(ValueError):
+            create_bundles([self.folder, self.folder], self.staging_dir, '')
+
+    def test_extract_bundle(self):
+        create_bundles([self.folder], self.staging_dir, '^\\.DS_Store$')
+        bundle_path = os.path.join(self.staging_dir, 'results' + BUNDLE_SUFFIX)
+        folder = extract_bundle(bundle_path)
+        self.assertEqual(os.path.join(self.staging_dir, 'results'), folder)
+        self.assertFalse(os.path.exists(bundle_path))
+        with open(os.path.join(folder, 'sub', 'b.txt'), 'rb') as infile:
+            self.assertEqual(b'world!', infile.read())
+        self.assertTrue(os.path.isdir(os.path.join(folder, 'sub', 'empty')))
+        self.assertFalse(os.path.exists(os.path.join(folder, '.DS_Store')))
+
+    def test_extract_rejects_paths_outside_folder(self):
+        bundle_path = os.path.join(self.staging_dir, 'bad' + BUNDLE_SUFFIX)
+        bundle = tarfile.open(bundle_path, 'w')
+        tarinfo = tarfile.TarInfo('../escape.txt')
+        tarinfo.size = 3
+        bundle.addfile(tarinfo, io.BytesIO(b'bad'))
+        bundle.close()
+        with self.assertRaises(ValueError):
+            extract_bundle(bundle_path)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'escape.txt')))
+
+    def test_is_bundle(self):
+        self.assertTrue(is_bundle('results' + BUNDLE_SUFFIX))
+        self.assertFalse(is_bundle('results.tar'))
+        self.assertTrue(is_bundle_manifest('results' + MANIFEST_SUFFIX))
+        self.assertFalse(is_bundle_manifest('results.json'))
@@ -0,0 +1,181 @@
+from unittest import TestCase
+import os
+import gzip
+import pickle
+import shutil
+import tempfile
+from ddsc.core.compression import is_compressible, is_compressed, compress_file, decompress_file, \
+    compress_local_files, CompressedLocalFile
+from ddsc.core.localstore import LocalFile, LocalFolder, FileCompareStats, HashData
+
+
+class FakeHashCache(object):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, stat_info, hash_alg):
+        return self.values.get(hash_alg)
+
+    def set(self, stat_info, hash_alg, hash_value):
+        self.values[hash_alg] = hash_value
+
+
+class FakeRemoteFile(object):
+    def __init__(self, name, size, hashes):
+        self.id = 'remote-' + name
+        self.name = name
+        self.size = size
+        self.hashes = hashes
+
+
+class TestCompressFile(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.vcf')
+        with open(self.path, 'w') as outfile:
+            outfile.write('chr1\t100\t.\tA\tT\n' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_is_compressible(self):
+        self.assertEqual(True, is_compressible('data.vcf'))
+        self.assertEqual(True, is_compressible('reads.FASTQ'))
+        self.assertEqual(False, is_compressible('reads.fastq.gz'))
+        self.assertEqual(False, is_compressible('image.png'))
+        self.assertEqual(True, is_compressed('data.vcf.ddsclient.gz'))
+        self.assertEqual(False, is_compressed('data.vcf.gz'))
+
+    def test_compress_is_repeatable(self):
+        first = compress_file(self.path, os.path.join(self.temp_dir, 'first.gz'), 6)
+        second = compress_file(self.path, os.path.join(self.temp_dir, 'second.gz'), 6)
+        self.assertEqual(first, second)
+        self.assertEqual(os.path.getsize(os.path.join(self.temp_dir, 'first.gz')), first[1])
+        self.assertLess(first[1], os.path.getsize(self.path))
+
+    def test_decompress_file(self):
+        compressed_path = self.path + '.ddsclient.gz'
+        compress_file(self.path, compressed_path, 1)
+        with open(self.path, 'rb') as infile:
+            original = infile.read()
+        os.remove(self.path)
+        self.assertEqual(self.path, decompress_file(compressed_path))
+        self.assertEqual(['data.vcf'], os.listdir(self.temp_dir))
+        with open(self.path, 'rb') as infile:
+            self.assertEqual(original, infile.read())
+
+    def test_readable_by_gzip(self):
+        compressed_path = os.path.join(self.temp_dir, 'data.gz')
+        compress_file(self.path, compressed_path, 9)
+        with open(self.path, 'rb') as infile:
+            original = infile.read()
+        gzip_file = gzip.open(compressed_path, 'rb')
+        try:
+            self.assertEqual(original, gzip_file.read())
+        finally:
+            gzip_file.close()
+
+
+class TestCompressedLocalFile(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.staging_dir = os.path.join(self.temp_dir, 'staging')
+        os.mkdir(self.staging_dir)
+        self.path = os.path.join(self.temp_dir, 'data.csv')
+        with open(self.path, 'w') as outfile:
+            outfile.write('a,b,c\n' * 1000)
+        self.hash_cache = FakeHashCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_compress_local_files(self):
+        folder = LocalFolder(self.temp_dir)
+        folder.add_child(LocalFile(self.path))
+        other_path = os.path.join(self.temp_dir, 'staging', 'image.png')
+        with open(other_path, 'w') as outfile:
+            outfile.write('png')
+        folder.add_child(LocalFile(other_path))
+        compress_local_files(folder, 6, self.staging_dir)
+        self.assertEqual(['data.csv.ddsclient.gz', 'image.png'], [child.name for child in folder.children])
+        self.assertEqual(False, isinstance(folder.children[1], CompressedLocalFile))
+
+    def test_uploads_staged_file(self):
+        compressed_file = CompressedLocalFile(LocalFile(self.path, self.hash_cache), 6, self.staging_dir)
+        # the original size is used until the file has been compressed
+        self.assertEqual(os.path.getsize(self.path), compressed_file.size)
+        self.assertEqual([], os.listdir(self.staging_dir))
+        path_data = compressed_file.get_path_data()
+        self.assertEqual('data.csv.ddsclient.gz', path_data.name())
+        size = path_data.size()
+        self.assertEqual(size, compressed_file.size)
+        self.assertEqual(compressed_file.get_hash_value(), path_data.get_hash().value)
+        self.assertEqual(self.path + '.ddsclient.gz', compressed_file.path)
+        compressed_file.remove_staged_file()
+        self.assertEqual([], os.listdir(self.staging_dir))
+        self.assertLess(compressed_file.size, os.path.getsize(self.path))
+
+    def test_compressed_once_by_uploading_process(self):
+        compressed_file = CompressedLocalFile(LocalFile(self.path), 6, self.staging_dir)
+        # path data is sent to an upload worker which compresses the file
+        worker_path_data = pickle.loads(pickle.dumps(compressed_file.get_path_data()))
+        self.assertEqual(None, compressed_file.get_path_data().compressed_info)
+        hash_data = HashData.find(worker_path_data.get_hashes(), 'md5')
+        with open(worker_path_data.path, 'rb') as infile:
+            self.assertEqual(worker_path_data.size(), len(infile.read()))
+        compressed_file.remove_staged_file(worker_path_data)
+        self.assertEqual([], os.listdir(self.staging_dir))
+        # md5 and size reported after the upload come from the worker
+        self.assertEqual(hash_data.value, compressed_file.get_hash_value())
+        self.assertEqual(worker_path_data.size(), compressed_file.size)
+        self.assertEqual([], os.listdir(self.staging_dir))
+
+    def test_differing_file_keeps_compressed_copy(self):
+        compressed_file = CompressedLocalFile(LocalFile(self.path), 6, self.staging_dir)
+        compressed_file.update_remote_ids(FakeRemoteFile('data.csv.ddsclient.gz', 10, {'md5': 'abc'}),
+                                          FileCompareStats())
+        self.assertEqual(1, len(os.listdir(self.staging_dir)))
+        path_data = compressed_file.get_path_data()
+        compressed_info = path_data.compressed_info
+        # uploading reuses the file compressed to compare it
+        path_data = pickle.loads(pickle.dumps(path_data))
+        self.assertEqual(compressed_info[1], path_data.size())
+        self.assertEqual(compressed_info, path_data.compressed_info)
+
+    def test_matching_file_removes_compressed_copy(self):
+        compressed_file = CompressedLocalFile(LocalFile(self.path), 6, self.staging_dir)
+        hash_value, size = compressed_file.get_path_data().stage()
+        compressed_file.update_remote_ids(FakeRemoteFile('data.csv.ddsclient.gz', size, {'md5': hash_value}),
+                                          FileCompareStats())
+        self.assertEqual(False, compressed_file.need_to_send)
+        self.assertEqual([], os.listdir(self.staging_dir))
+
+    def test_matching_remote_file_uses_hash_cache(self):
+        compressed_file = CompressedLocalFile(LocalFile(self.path, self.hash_cache), 6, self.staging_dir)
+        hash_value = compressed_file.get_hash_value()
+        remote_file = FakeRemoteFile('data.csv.ddsclient.gz', compressed_file.size, {'md5': hash_value})
+        # a new scan of the same file finds the compressed md5 and size in the hash cache
+        compressed_file = CompressedLocalFile(LocalFile(self.path, self.hash_cache), 6, self.staging_dir)
+        stats = FileCompareStats()
+        compressed_file.update_remote_ids(remote_file, stats)
+        self.assertEqual(False, compressed_file.need_to_send)
+        self.assertEqual('remote-data.csv.ddsclient.gz', compressed_file.remote_id)
+        self.assertEqual(1, stats.cached_hash)
+        self.assertEqual(None, compressed_file.staged_path)
+
+    def test_changed_remote_file(self):
+        compressed_file = CompressedLocalFile(LocalFile(self.path, self.hash_cache), 6, self.staging_dir)
+        stats = FileCompareStats()
+        compressed_file.update_remote_ids(FakeRemoteFile('data.csv.ddsclient.gz', 10, {'md5': 'abc'}), stats)
+        self.assertEqual(True, compressed_file.need_to_send)
+        self.assertEqual(1, stats.size_differs)
+        stats = FileCompareStats()
+        compressed_file.update_remote_ids(FakeRemoteFile('data.csv.ddsclient.gz', compressed_file.size,
+                                                         {'md5': 'abc'}), stats)
+        self.assertEqual(True, compressed_file.need_to_send)
+        self.assertEqual(1, stats.computed_hash)
+
+    def test_cache_keys_include_level(self):
+        CompressedLocalFile(LocalFile(self.path, self.hash_cache), 1, self.staging_dir).get_hash_value()
+        CompressedLocalFile(LocalFile(self.path, self.hash_cache), 9, self.staging_dir).get_hash_value()
+        self.assertEqual(set(['gzip1-md5', 'gzip1-size', 'gzip9-md5', 'gzip9-size']), set(self.hash_cache.values))
@@ -0,0 +1,174 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+from ddsc.core.download import ProjectDownload, FileUrlPrefetcher, RemoteContentCounter
+from ddsc.core.filedownloader import DownloadHashMismatch
+from ddsc.core.bundle import create_bundles
+from ddsc.core.compression import compress_file
+
+
+class FakeConfig(object):
+    def __init__(self, download_retries):
+        self.download_retries = download_retries
+
+
+class FakeRemoteStore(object):
+    def __init__(self, download_retries):
+        self.config = FakeConfig(download_retries)
+
+
+class FakeWatcher(object):
+    def __init__(self):
+        self.warnings = []
+
+    def show_warning(self, message):
+        self.warnings.append(message)
+
+
+class FakeRemoteFile(object):
+    def __init__(self, remote_path, size=0):
+        self.remote_path = remote_path
+        self.name = os.path.basename(remote_path)
+        self.size = size
+
+
+class FailingProjectDownload(ProjectDownload):
+    def __init__(self, download_retries, failures):
+        super(FailingProjectDownload, self).__init__(FakeRemoteStore(download_retries), 'myproject', '/tmp/dest',
+                                                     None)
+        self.watcher = FakeWatcher()
+        self.failures = failures
+        self.attempts = 0
+
+    def download_file(self, item, path):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise DownloadHashMismatch("Bad md5")
+
+
+class TestProjectDownload(TestCase):
+    def test_visit_file_retries_hash_mismatch(self):
+        project_download = FailingProjectDownload(download_retries=2, failures=2)
+        project_download.visit_file(FakeRemoteFile('data.txt'), None)
+        self.assertEqual(3, project_download.attempts)
+        self.assertEqual(2, len(project_download.watcher.warnings))
+
+    def test_visit_file_gives_up_after_retries(self):
+        project_download = FailingProjectDownload(download_retries=1, failures=5)
+        with self.assertRaises(DownloadHashMismatch):
+            project_download.visit_file(FakeRemoteFile('data.txt'), None)
+        self.assertEqual(2, project_download.attempts)
+
+    def test_visit_file_no_retries(self):
+        project_download = FailingProjectDownload(download_retries=0, failures=1)
+        with self.assertRaises(DownloadHashMismatch):
+            project_download.visit_file(FakeRemoteFile('data.txt'), None)
+        self.assertEqual(1, project_download.attempts)
+
+
+class CopyingProjectDownload(ProjectDownload):
+    """
+    Downloads files by copying them from source_directory.
+    """
+    def __init__(self, source_directory, dest_directory):
+        super(CopyingProjectDownload, self).__init__(FakeRemoteStore(0), 'myproject', dest_directory, None)
+        self.source_directory = source_directory
+        self.downloaded = []
+
+    def download_file(self, item, path):
+        self.downloaded.append(item.remote_path)
+        shutil.copy(os.path.join(self.source_directory, item.remote_path), path)
+
+
+class TestProjectDownloadBundles(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        folder = os.path.join(self.temp_dir, 'results')
+        os.mkdir(folder)
+        with open(os.path.join(folder, 'data.txt'), 'w') as outfile:
+            outfile.write('data')
+        self.source_dir = os.path.join(self.temp_dir, 'source')
+        self.dest_dir = os.path.join(self.temp_dir, 'dest')
+        os.mkdir(self.source_dir)
+        os.mkdir(self.dest_dir)
+        create_bundles([folder], self.source_dir, '')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_visit_file_unpacks_bundle_and_skips_manifest(self):
+        project_download = CopyingProjectDownload(self.source_dir, self.dest_dir)
+        project_download.visit_file(FakeRemoteFile('results.ddsclient-bundle.json'), None)
+        project_download.visit_file(FakeRemoteFile('results.ddsclient-bundle.tar'), None)
+        self.assertEqual(['results.ddsclient-bundle.tar'], project_download.downloaded)
+        self.assertEqual(['results'], os.listdir(self.dest_dir))
+        with open(os.path.join(self.dest_dir, 'results', 'data.txt')) as infile:
+            self.assertEqual('data', infile.read())
+
+    def test_counter_skips_manifest(self):
+        counter = RemoteContentCounter(None)
+        counter.visit_file(FakeRemoteFile('results.ddsclient-bundle.json', size=10), None)
+        counter.visit_file(FakeRemoteFile('results.ddsclient-bundle.tar', size=20), None)
+        self.assertEqual(20, counter.count)
+        self.assertEqual(1, len(counter.files))
+
+    def test_visit_file_decompresses_compressed_file(self):
+        compress_file(os.path.join(self.temp_dir, 'results', 'data.txt'),
+                      os.path.join(self.source_dir, 'data.txt.ddsclient.gz'), 6)
+        project_download = CopyingProjectDownload(self.source_dir, self.dest_dir)
+        project_download.visit_file(FakeRemoteFile('data.txt.ddsclient.gz'), None)
+        self.assertEqual(['data.txt'], os.listdir(self.dest_dir))
+        with open(os.path.join(self.dest_dir, 'data.txt')) as infile:
+            self.assertEqual('data', infile.read())
+
+
+class FakeResponse(object):
+    def __init__(self, json_data):
+        self.json_data = json_data
+
+    def json(self):
+        return self.json_data
+
+
+class FakeUrlDataService(object):
+    def __init__(self):
+        self.requested_file_ids = []
+
+    def get_file_url(self, file_id):
+        self.requested_file_ids.append(file_id)
+        return FakeResponse({'url': 'url_{}'.format(file_id)})
+
+
+class FakeIdRemoteFile(object):
+    def __init__(self, id):
+        self.id = id
+
+
+class TestFileUrlPrefetcher(TestCase):
+    def setUp(self):
+        self.data_service = FakeUrlDataService()
+        self.remote_files = [FakeIdRemoteFile(str(index)) for index in range(5)]
+
+    def test_get_url_prefetches_next_files(self):
+        prefetcher = FileUrlPrefetcher(self.data_service, self.remote_files, 2)
+        self.assertEqual({'url': 'url_0'}, prefetcher.get_url(self.remote_files[0]))
+        prefetcher.close()
+        self.assertEqual(['0', '1', '2'], sorted(self.data_service.requested_file_ids))
+        self.assertEqual(['1', '2'], sorted(prefetcher.pending.keys()))
+
+    def test_get_url_uses_prefetched_url_once(self):
+        prefetcher = FileUrlPrefetcher(self.data_service, self.remote_files, 2)
+        for remote_file in self.remote_files:
+            self.assertEqual({'url': 'url_{}'.format(remote_file.id)}, prefetcher.get_url(remote_file))
+        prefetcher.close()
+        self.assertEqual(['0', '1', '2', '3', '4'], sorted(self.data_service.requested_file_ids))
+        # a retry must fetch a new url
+        self.assertEqual({'url': 'url_3'}, prefetcher.get_url(self.remote_files[3]))
+        self.assertEqual(6, len(self.data_service.requested_file_ids))
+
+    def test_get_url_without_prefetch(self):
+        prefetcher = FileUrlPrefetcher(self.data_service, self.remote_files, 0)
+        self.assertEqual({'url': 'url_1'}, prefetcher.get_url(self.remote_files[1]))
+        prefetcher.close()
+        self.assertEqual(['1'], self.data_service.requested_file_ids)
@@ -1,16 +1,26 @@
+import os
+import hashlib
+import tempfile
+import threading
 from unittest import TestCase
 import ddsc.core.filedownloader
-from ddsc.core.filedownloader import FileDownloader, ChunkDownloader
+from ddsc.core.filedownloader import FileDownloader, RangeDownloader, DownloadHashMismatch, DownloadRangeQueue, \
+    DownloadThroughput, MIN_DOWNLOAD_CHUNK_SIZE, MIN_DOWNLOAD_RANGE_SIZE, MAX_DOWNLOAD_RANGE_SIZE, write_at, \
+    PARTIAL_DOWNLOAD_SUFFIX
+from ddsc.core.util import ProgressQueue
 
 
 class FakeConfig(object):
-    def __init__(self, download_workers):
+    def __init__(self, download_workers, verify_downloads=True, download_allocation='fallocate'):
         self.download_workers = download_workers
+        self.verify_downloads = verify_downloads
+        self.download_allocation = download_allocation
 
 
 class FakeFile(object):
-    def __init__(self, size):
+    def __init__(self, size, hashes=None):
         self.size = size
+        self.hashes = hashes or {}
 
 
 class FakeWatcher(object):
@@ -21,6 +31,30 @@ class FakeWatcher(object):
         self.amt += increment_amt
 
 
+class FakeAutotuner(object):
+    def __init__(self, workers):
+        self.workers = workers
+
+
+class ProgressWaitingWatcher(FakeWatcher):
+    """
+    Downloads half of a file then waits for the progress of that half to be reported before finishing.
+    """
+    def __init__(self):
+        super(ProgressWaitingWatcher, self).__init__()
+        self.progress_event = threading.Event()
+        self.saw_progress_while_downloading = False
+
+    def transferring_item(self, item, increment_amt=1):
+        super(ProgressWaitingWatcher, self).transferring_item(item, increment_amt)
+        self.progress_event.set()
+
+    def download_waiting_for_progress(self, url, headers, path, range_queue, progress_queue, hash_alg=None):
+        progress_queue.processed(50)
+        self.saw_progress_while_downloading = self.progress_event.wait(5)
+        progress_queue.processed(50)
+
+
 class TestDownloader(FileDownloader):
     def __init__(self, config, remote_file, url_parts, path, watcher):
         super(TestDownloader, self).__init__(config, remote_file, url_parts, path, watcher)
@@ -28,6 +62,9 @@ class TestDownloader(FileDownloader):
     def make_big_empty_file(self):
         pass
 
+    def move_partial_file(self):
+        pass
+
 sample_url_parts = {
     'host': 'myhost',
     'url': 'stuff/',
@@ -36,65 +73,47 @@ sample_url_parts = {
 
 
 class TestFileDownloader(TestCase):
-    def test_make_chunk_processor_with_none(self):
+    def setUp(self):
+        self.original_download_inline = ddsc.core.filedownloader.download_inline
+
+    def tearDown(self):
+        ddsc.core.filedownloader.download_inline = self.original_download_inline
+
+    def test_determine_num_workers(self):
         # Only one worker because file size is too small
-        self.assert_make_ranges(
-            workers=2,
-            file_size=100,
-            expected=[
-                (0, 99),
-            ]
-        )
-
-        # Big enough file should split into two
-        self.assert_make_ranges(
-            workers=2,
-            file_size=100 * 1000 * 1000,
-            expected=[
-                (0, 49999999),
-                (50000000, 99999999)
-            ]
-        )
-
-
-        # Big enough file should split into three
-        self.assert_make_ranges(
-            workers=3,
-            file_size=100 * 1000 * 1000,
-            expected=[
-                (0, 33333333),
-                (33333334, 66666667),
-                (66666668, 99999999),
-            ]
-        )
-
-        # Uneven split
-        self.assert_make_ranges(
-            workers=3,
-            file_size=100 * 1000 * 1000 - 1,
-            expected=[
-                (0, 33333332),
-                (33333333, 66666665),
-                (66666666, 99999998),
-            ]
-        )
-
-    def assert_make_ranges(self, workers, file_size, expected):
+        self.assert_num_workers(workers=2, file_size=100, expected=1)
+        # Big enough file should use all workers
+        self.assert_num_workers(workers=2, file_size=100 * 1000 * 1000, expected=2)
+        self.assert_num_workers(workers=3, file_size=100 * 1000 * 1000, expected=3)
+        # Workers limited by file size
+        self.assert_num_workers(workers=8, file_size=MIN_DOWNLOAD_CHUNK_SIZE * 2, expected=2)
+        # Empty files need no workers
+        self.assert_num_workers(workers=3, file_size=0, expected=0)
+        self.assert_num_workers(workers=None, file_size=100 * 1000 * 1000, expected=1)
+
+    def assert_num_workers(self, workers, file_size, expected):
         config = FakeConfig(workers)
         downloader = FileDownloader(config, FakeFile(file_size), None, None, None)
-        self.assertEqual(expected, downloader.make_ranges())
+        self.assertEqual(expected, downloader.determine_num_workers())
+
+    def test_determine_num_workers_from_autotuner(self):
+        autotuner = FakeAutotuner(workers=6)
+        downloader = FileDownloader(FakeConfig(2), FakeFile(100 * 1000 * 1000), None, None, None, autotuner)
+        self.assertEqual(5, downloader.determine_num_workers())
+        downloader = FileDownloader(FakeConfig(2), FakeFile(MIN_DOWNLOAD_CHUNK_SIZE * 8), None, None, None, autotuner)
+        self.assertEqual(6, downloader.determine_num_workers())
 
     def test_chunk_that_fails(self):
         file_size = 83833112
         config = FakeConfig(3)
         ddsc.core.filedownloader.download_async = self.chunk_download_fails
-        downloader = TestDownloader(config, FakeFile(file_size), sample_url_parts, None, None)
+        downloader = TestDownloader(config, FakeFile(file_size), sample_url_parts, 'data.txt', None)
         try:
             downloader.run()
         except ValueError as err:
             self.assertEqual("oops", str(err))
 
-    def chunk_download_fails(self, url, headers, path, seek_amt, progress_queue):
+    def chunk_download_fails(self, url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
         progress_queue.error("oops")
 
     def test_download_whole_chunk(self):
@@ -102,28 +121,403 @@ class TestFileDownloader(TestCase):
         config = FakeConfig(3)
         watcher = FakeWatcher()
         ddsc.core.filedownloader.download_async = self.chunk_download_one_piece
-        downloader = TestDownloader(config, FakeFile(file_size), sample_url_parts, None, watcher)
+        downloader = TestDownloader(config, FakeFile(file_size), sample_url_parts, 'data.txt', watcher)
         downloader.run()
         self.assertEqual(file_size, watcher.amt)
 
-    def chunk_download_one_piece(self, url, headers, path, seek_amt, progress_queue):
-        start, end = headers['Range'].replace("bytes=", "").split('-')
-        total = (int(end) - int(start) + 1)
-        progress_queue.processed(total)
+    def chunk_download_one_piece(self, url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
+        claimed_range = range_queue.claim(MIN_DOWNLOAD_RANGE_SIZE)
+        while claimed_range:
+            start, end = claimed_range
+            progress_queue.processed(end - start + 1)
+            claimed_range = range_queue.claim(MIN_DOWNLOAD_RANGE_SIZE)
 
     def test_download_chunk_in_two_parts(self):
         file_size = 83833112
         config = FakeConfig(3)
         watcher = FakeWatcher()
         ddsc.core.filedownloader.download_async = self.chunk_download_two_parts
-        downloader = TestDownloader(config, FakeFile(file_size), sample_url_parts, None, watcher)
+        downloader = TestDownloader(config, FakeFile(file_size), sample_url_parts, 'data.txt', watcher)
         downloader.run()
         self.assertEqual(file_size, watcher.amt)
 
-    def chunk_download_two_parts(self, url, headers, path, seek_amt, progress_queue):
-        start, end = headers['Range'].replace("bytes=", "").split('-')
-        total = (int(end) - int(start) + 1)
-        first = int(total/2)
-        rest = total - first
-        progress_queue.processed(first)
-        progress_queue.processed(rest)
\ No newline at end of file
+    def chunk_download_two_parts(self, url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
+        claimed_range = range_queue.claim(MAX_DOWNLOAD_RANGE_SIZE)
+        while claimed_range:
+            start, end = claimed_range
+            total = (end - start + 1)
+            first = int(total/2)
+            rest = total - first
+            progress_queue.processed(first)
+            progress_queue.processed(rest)
+            claimed_range = range_queue.claim(MAX_DOWNLOAD_RANGE_SIZE)
+
+    def test_download_reports_mismatched_stream_hash(self):
+        config = FakeConfig(3)
+        watcher = FakeWatcher()
+        ddsc.core.filedownloader.download_inline = self.chunk_download_with_hash
+        downloader = TestDownloader(config, FakeFile(100, {'md5': 'abc'}), sample_url_parts, 'data.txt', watcher)
+        with self.assertRaises(DownloadHashMismatch):
+            downloader.run()
+        self.assertEqual(100, watcher.amt)
+
+    def test_download_matching_stream_hash(self):
+        config = FakeConfig(3)
+        watcher = FakeWatcher()
+        ddsc.core.filedownloader.download_inline = self.chunk_download_with_hash
+        downloader = TestDownloader(config, FakeFile(100, {'md5': 'def'}), sample_url_parts, 'data.txt', watcher)
+        downloader.run()
+        self.assertEqual(100, watcher.amt)
+
+    def test_reports_progress_while_downloading_inline(self):
+        watcher = ProgressWaitingWatcher()
+        ddsc.core.filedownloader.download_inline = watcher.download_waiting_for_progress
+        downloader = TestDownloader(FakeConfig(3), FakeFile(100), sample_url_parts, 'data.txt', watcher)
+        downloader.run()
+        self.assertEqual(100, watcher.amt)
+        self.assertEqual(True, watcher.saw_progress_while_downloading)
+
+    def chunk_download_with_hash(self, url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
+        if hash_alg:
+            progress_queue.hashed(hash_alg, 'def')
+        progress_queue.processed(100)
+
+    def test_get_expected_hash(self):
+        downloader = FileDownloader(FakeConfig(1), FakeFile(100, {'md5': 'abc', 'sha1': 'def'}), None, None, None)
+        self.assertEqual('abc', downloader.get_expected_hash())
+        downloader = FileDownloader(FakeConfig(1, verify_downloads=False), FakeFile(100, {'md5': 'abc'}),
+                                    None, None, None)
+        self.assertEqual(None, downloader.get_expected_hash())
+        downloader = FileDownloader(FakeConfig(1), FakeFile(100, {'sha1': 'def'}), None, None, None)
+        self.assertEqual(None, downloader.get_expected_hash())
+
+
+class TestFileDownloaderResources(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.bin')
+        self.original_tempdir = tempfile.tempdir
+        tempfile.tempdir = self.temp_dir
+        ddsc.core.filedownloader.download_async = self.download_zeros
+
+    def tearDown(self):
+        tempfile.tempdir = self.original_tempdir
+        os.remove(self.path)
+        os.rmdir(self.temp_dir)
+
+    @staticmethod
+    def download_zeros(url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
+        claimed_range = range_queue.claim(MIN_DOWNLOAD_RANGE_SIZE)
+        while claimed_range:
+            start, end = claimed_range
+            progress_queue.processed(end - start + 1)
+            claimed_range = range_queue.claim(MIN_DOWNLOAD_RANGE_SIZE)
+
+    @staticmethod
+    def count_open_fds():
+        return len(os.listdir('/proc/self/fd'))
+
+    def test_run_creates_no_temp_files_and_closes_fds(self):
+        if not os.path.exists('/proc/self/fd'):
+            self.skipTest("Requires /proc/self/fd to count open file descriptors")
+        file_size = MIN_DOWNLOAD_CHUNK_SIZE * 3
+        downloader = FileDownloader(FakeConfig(3, verify_downloads=False), FakeFile(file_size), sample_url_parts,
+                                    self.path, FakeWatcher())
+        downloader.run()
+        fds_before = self.count_open_fds()
+        for _ in range(5):
+            downloader.run()
+        self.assertLessEqual(self.count_open_fds(), fds_before)
+        self.assertEqual(['data.bin'], os.listdir(self.temp_dir))
+        self.assertEqual(file_size, os.path.getsize(self.path))
+
+
+class TestWriteAt(TestCase):
+    def test_write_at(self):
+        temp_dir = tempfile.mkdtemp()
+        path = os.path.join(temp_dir, 'data.bin')
+        with open(path, 'wb') as outfile:
+            outfile.write(b'\0' * 11)
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            write_at(fd, b'world', 6)
+            write_at(fd, b'hello', 0)
+        finally:
+            os.close(fd)
+        with open(path, 'rb') as infile:
+            self.assertEqual(b'hello\0world', infile.read())
+        os.remove(path)
+        os.rmdir(temp_dir)
+
+
+class TestAllocation(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.bin')
+
+    def tearDown(self):
+        for filename in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, filename))
+        os.rmdir(self.temp_dir)
+
+    def assert_allocated_size(self, download_allocation, expected_size):
+        downloader = FileDownloader(FakeConfig(1, download_allocation=download_allocation), FakeFile(1000), None,
+                                    self.path, None)
+        downloader.make_big_empty_file()
+        self.assertEqual(expected_size, os.path.getsize(downloader.partial_path))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_fallocate(self):
+        self.assert_allocated_size('fallocate', 1000)
+
+    def test_sparse(self):
+        self.assert_allocated_size('sparse', 1000)
+
+    def test_sequential(self):
+        self.assert_allocated_size('sequential', 0)
+
+    def test_sequential_uses_one_worker(self):
+        config = FakeConfig(4, download_allocation='sequential')
+        downloader = FileDownloader(config, FakeFile(100 * 1000 * 1000), None, self.path, None)
+        self.assertEqual(1, downloader.determine_num_workers())
+
+
+class TestPartialDownload(TestCase):
+    def setUp(self):
+        self.original_download_inline = ddsc.core.filedownloader.download_inline
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.txt')
+        with open(self.path, 'wb') as outfile:
+            outfile.write(b'old content')
+
+    def tearDown(self):
+        ddsc.core.filedownloader.download_inline = self.original_download_inline
+        for filename in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, filename))
+        os.rmdir(self.temp_dir)
+
+    @staticmethod
+    def download_hello(url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
+        with open(path, 'r+b') as outfile:
+            outfile.write(b'hello world')
+        progress_queue.processed(11)
+
+    @staticmethod
+    def download_fails(url, headers, path, range_queue, progress_queue, hash_alg=None, rate_limiter=None):
+        progress_queue.error("oops")
+
+    def test_run_replaces_file_when_complete(self):
+        ddsc.core.filedownloader.download_inline = self.download_hello
+        md5 = hashlib.md5(b'hello world').hexdigest()
+        downloader = FileDownloader(FakeConfig(1), FakeFile(11, {'md5': md5}), sample_url_parts, self.path,
+                                    FakeWatcher())
+        downloader.run()
+        self.assertEqual(['data.txt'], os.listdir(self.temp_dir))
+        with open(self.path, 'rb') as infile:
+            self.assertEqual(b'hello world', infile.read())
+
+    def test_run_bad_hash_leaves_existing_file(self):
+        ddsc.core.filedownloader.download_inline = self.download_hello
+        downloader = FileDownloader(FakeConfig(1), FakeFile(11, {'md5': 'abc'}), sample_url_parts, self.path,
+                                    FakeWatcher())
+        with self.assertRaises(DownloadHashMismatch):
+            downloader.run()
+        self.assertEqual(['data.txt'], os.listdir(self.temp_dir))
+        with open(self.path, 'rb') as infile:
+            self.assertEqual(b'old content', infile.read())
+
+    def test_run_error_removes_partial_file(self):
+        ddsc.core.filedownloader.download_inline = self.download_fails
+        os.remove(self.path)
+        downloader = FileDownloader(FakeConfig(1), FakeFile(11), sample_url_parts, self.path, FakeWatcher())
+        with self.assertRaises(ValueError):
+            downloader.run()
+        self.assertEqual([], os.listdir(self.temp_dir))
+
+
+class TestVerifyHash(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.txt')
+        with open(self.path + PARTIAL_DOWNLOAD_SUFFIX, 'wb') as outfile:
+            outfile.write(b'hello world')
+        self.md5 = hashlib.md5(b'hello world').hexdigest()
+
+    def tearDown(self):
+        os.remove(self.path + PARTIAL_DOWNLOAD_SUFFIX)
+        os.rmdir(self.temp_dir)
+
+    def test_hashes_file_when_not_streamed(self):
+        downloader = FileDownloader(FakeConfig(1), FakeFile(11), None, self.path, None)
+        downloader.verify_hash(self.md5, [])
+        with self.assertRaises(DownloadHashMismatch):
+            downloader.verify_hash('abc', [])
+
+    def test_uses_streamed_hash(self):
+        downloader = FileDownloader(FakeConfig(1), FakeFile(11), None, self.path, None)
+        downloader.verify_hash('abc', [('md5', 'abc')])
+        with self.assertRaises(DownloadHashMismatch):
+            downloader.verify_hash(self.md5, [('md5', 'abc')])
+
+
+class TestDownloadRangeQueue(TestCase):
+    def test_claim_small_file(self):
+        range_queue = DownloadRangeQueue(100, 1)
+        self.assertEqual((0, 99), range_queue.claim(MIN_DOWNLOAD_RANGE_SIZE))
+        self.assertEqual(None, range_queue.claim(MIN_DOWNLOAD_RANGE_SIZE))
+
+    def test_claim_covers_file_in_order(self):
+        file_size = 10 * MIN_DOWNLOAD_RANGE_SIZE + 7
+        range_queue = DownloadRangeQueue(file_size, 1)
+        offset = 0
+        claimed_range = range_queue.claim(3 * MIN_DOWNLOAD_RANGE_SIZE)
+        while claimed_range:
+            start, end = claimed_range
+            self.assertEqual(offset, start)
+            offset = end + 1
+            claimed_range = range_queue.claim(3 * MIN_DOWNLOAD_RANGE_SIZE)
+        self.assertEqual(file_size, offset)
+
+    def test_claim_limited_to_share_of_remaining(self):
+        range_queue = DownloadRangeQueue(40 * MIN_DOWNLOAD_RANGE_SIZE, 4)
+        # an even share of what remains is the most a worker can claim
+        self.assertEqual((0, 10 * MIN_DOWNLOAD_RANGE_SIZE - 1), range_queue.claim(MAX_DOWNLOAD_RANGE_SIZE * 4))
+        # smaller requests are honored
+        start, end = range_queue.claim(MIN_DOWNLOAD_RANGE_SIZE)
+        self.assertEqual(MIN_DOWNLOAD_RANGE_SIZE, end - start + 1)
+        # near the end ranges shrink but never below MIN_DOWNLOAD_RANGE_SIZE unless that is all that is left
+        range_queue = DownloadRangeQueue(MIN_DOWNLOAD_RANGE_SIZE + 10, 4)
+        self.assertEqual((0, MIN_DOWNLOAD_RANGE_SIZE - 1), range_queue.claim(MAX_DOWNLOAD_RANGE_SIZE))
+        self.assertEqual((MIN_DOWNLOAD_RANGE_SIZE, MIN_DOWNLOAD_RANGE_SIZE + 9),
+                         range_queue.claim(MAX_DOWNLOAD_RANGE_SIZE))
+
+
+class TestDownloadThroughput(TestCase):
+    def test_next_range_size(self):
+        throughput = DownloadThroughput()
+        self.assertEqual(MIN_DOWNLOAD_RANGE_SIZE, throughput.next_range_size())
+        # slow connection stays at the minimum
+        throughput.add_sample(MIN_DOWNLOAD_RANGE_SIZE, 100.0)
+        self.assertEqual(MIN_DOWNLOAD_RANGE_SIZE, throughput.next_range_size())
+        # fast connection is capped at the maximum
+        throughput = DownloadThroughput()
+        throughput.add_sample(MAX_DOWNLOAD_RANGE_SIZE, 0.1)
+        self.assertEqual(MAX_DOWNLOAD_RANGE_SIZE, throughput.next_range_size())
+
+    def test_add_sample_smooths_rate(self):
+        throughput = DownloadThroughput()
+        throughput.add_sample(10 * 1024 * 1024, 1.0)
+        self.assertEqual(10 * 1024 * 1024, throughput.bytes_per_second)
+        throughput.add_sample(20 * 1024 * 1024, 1.0)
+        self.assertEqual(15 * 1024 * 1024, throughput.bytes_per_second)
+        self.assertEqual(150 * 1024 * 1024, throughput.next_range_size())
+        throughput.add_sample(1024, 0)
+        self.assertEqual(15 * 1024 * 1024, throughput.bytes_per_second)
+
+
+class FakeResponse(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+
+class FakeSession(object):
+    def __init__(self, responses):
+        self.responses = responses
+        self.requested_ranges = []
+
+    def get(self, url, headers, stream):
+        self.requested_ranges.append(headers['Range'])
+        return FakeResponse(self.responses.pop(0))
+
+
+class FakeRequests(object):
+    def __init__(self, responses):
+        self.session = FakeSession(responses)
+
+    def Session(self):
+        return self.session
+
+
+class FakeQueue(object):
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+class FakeRangeQueue(object):
+    def __init__(self, ranges):
+        self.ranges = ranges
+        self.requested_sizes = []
+
+    def claim(self, range_size):
+        self.requested_sizes.append(range_size)
+        if self.ranges:
+            return self.ranges.pop(0)
+        return None
+
+
+class TestRangeDownloader(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.txt')
+        with open(self.path, 'wb') as outfile:
+            outfile.write(b'\0' * 11)
+        self.original_requests = ddsc.core.filedownloader.requests
+        self.fake_requests = FakeRequests([[b'hello', b'', b' '], [b'world']])
+        ddsc.core.filedownloader.requests = self.fake_requests
+
+    def tearDown(self):
+        ddsc.core.filedownloader.requests = self.original_requests
+        os.remove(self.path)
+        os.rmdir(self.temp_dir)
+
+    def test_run_hashes_before_final_progress(self):
+        queue = FakeQueue()
+        range_queue = FakeRangeQueue([(0, 5), (6, 10)])
+        downloader = RangeDownloader('someurl', {}, self.path, range_queue, ProgressQueue(queue), 'md5')
+        downloader.run()
+        expected_hash = hashlib.md5(b'hello world').hexdigest()
+        self.assertEqual([
+            (ProgressQueue.PROCESSED, 5),
+            (ProgressQueue.PROCESSED, 1),
+            (ProgressQueue.HASHED, ('md5', expected_hash)),
+            (ProgressQueue.PROCESSED, 5),
+        ], queue.items)
+        self.assertEqual(['bytes=0-5', 'bytes=6-10'], self.fake_requests.session.requested_ranges)
+        self.assertEqual(3, len(range_queue.requested_sizes))
+        with open(self.path, 'rb') as infile:
+            self.assertEqual(b'hello world', infile.read())
+
+    def test_run_without_hash(self):
+        queue = FakeQueue()
+        range_queue = FakeRangeQueue([(0, 5), (6, 10)])
+        downloader = RangeDownloader('someurl', {}, self.path, range_queue, ProgressQueue(queue))
+        downloader.run()
+        self.assertEqual([
+            (ProgressQueue.PROCESSED, 5),
+            (ProgressQueue.PROCESSED, 1),
+            (ProgressQueue.PROCESSED, 5),
+        ], queue.items)
+
+    def test_run_uses_provided_session(self):
+        queue = FakeQueue()
+        range_queue = FakeRangeQueue([(0, 5), (6, 10)])
+        session = FakeSession([[b'hello '], [b'world']])
+        downloader = RangeDownloader('someurl', {}, self.path, range_queue, ProgressQueue(queue), session=session)
+        downloader.run()
+        self.assertEqual(['bytes=0-5', 'bytes=6-10'], session.requested_ranges)
+        self.assertEqual([], self.fake_requests.session.requested_ranges)
+
+    def test_run_short_range_reports_error(self):
+        queue = FakeQueue()
+        range_queue = FakeRangeQueue([(0, 6), (7, 10)])
+        downloader = RangeDownloader('someurl', {}, self.path, range_queue, ProgressQueue(queue))
+        downloader.run()
+        progress_type, message = queue.items[-1]
+        self.assertEqual(ProgressQueue.ERROR, progress_type)
+        self.assertIn('Received 6 bytes expected 7', message)
@@ -1,6 +1,11 @@
 from unittest import TestCase
+import os
+import tempfile
+from ddsc.core.fileuploader import FileUploader, ParallelChunkProcessor, ChunkProgressWatcher, UploadChunkQueue, \
+    ChunkSender
 
-from ddsc.core.fileuploader import FileUploader, ParallelChunkProcessor
+MB = 1024 * 1024
+GB = 1024 * MB
 
 class FakeConfig(object):
     def __init__(self, upload_workers, upload_bytes_per_chunk):
@@ -29,15 +34,135 @@ class TestParallelChunkProcessor(TestCase):
             num_chunks = ParallelChunkProcessor.determine_num_chunks(chunk_size, file_size)
             self.assertEqual(expected, num_chunks)
 
-    def test_make_work_parcels(self):
+    def test_choose_chunk_size(self):
         values = [
-            # upload_workers, num_chunks, expected
-            (4, 4, [(0, 1), (1, 1), (2, 1), (3, 1)]),
-            (4, 19, [(0, 5), (5, 5), (10, 5), (15, 4)]),
-            (5, 31, [(0, 7), (7, 7), (14, 7), (21, 7), (28,3)]),
-            (5, 4, [(0, 1), (1, 1), (2, 1), (3, 1)]),
-            (1, 4, [(0, 4)]),
+            # file_size, upload_workers, bytes_per_second, expected
+            # small files use the minimum chunk size
+            (1 * GB, 8, None, 100 * MB),
+            # enough chunks for each worker to get CHUNKS_PER_WORKER
+            (16 * GB, 8, None, 512 * MB),
+            (10 * GB, 8, None, 320 * MB),
+            # huge files are limited by max chunk size
+            (1024 * GB, 8, None, 1024 * MB),
+            # a slow connection keeps chunks short
+            (16 * GB, 8, 8 * MB, 100 * MB),
+            (16 * GB, 8, 40 * MB, 300 * MB),
+            # no workers setting acts as a single worker
+            (1 * GB, None, None, 256 * MB),
         ]
-        for upload_workers, num_chunks, expected in values:
-            result = ParallelChunkProcessor.make_work_parcels(upload_workers, num_chunks)
-            self.assertEqual(expected, result)
+        for file_size, upload_workers, bytes_per_second, expected in values:
+            chunk_size = ParallelChunkProcessor.choose_chunk_size(file_size, upload_workers, 100 * MB, 1024 * MB,
+                                                                  10000, bytes_per_second)
+            self.assertEqual(expected, chunk_size)
+
+    def test_choose_chunk_size_max_chunks(self):
+        # the data service chunk limit wins over max chunk size
+        chunk_size = ParallelChunkProcessor.choose_chunk_size(100 * GB, 8, 100 * MB, 500 * MB, 100)
+        self.assertEqual(1024 * MB, chunk_size)
+        self.assertEqual(100, ParallelChunkProcessor.determine_num_chunks(chunk_size, 100 * GB))
+
+
+class FakeWatcher(object):
+    def __init__(self):
+        self.amt = 0
+
+    def transferring_item(self, item, increment_amt=1):
+        self.amt += increment_amt
+
+
+class TestChunkProgressWatcher(TestCase):
+    def test_converts_to_watcher_units(self):
+        fake_watcher = FakeWatcher()
+        watcher = ChunkProgressWatcher(fake_watcher, num_chunks=4, num_units=10)
+        for _ in range(4):
+            watcher.transferring_item(None, increment_amt=1)
+        self.assertAlmostEqual(10, fake_watcher.amt)
+
+
+class TestUploadChunkQueue(TestCase):
+    def test_claims_each_chunk_once(self):
+        chunk_queue = UploadChunkQueue(3)
+        self.assertEqual([0, 1, 2], [chunk_queue.claim() for _ in range(3)])
+        self.assertEqual(None, chunk_queue.claim())
+
+
+class FakeProgressQueue(object):
+    def __init__(self):
+        self.processed_amt = 0
+
+    def processed(self, amt):
+        self.processed_amt += amt
+
+
+class FakeChunkSender(ChunkSender):
+    def __init__(self, filename, chunk_size, chunk_queue, failing_chunks=()):
+        super(FakeChunkSender, self).__init__(None, 'upload1', filename, chunk_size, chunk_queue,
+                                              FakeProgressQueue())
+        self.failing_chunks = failing_chunks
+        self.sent = []
+
+    def _send_chunk(self, chunk, chunk_num):
+        if chunk_num in self.failing_chunks:
+            raise ValueError("Upload failed")
+        self.sent.append((chunk_num, chunk))
+
+
+class FakeResponse(object):
+    def __init__(self, status_code=200, json_data=None):
+        self.status_code = status_code
+        self.json_data = json_data
+
+    def json(self):
+        return self.json_data
+
+
+class FakeDataService(object):
+    def __init__(self):
+        self.upload_url_chunks = []
+        self.sent_chunks = []
+
+    def create_upload_url(self, upload_id, chunk_num, chunk_len, hash_value, hash_alg):
+        self.upload_url_chunks.append(chunk_num)
+        return FakeResponse(json_data={'http_verb': 'PUT', 'host': 'host', 'url': 'url/{}'.format(chunk_num),
+                                       'http_headers': {}})
+
+    def send_external(self, http_verb, host, url, http_headers, chunk):
+        self.sent_chunks.append(url)
+        return FakeResponse()
+
+
+class TestChunkSender(TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.write(fd, b'aaabbbcc')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_sends_claimed_chunks(self):
+        sender = FakeChunkSender(self.filename, 3, UploadChunkQueue(3))
+        sender.send()
+        self.assertEqual([(0, b'aaa'), (1, b'bbb'), (2, b'cc')], sender.sent)
+        self.assertEqual(3, sender.progress_queue.processed_amt)
+
+    def test_slow_chunk_uploaded_once(self):
+        data_service = FakeDataService()
+        chunk_queue = UploadChunkQueue(3)
+        # another worker has claimed chunk 0 and is slow to send it
+        slow_sender = ChunkSender(data_service, 'upload1', self.filename, 3, chunk_queue, FakeProgressQueue())
+        self.assertEqual(0, chunk_queue.claim())
+        fast_sender = ChunkSender(data_service, 'upload1', self.filename, 3, chunk_queue, FakeProgressQueue())
+        fast_sender.send()
+        self.assertEqual([1, 2], data_service.upload_url_chunks)
+        self.assertEqual(2, fast_sender.progress_queue.processed_amt)
+        # the idle worker is done instead of sending another copy of chunk 0
+        slow_sender._send_chunk(b'aaa', 0)
+        slow_sender.send()
+        self.assertEqual([0, 1, 2], sorted(data_service.upload_url_chunks))
+        self.assertEqual(['url/0', 'url/1', 'url/2'], sorted(data_service.sent_chunks))
+
+    def test_failure_raised(self):
+        sender = FakeChunkSender(self.filename, 8, UploadChunkQueue(1), failing_chunks=[0])
+        with self.assertRaises(ValueError):
+            sender.send()
@@ -0,0 +1,74 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from ddsc.core.hashcache import HashCache
+from ddsc.core.localstore import PathData, HashUtil
+
+
+class TestHashCache(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_filename = os.path.join(self.temp_dir, 'cache', 'hashes.sqlite')
+        self.data_filename = os.path.join(self.temp_dir, 'data.txt')
+        with open(self.data_filename, 'w') as outfile:
+            outfile.write('hello')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_after_set(self):
+        cache = HashCache(self.cache_filename, 10)
+        stat_info = os.stat(self.data_filename)
+        self.assertEqual(None, cache.get(stat_info, 'md5'))
+        cache.set(stat_info, 'md5', 'abc')
+        self.assertEqual('abc', cache.get(stat_info, 'md5'))
+        self.assertEqual(None, cache.get(stat_info, 'sha256'))
+
+    def test_get_from_another_thread(self):
+        cache = HashCache(self.cache_filename, 10)
+        stat_info = os.stat(self.data_filename)
+        cache.set(stat_info, 'md5', 'abc')
+        values = []
+        thread = threading.Thread(target=lambda: values.append(cache.get(stat_info, 'md5')))
+        thread.start()
+        thread.join()
+        self.assertEqual(['abc'], values)
+
+    def test_changed_file_misses(self):
+        cache = HashCache(self.cache_filename, 10)
+        cache.set(os.stat(self.data_filename), 'md5', 'abc')
+        with open(self.data_filename, 'w') as outfile:
+            outfile.write('hello world')
+        self.assertEqual(None, cache.get(os.stat(self.data_filename), 'md5'))
+
+    def test_prune_keeps_newest(self):
+        cache = HashCache(self.cache_filename, 2)
+        stat_info = os.stat(self.data_filename)
+        cache.set(stat_info, 'alg1', 'one')
+        cache.set(stat_info, 'alg2', 'two')
+        cache.set(stat_info, 'alg3', 'three')
+        cache.prune()
+        self.assertEqual(None, cache.get(stat_info, 'alg1'))
+        self.assertEqual('two', cache.get(stat_info, 'alg2'))
+        self.assertEqual('three', cache.get(stat_info, 'alg3'))
+
+    def test_can_pickle(self):
+        """Make sure we can pickle the cache since it is passed to background processes with PathData."""
+        cache = HashCache(self.cache_filename, 10)
+        cache.set(os.stat(self.data_filename), 'md5', 'abc')
+        cache_copy = pickle.loads(pickle.dumps(cache))
+        self.assertEqual('abc', cache_copy.get(os.stat(self.data_filename), 'md5'))
+
+    def test_path_data_uses_cache(self):
+        cache = HashCache(self.cache_filename, 10)
+        path_data = PathData(self.data_filename, cache)
+        self.assertEqual('5d41402abc4b2a76b9719d911017c592', path_data.get_hash().value)
+        self.assertEqual('5d41402abc4b2a76b9719d911017c592',
+                         cache.get(os.stat(self.data_filename), HashUtil.HASH_NAME))
+        # A cached value is returned without reading the file
+        cache.set(os.stat(self.data_filename), HashUtil.HASH_NAME, 'fromcache')
+        self.assertEqual('fromcache', path_data.get_hash().value)
@@ -1,8 +1,11 @@
+import os
 import shutil
 import tarfile
 from unittest import TestCase
 
-from ddsc.core.localstore import LocalFile, LocalFolder, LocalProject, FileFilter
+from ddsc.core.localstore import LocalFile, LocalFolder, LocalProject, FileFilter, FileCompareStats, PathData
+from ddsc.core.localstore import _scan_folder_tree, ParallelFolderScanner
+from ddsc.core.util import ScanProgressPrinter
 from ddsc.config import FILE_EXCLUDE_REGEX_DEFAULT
 
 INCLUDE_ALL = ''
@@ -17,6 +20,16 @@ class TestProjectFolderFile(TestCase):
         f = LocalFolder('stuff')
         self.assertEqual('folder:stuff []', str(f))
 
+    def test_nodes_have_no_instance_dict(self):
+        folder = LocalFolder('stuff')
+        f = LocalFile('setup.py')
+        folder.add_child(f)
+        self.assertFalse(hasattr(folder, '__dict__'))
+        self.assertFalse(hasattr(f, '__dict__'))
+        self.assertEqual(os.path.abspath('setup.py'), f.path)
+        self.assertEqual(os.path.abspath('stuff'), folder.path)
+        self.assertEqual(f.path, f.get_path_data().path)
+
     def test_folder_one_child_str(self):
         folder = LocalFolder('stuff')
         folder.add_child(LocalFile('setup.py'))
@@ -135,6 +148,68 @@ class TestProjectContent(TestCase):
         content.add_path('test_scripts')
         self.assertNotIn('.hidden_file', str(content))
 
+    def test_scan_folder_tree_is_lazy(self):
+        include_all = FileFilter(INCLUDE_ALL).include
+        scan = _scan_folder_tree('/tmp/DukeDsClientTestFolder', False, include_all)
+        parent, top_folder = next(scan)
+        self.assertEqual(None, parent)
+        self.assertEqual('DukeDsClientTestFolder', top_folder.name)
+        parent, child = next(scan)
+        self.assertEqual(top_folder, parent)
+        self.assertEqual('note.txt', child.name)
+        self.assertEqual(os.path.getsize('/tmp/DukeDsClientTestFolder/note.txt'), child.size)
+
+    def test_parallel_scan_matches_serial_scan(self):
+        serial = LocalProject(False, file_exclude_regex=INCLUDE_ALL)
+        serial.add_path('/tmp/DukeDsClientTestFolder')
+        scan_progress = ScanProgressPrinter()
+        parallel = LocalProject(False, file_exclude_regex=INCLUDE_ALL, scan_workers=4, scan_progress=scan_progress)
+        parallel.add_path('/tmp/DukeDsClientTestFolder')
+        self.assertEqual(str(serial), str(parallel))
+        self.assertEqual(5, scan_progress.folders)
+        self.assertEqual(7, scan_progress.files)
+
+    def test_parallel_scan_raises_thread_errors(self):
+        def bad_include(filename):
+            raise ValueError('bad filename')
+        scanner = ParallelFolderScanner(False, bad_include, scan_workers=2)
+        with self.assertRaises(ValueError):
+            scanner.run('/tmp/DukeDsClientTestFolder')
+
+    def test_scan_paths_matches_add_paths(self):
+        paths = ['/tmp/DukeDsClientTestFolder/results', '/tmp/DukeDsClientTestFolder/note.txt']
+        expected = LocalProject(False, file_exclude_regex=INCLUDE_ALL)
+        expected.add_paths(paths)
+        for scan_workers in [1, 4]:
+            content = LocalProject(False, file_exclude_regex=INCLUDE_ALL, scan_workers=scan_workers)
+            found = []
+            for item, parent in content.scan_paths(paths):
+                # parents are always found before their children
+                self.assertTrue(parent is content or parent in found)
+                found.append(item)
+                parent.children.append(item)
+            self.assertEqual(str(expected), str(content))
+
+    def test_parallel_scan_paths_raises_thread_errors(self):
+        def bad_include(filename):
+            raise ValueError('bad filename')
+        scanner = ParallelFolderScanner(False, bad_include, scan_workers=2)
+        with self.assertRaises(ValueError):
+            list(scanner.scan('/tmp/DukeDsClientTestFolder'))
+
+    def test_symlinked_folder_only_followed_when_requested(self):
+        link_path = '/tmp/DukeDsClientTestFolder/results/scripts_link'
+        os.symlink('/tmp/DukeDsClientTestFolder/scripts', link_path)
+        try:
+            content = LocalProject(False, file_exclude_regex=INCLUDE_ALL)
+            content.add_path('/tmp/DukeDsClientTestFolder/results')
+            self.assertNotIn('scripts_link', str(content))
+            content = LocalProject(True, file_exclude_regex=INCLUDE_ALL)
+            content.add_path('/tmp/DukeDsClientTestFolder/results')
+            self.assertIn('folder:scripts_link [file:makemoney.sh]', str(content))
+        finally:
+            os.remove(link_path)
+
 
 class TestFileFilter(TestCase):
     def test_default_file_exclude_regex(self):
@@ -159,3 +234,121 @@ class TestFileFilter(TestCase):
         # exclude bad filenames
         for bad_filename in bad_files:
             self.assertEqual(include_file(bad_filename), False)
+
+
+class FakeRemoteFile(object):
+    def __init__(self, name, size, file_hash, hash_alg='md5'):
+        self.id = 'remote-' + name
+        self.name = name
+        self.size = size
+        self.file_hash = file_hash
+        self.hash_alg = hash_alg
+        self.hashes = {hash_alg: file_hash}
+
+
+class FakeRemoteFolder(object):
+    def __init__(self, name, children):
+        self.id = 'remote-' + name
+        self.name = name
+        self.children = children
+
+
+class FakeHashCache(object):
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, stat_info, hash_alg):
+        return self.values.get(stat_info.st_size)
+
+    def set(self, stat_info, hash_alg, hash_value):
+        pass
+
+
+class TestCompareRemote(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        test_folder = tarfile.TarFile('ddsc/core/tests/testfolder.tar')
+        test_folder.extractall('/tmp')
+        test_folder.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('/tmp/DukeDsClientTestFolder')
+
+    def test_size_checked_before_hash(self):
+        local_file = LocalFile('/tmp/DukeDsClientTestFolder/note.txt')
+        stats = FileCompareStats()
+        local_file.update_remote_ids(FakeRemoteFile('note.txt', local_file.size + 1, None), stats)
+        self.assertEqual(True, local_file.need_to_send)
+        self.assertEqual('remote-note.txt', local_file.remote_id)
+        self.assertEqual(1, stats.size_differs)
+        self.assertEqual(0, stats.computed_hash)
+
+    def test_same_size_computes_hash(self):
+        local_file = LocalFile('/tmp/DukeDsClientTestFolder/note.txt')
+        stats = FileCompareStats()
+        remote_file = FakeRemoteFile('note.txt', local_file.size, local_file.get_hash_value())
+        local_file.update_remote_ids(remote_file, stats)
+        self.assertEqual(False, local_file.need_to_send)
+        self.assertEqual(1, stats.computed_hash)
+
+    def test_same_size_uses_cached_hash(self):
+        size = os.path.getsize('/tmp/DukeDsClientTestFolder/note.txt')
+        local_file = LocalFile('/tmp/DukeDsClientTestFolder/note.txt', hash_cache=FakeHashCache({size: 'abc'}))
+        stats = FileCompareStats()
+        local_file.update_remote_ids(FakeRemoteFile('note.txt', local_file.size, 'abc'), stats)
+        self.assertEqual(False, local_file.need_to_send)
+        self.assertEqual(1, stats.cached_hash)
+        self.assertEqual(0, stats.computed_hash)
+
+    def test_project_counts_missing(self):
+        content = LocalProject(False, file_exclude_regex=INCLUDE_ALL)
+        content.add_path('/tmp/DukeDsClientTestFolder/results')
+        remote_project = FakeRemoteFolder('project', [FakeRemoteFolder('results', [])])
+        content.update_remote_ids(remote_project)
+        self.assertEqual(5, content.compare_stats.missing_remote)
+        self.assertEqual(0, content.compare_stats.compared_files())
+        self.assertEqual('5 new, 0 changed size, 0 without remote hash, 0 matched cached hash, 0 hashed',
+                         content.compare_stats.result_str())
+
+    def test_prefers_configured_hash_alg(self):
+        local_file = LocalFile('/tmp/DukeDsClientTestFolder/note.txt', hash_algs=['sha256'])
+        sha256_value = local_file.path_data.get_hash('sha256').value
+        stats = FileCompareStats()
+        remote_file = FakeRemoteFile('note.txt', local_file.size, sha256_value, hash_alg='sha256')
+        remote_file.hashes['md5'] = 'bad-md5'
+        local_file.update_remote_ids(remote_file, stats)
+        self.assertEqual(False, local_file.need_to_send)
+
+    def test_no_common_hash_alg(self):
+        local_file = LocalFile('/tmp/DukeDsClientTestFolder/note.txt')
+        stats = FileCompareStats()
+        local_file.update_remote_ids(FakeRemoteFile('note.txt', local_file.size, 'abc', hash_alg='sha1'), stats)
+        self.assertEqual(True, local_file.need_to_send)
+        self.assertEqual(1, stats.no_remote_hash)
+        self.assertEqual(0, stats.computed_hash)
+
+    def test_get_hashes_includes_md5(self):
+        local_file = LocalFile('/tmp/DukeDsClientTestFolder/note.txt', hash_algs=['sha256'])
+        hashes = local_file.path_data.get_hashes()
+        self.assertEqual(['sha256', 'md5'], [hash_data.alg for hash_data in hashes])
+        self.assertEqual(local_file.get_hash_value(), hashes[1].value)
+
+
+class FakeStat(object):
+    def __init__(self, st_mtime_ns):
+        self.st_dev = 1
+        self.st_ino = 2
+        self.st_size = 3
+        self.st_mtime = st_mtime_ns / 1000000000.0
+        self.st_mtime_ns = st_mtime_ns
+
+
+class TestPathData(TestCase):
+    def test_same_stat_compares_mtime_ns(self):
+        stat_info = FakeStat(1500000000000000000)
+        # one nanosecond later has the same float st_mtime
+        changed_stat_info = FakeStat(1500000000000000001)
+        self.assertEqual(stat_info.st_mtime, changed_stat_info.st_mtime)
+        self.assertEqual(True, PathData._same_stat(stat_info, FakeStat(1500000000000000000)))
+        self.assertEqual(False, PathData._same_stat(stat_info, changed_stat_info))
@@ -74,6 +74,30 @@ def add_func(context):
     return v1 + v2
 
 
+initialized_value = 0
+
+
+def set_initialized_value(value):
+    global initialized_value
+    initialized_value = value
+
+
+def add_initialized_value_func(context):
+    """
+    Function run by AddInitializedValueCommand
+    :param context: tuple of values passed in
+    :return: sum of values and the value set by the pool initializer
+    """
+    v1, v2 = context
+    return v1 + v2 + initialized_value
+
+
+class AddInitializedValueCommand(AddCommand):
+    def __init__(self, value1, value2):
+        super(AddInitializedValueCommand, self).__init__(value1, value2)
+        self.func = add_initialized_value_func
+
+
 class TestTaskRunner(TestCase):
     """
     Task runner should be able to add numbers in a separate process and re-use the result in waiting tasks.
@@ -112,3 +136,31 @@ class TestTaskRunner(TestCase):
         self.assertEqual(add_command.result, 40)
         self.assertEqual(add_command2.parent_task_result, None)
         self.assertEqual(add_command2.result, 5)
+
+    def test_executor_initializer(self):
+        add_command = AddInitializedValueCommand(10, 30)
+        executor = TaskExecutor(10, initializer=set_initialized_value, initargs=(100,))
+        runner = TaskRunner(executor)
+        runner.add(None, add_command)
+        runner.run()
+        self.assertEqual(add_command.result, 140)
+
+    def test_add_while_polling(self):
+        add_command = AddCommand(10, 30)
+        add_command2 = AddCommand(4, 1)
+        add_command3 = AddCommand(2, 2)
+        executor = TaskExecutor(10)
+        runner = TaskRunner(executor)
+        runner.add(None, add_command)
+        runner.start()
+        runner.add(1, add_command2)
+        while runner.poll():
+            pass
+        # tasks added without a parent after the runner has started are run by the next poll
+        runner.add(None, add_command3)
+        while runner.poll():
+            pass
+        self.assertEqual(add_command.result, 40)
+        self.assertEqual(add_command2.parent_task_result, 40)
+        self.assertEqual(add_command2.result, 5)
+        self.assertEqual(add_command3.result, 4)
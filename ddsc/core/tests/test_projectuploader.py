@@ -1,6 +1,11 @@
 from unittest import TestCase
+import time
 import pickle
-from ddsc.core.projectuploader import UploadSettings, UploadContext
+import ddsc.core.projectuploader
+from ddsc.core.projectuploader import UploadSettings, UploadContext, SmallItemUploadTaskBuilder, \
+    CreateSmallFilesCommand, create_small_files, DuplicateUploads, ProjectUploader
+from ddsc.core.fileuploader import ParentData
+from ddsc.core.ddsapi import DataServiceError
 
 
 class FakeDataServiceApi(object):
@@ -19,4 +24,299 @@ class TestUploadContext(TestCase):
         settings = UploadSettings(None, FakeDataServiceApi(), None, None)
         params = ('one', 'two', 'three')
         context = UploadContext(settings, params)
-        pickle.dumps(context)
\ No newline at end of file
+        pickle.dumps(context)
+
+
+class FakeConfig(object):
+    def __init__(self, upload_bytes_per_chunk=100, upload_small_file_batch_size=3):
+        self.upload_bytes_per_chunk = upload_bytes_per_chunk
+        self.upload_small_file_batch_size = upload_small_file_batch_size
+        self.upload_workers = 1
+        self.autotune_workers = False
+
+
+class FakeLocalFile(object):
+    def __init__(self, name, size, need_to_send=True):
+        self.name = name
+        self.size = size
+        self.need_to_send = need_to_send
+        self.remote_id = None
+        self.uploaded_path_data = None
+
+    def set_remote_id_after_send(self, remote_id):
+        self.remote_id = remote_id
+
+    def remove_staged_file(self, path_data=None):
+        self.uploaded_path_data = path_data
+
+
+class FakeFolder(object):
+    def __init__(self, name, remote_id=None):
+        self.name = name
+        self.remote_id = remote_id
+
+
+class FakeTaskRunner(object):
+    def __init__(self):
+        self.commands = []
+
+    def add(self, parent_task_id, command):
+        self.commands.append((parent_task_id, command))
+        return len(self.commands)
+
+
+class FakeWatcher(object):
+    def __init__(self):
+        self.items = []
+
+    def transferring_item(self, item, increment_amt=1):
+        self.items.append(item)
+
+
+class FakeUploadSettings(object):
+    def __init__(self, config):
+        self.config = config
+        self.watcher = FakeWatcher()
+
+
+class TestSmallItemUploadTaskBuilder(TestCase):
+    def setUp(self):
+        self.task_runner = FakeTaskRunner()
+        self.builder = SmallItemUploadTaskBuilder(FakeUploadSettings(FakeConfig()), self.task_runner)
+
+    def batch_names(self):
+        return [[local_file.name for local_file in command.local_files] for _, command in self.task_runner.commands]
+
+    def test_batches_by_parent_and_count(self):
+        folder1 = FakeFolder('folder1')
+        folder2 = FakeFolder('folder2')
+        for name in ['a', 'b', 'c', 'd']:
+            self.builder.visit_file(FakeLocalFile(name, 1), folder1)
+        self.builder.visit_file(FakeLocalFile('e', 1), folder2)
+        self.builder.visit_file(FakeLocalFile('f', 1, need_to_send=False), folder2)
+        self.assertEqual([['a', 'b', 'c']], self.batch_names())
+        self.builder.add_small_file_batches()
+        self.assertEqual([['a', 'b', 'c'], ['d'], ['e']], sorted(self.batch_names()))
+        self.assertEqual({}, self.builder.small_file_batches)
+
+    def test_batches_limited_by_bytes(self):
+        folder = FakeFolder('folder')
+        for name, size in [('a', 60), ('b', 40), ('c', 1), ('d', 100)]:
+            self.builder.visit_file(FakeLocalFile(name, size), folder)
+        self.builder.add_small_file_batches()
+        self.assertEqual([['a', 'b'], ['c'], ['d']], self.batch_names())
+
+    def test_waits_for_parent_without_remote_id(self):
+        folder = FakeFolder('folder')
+        self.builder.visit_folder(folder, FakeFolder('parent', remote_id='parent1'))
+        self.builder.visit_file(FakeLocalFile('a', 1), folder)
+        self.builder.add_small_file_batches()
+        self.assertEqual([None, 1], [parent_task_id for parent_task_id, _ in self.task_runner.commands])
+        # once the folder has been created new files no longer wait on its task
+        folder.remote_id = 'folder1'
+        self.builder.visit_file(FakeLocalFile('b', 1), folder)
+        self.builder.add_small_file_batches()
+        self.assertEqual(None, self.task_runner.commands[2][0])
+
+    def test_large_file_raises(self):
+        with self.assertRaises(ValueError):
+            self.builder.visit_file(FakeLocalFile('big', 101), FakeFolder('folder'))
+
+
+class TestCreateSmallFilesCommand(TestCase):
+    def test_after_run_sets_remote_ids(self):
+        settings = FakeUploadSettings(FakeConfig())
+        local_files = [FakeLocalFile('a', 1), FakeLocalFile('b', 1)]
+        command = CreateSmallFilesCommand(settings, local_files, FakeFolder('folder'))
+        command.after_run([('id1', 'path1'), ('id2', 'path2')])
+        self.assertEqual(['id1', 'id2'], [local_file.remote_id for local_file in local_files])
+        self.assertEqual(local_files, settings.watcher.items)
+        self.assertEqual(['path1', 'path2'], [local_file.uploaded_path_data for local_file in local_files])
+
+
+class FakeUploadContext(object):
+    def __init__(self, params):
+        self.project_id = 'project1'
+        self.params = params
+
+    def make_data_service(self):
+        return 'data_service'
+
+
+class TestCreateSmallFiles(TestCase):
+    def setUp(self):
+        self.original_create_small_file = ddsc.core.projectuploader.create_small_file
+        ddsc.core.projectuploader.create_small_file = self.fake_create_small_file
+
+    def tearDown(self):
+        ddsc.core.projectuploader.create_small_file = self.original_create_small_file
+
+    @staticmethod
+    def fake_create_small_file(data_service, project_id, parent_data, path_data, remote_file_id):
+        return '{}/{}/{}/{}'.format(project_id, parent_data, path_data, remote_file_id)
+
+    def test_results_in_file_order(self):
+        file_params = [('file{}'.format(i), 'id{}'.format(i)) for i in range(20)]
+        result = create_small_files(FakeUploadContext(('folder1', file_params)))
+        expected = [('project1/folder1/file{}/id{}'.format(i, i), 'file{}'.format(i)) for i in range(20)]
+        self.assertEqual(expected, result)
+
+    def test_single_file(self):
+        result = create_small_files(FakeUploadContext(('folder1', [('file1', None)])))
+        self.assertEqual([('project1/folder1/file1/None', 'file1')], result)
+
+
+class HashedLocalFile(FakeLocalFile):
+    def __init__(self, name, size, hash_value, remote_id=None):
+        super(HashedLocalFile, self).__init__(name, size)
+        self.hash_value = hash_value
+        self.remote_id = remote_id
+        self.hashed = 0
+
+    def get_hash_value(self):
+        self.hashed += 1
+        return self.hash_value
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, json_data):
+        self.status_code = status_code
+        self.json_data = json_data
+
+    def json(self):
+        return self.json_data
+
+
+class FakeFileDataService(object):
+    def __init__(self, refuse_reuse=False):
+        self.refuse_reuse = refuse_reuse
+        self.created = []
+        self.updated = []
+
+    def create_file(self, parent_kind, parent_id, upload_id):
+        if self.refuse_reuse:
+            raise DataServiceError(FakeResponse(400, {'reason': 'upload already used'}), '/files', {})
+        self.created.append((parent_kind, parent_id, upload_id))
+        return FakeResponse(201, {'id': 'file{}'.format(len(self.created))})
+
+    def update_file(self, file_id, upload_id):
+        self.updated.append((file_id, upload_id))
+
+
+class FakeRemoteFile(object):
+    kind = 'dds-file'
+
+    def __init__(self, size, hashes, upload_id):
+        self.size = size
+        self.hashes = hashes
+        self.upload_id = upload_id
+
+
+class FakeRemoteProject(object):
+    kind = 'dds-project'
+
+    def __init__(self, children):
+        self.children = children
+
+
+class TestDuplicateUploads(TestCase):
+    def setUp(self):
+        self.parent_data = ParentData('dds-folder', 'folder1')
+
+    def test_reuses_upload_of_identical_file(self):
+        data_service = FakeFileDataService()
+        first = HashedLocalFile('a', 500, 'abc')
+        copy = HashedLocalFile('b', 500, 'abc')
+        existing_copy = HashedLocalFile('c', 500, 'abc', remote_id='remote3')
+        duplicate_uploads = DuplicateUploads(data_service, 100)
+        self.assertEqual(None, duplicate_uploads.reuse_upload(first, self.parent_data))
+        duplicate_uploads.add_upload(first, 'upload1')
+        self.assertEqual('file1', duplicate_uploads.reuse_upload(copy, self.parent_data))
+        self.assertEqual('remote3', duplicate_uploads.reuse_upload(existing_copy, self.parent_data))
+        self.assertEqual([('dds-folder', 'folder1', 'upload1')], data_service.created)
+        self.assertEqual([('remote3', 'upload1')], data_service.updated)
+
+    def test_different_contents_not_reused(self):
+        data_service = FakeFileDataService()
+        first = HashedLocalFile('a', 500, 'abc')
+        other = HashedLocalFile('b', 500, 'def')
+        duplicate_uploads = DuplicateUploads(data_service, 100)
+        duplicate_uploads.add_upload(first, 'upload1')
+        self.assertEqual(None, duplicate_uploads.reuse_upload(other, self.parent_data))
+        self.assertEqual([], data_service.created)
+
+    def test_unique_sizes_not_hashed(self):
+        first = HashedLocalFile('a', 500, 'abc')
+        other = HashedLocalFile('b', 600, 'abc')
+        duplicate_uploads = DuplicateUploads(FakeFileDataService(), 100)
+        duplicate_uploads.add_upload(first, 'upload1')
+        self.assertEqual(None, duplicate_uploads.reuse_upload(other, self.parent_data))
+        self.assertEqual(0, first.hashed + other.hashed)
+
+    def test_stops_when_data_service_refuses(self):
+        files = [HashedLocalFile(name, 500, 'abc') for name in ['a', 'b', 'c']]
+        duplicate_uploads = DuplicateUploads(FakeFileDataService(refuse_reuse=True), 100)
+        duplicate_uploads.add_upload(files[0], 'upload1')
+        self.assertEqual(None, duplicate_uploads.reuse_upload(files[1], self.parent_data))
+        duplicate_uploads.add_upload(files[1], 'upload2')
+        hashed = files[2].hashed
+        self.assertEqual(None, duplicate_uploads.reuse_upload(files[2], self.parent_data))
+        self.assertEqual(hashed, files[2].hashed)
+
+    def test_reuses_upload_of_moved_remote_file(self):
+        data_service = FakeFileDataService()
+        moved = HashedLocalFile('moved', 500, 'abc')
+        other = HashedLocalFile('other', 700, 'def')
+        remote_project = FakeRemoteProject([
+            FakeRemoteFile(500, {'md5': 'abc'}, 'upload1'),
+            FakeRemoteFile(700, {'sha1': 'def'}, 'upload2'),
+            FakeRemoteFile(900, {'md5': 'ghi'}, 'upload3'),
+        ])
+        duplicate_uploads = DuplicateUploads(data_service, 100)
+        duplicate_uploads.add_remote_files(remote_project)
+        self.assertEqual('file1', duplicate_uploads.reuse_upload(moved, self.parent_data))
+        self.assertEqual(None, duplicate_uploads.reuse_upload(other, self.parent_data))
+        self.assertEqual([('dds-folder', 'folder1', 'upload1')], data_service.created)
+        self.assertEqual([500, 900], sorted(duplicate_uploads.uploads_by_size))
+
+
+class FakeTaskExecutor(object):
+    def __init__(self, tasks_at_once, initializer=None, initargs=()):
+        pass
+
+
+class SlowTaskRunner(object):
+    def __init__(self, busy_seconds):
+        self.busy_until = None
+        self.busy_seconds = busy_seconds
+        self.polls = 0
+
+    def start(self):
+        self.busy_until = time.time() + self.busy_seconds
+
+    def poll(self):
+        self.polls += 1
+        return time.time() < self.busy_until
+
+
+class FinishedPlanner(object):
+    def get_items(self, timeout):
+        return [], True
+
+
+class TestProjectUploader(TestCase):
+    def setUp(self):
+        self.original_task_executor = ddsc.core.projectuploader.TaskExecutor
+        ddsc.core.projectuploader.TaskExecutor = FakeTaskExecutor
+
+    def tearDown(self):
+        ddsc.core.projectuploader.TaskExecutor = self.original_task_executor
+
+    def test_run_streaming_waits_on_running_tasks(self):
+        settings = FakeUploadSettings(FakeConfig())
+        settings.data_service = None
+        uploader = ProjectUploader(settings)
+        uploader.runner = SlowTaskRunner(busy_seconds=0.3)
+        uploader.run_streaming(FinishedPlanner(), None)
+        # about one poll per STREAM_WAIT_SECONDS instead of polling constantly
+        self.assertLess(uploader.runner.polls, 20)
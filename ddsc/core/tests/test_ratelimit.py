@@ -0,0 +1,90 @@
+from unittest import TestCase
+from multiprocessing import Process
+import ddsc.core.ratelimit
+from ddsc.core.ratelimit import TokenBucket, create_rate_limiter, install_rate_limiter, set_rate_limiter, \
+    get_rate_limiter, limit_transfer
+
+
+class FakeTime(object):
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+class FakeConfig(object):
+    def __init__(self, transfer_rate_limit, transfer_rate_burst):
+        self.transfer_rate_limit = transfer_rate_limit
+        self.transfer_rate_burst = transfer_rate_burst
+
+
+def consume_in_process(token_bucket, num_bytes):
+    token_bucket.consume(num_bytes)
+
+
+class TestTokenBucket(TestCase):
+    def setUp(self):
+        self.fake_time = FakeTime(1000.0)
+        ddsc.core.ratelimit.time = self.fake_time
+
+    def tearDown(self):
+        ddsc.core.ratelimit.time = __import__('time')
+
+    def test_burst_does_not_sleep(self):
+        token_bucket = TokenBucket(100, 500)
+        token_bucket.consume(300)
+        token_bucket.consume(200)
+        self.assertEqual([], self.fake_time.sleeps)
+
+    def test_sleeps_for_missing_tokens(self):
+        token_bucket = TokenBucket(100, 500)
+        token_bucket.consume(500)
+        token_bucket.consume(50)
+        self.assertEqual([0.5], self.fake_time.sleeps)
+        # callers waiting at the same time are served in order
+        token_bucket.consume(100)
+        self.assertEqual([0.5, 1.5], self.fake_time.sleeps)
+
+    def test_tokens_refill_up_to_burst(self):
+        token_bucket = TokenBucket(100, 500)
+        token_bucket.consume(500)
+        self.fake_time.now += 2
+        token_bucket.consume(200)
+        self.assertEqual([], self.fake_time.sleeps)
+        self.fake_time.now += 100
+        token_bucket.consume(600)
+        self.assertEqual([1.0], self.fake_time.sleeps)
+
+    def test_shared_with_other_processes(self):
+        token_bucket = TokenBucket(100, 500)
+        process = Process(target=consume_in_process, args=(token_bucket, 400))
+        process.start()
+        process.join()
+        token_bucket.consume(200)
+        self.assertEqual(1, len(self.fake_time.sleeps))
+
+
+class TestRateLimiterSetup(TestCase):
+    def tearDown(self):
+        set_rate_limiter(None)
+
+    def test_create_rate_limiter(self):
+        self.assertEqual(None, create_rate_limiter(FakeConfig(0, 0)))
+        token_bucket = create_rate_limiter(FakeConfig(100, 500))
+        self.assertEqual(100, token_bucket.bytes_per_second)
+        self.assertEqual(500, token_bucket.burst_bytes)
+
+    def test_install_keeps_existing_limiter(self):
+        install_rate_limiter(FakeConfig(100, 500))
+        token_bucket = get_rate_limiter()
+        install_rate_limiter(FakeConfig(200, 500))
+        self.assertIs(token_bucket, get_rate_limiter())
+
+    def test_limit_transfer_without_limiter(self):
+        set_rate_limiter(None)
+        limit_transfer(1000)
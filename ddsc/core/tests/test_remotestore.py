@@ -4,7 +4,7 @@ from unittest import TestCase
 from ddsc.core.remotestore import RemoteProject, RemoteFolder, RemoteFile, RemoteUser
 from ddsc.core.remotestore import RemoteStore
 from ddsc.core.remotestore import RemoteAuthRole
-from ddsc.core.remotestore import RemoteProjectChildren
+from ddsc.core.remotestore import RemoteProjectChildren, RemoteSubtreeFetcher
 
 
 class TestProjectFolderFile(TestCase):
@@ -223,6 +223,33 @@ class TestProjectFolderFile(TestCase):
         self.assertEqual(1874572, file.size)
         self.assertEqual('test/bigWigToWig', file.remote_path)
 
+    def test_file_hashes(self):
+        file_json = {
+            'id': '123', 'kind': 'dds-file', 'name': 'data.txt', 'is_deleted': False,
+            'upload': {'size': 10, 'hash': {'algorithm': 'md5', 'value': 'abc'}}
+        }
+        file = RemoteFile(file_json, 'results')
+        self.assertFalse(hasattr(file, '__dict__'))
+        self.assertEqual('results/data.txt', file.remote_path)
+        self.assertEqual({'md5': 'abc'}, file.hashes)
+        file_json['upload']['hashes'] = [{'algorithm': 'sha256', 'value': 'def'}]
+        file = RemoteFile(file_json, 'results')
+        self.assertEqual('abc', file.file_hash)
+        self.assertEqual({'md5': 'abc', 'sha256': 'def'}, file.hashes)
+        file.set_hash('ghi', 'md5')
+        self.assertEqual({'md5': 'ghi'}, file.hashes)
+
+    def test_get_hashes_from_upload(self):
+        upload = {
+            'hash': {'algorithm': 'md5', 'value': 'abc'},
+            'hashes': [
+                {'algorithm': 'md5', 'value': 'abc'},
+                {'algorithm': 'sha256', 'value': 'def'},
+            ]
+        }
+        self.assertEqual({'md5': 'abc', 'sha256': 'def'}, RemoteFile.get_hashes_from_upload(upload))
+        self.assertEqual({}, RemoteFile.get_hashes_from_upload({'hash': None}))
+
 
 class TestRemoteUser(TestCase):
     def test_parse_user(self):
@@ -499,6 +526,26 @@ class TestRemoteProjectChildren(TestCase):
         self.assertEqual(file3_id, tree[2].id)
         self.assertEqual(None, tree[2].file_hash)
 
+    def test_deeply_nested_folders(self):
+        project_id = 'project'
+        sample_data = []
+        parent = {'kind': 'dds-project', 'id': project_id}
+        for depth in range(5000):
+            folder_id = 'folder{}'.format(depth)
+            sample_data.append({'kind': 'dds-folder', 'parent': parent, 'is_deleted': False, 'name': 'f',
+                                'id': folder_id})
+            parent = {'kind': 'dds-folder', 'id': folder_id}
+        sample_data.reverse()
+        tree = RemoteProjectChildren(project_id, sample_data).get_tree()
+        depth = 0
+        folder = tree[0]
+        while folder.children:
+            self.assertEqual(1, len(folder.children))
+            folder = folder.children[0]
+            depth += 1
+        self.assertEqual(4999, depth)
+        self.assertEqual('/'.join(['f'] * 5000), folder.remote_path)
+
 
 class TestReadRemoteHash(TestCase):
     def test_old_way(self):
@@ -546,3 +593,85 @@ class TestReadRemoteHash(TestCase):
         hash_info = RemoteFile.get_hash_from_upload(upload)
         self.assertEqual(hash_info["value"], "aabbcc")
         self.assertEqual(hash_info["algorithm"], "md5")
+
+
+class FakeChildrenResponse(object):
+    def __init__(self, results):
+        self.results = results
+
+    def json(self):
+        return {'results': self.results}
+
+
+class FakeChildrenDataService(object):
+    """
+    Serves children listings for a project with folders data, data/results and other.
+    """
+    def __init__(self):
+        self.items = [
+            self.make_item('dds-folder', 'data', 'project1', 'dds-project'),
+            self.make_item('dds-folder', 'other', 'project1', 'dds-project'),
+            self.make_item('dds-folder', 'results', 'data', 'dds-folder'),
+            self.make_item('dds-file', 'notes.txt', 'data', 'dds-folder'),
+            self.make_item('dds-file', 'r1.txt', 'results', 'dds-folder'),
+            self.make_item('dds-file', 'big.txt', 'other', 'dds-folder'),
+        ]
+        self.calls = []
+
+    @staticmethod
+    def make_item(kind, name, parent_id, parent_kind):
+        item = {'kind': kind, 'id': name, 'name': name, 'is_deleted': False,
+                'parent': {'id': parent_id, 'kind': parent_kind}}
+        if kind == 'dds-file':
+            item['upload'] = {'size': 1, 'hash': None}
+        return item
+
+    def get_project_children(self, project_id, name_contains):
+        self.calls.append(('project', project_id, name_contains))
+        return FakeChildrenResponse(self._children(project_id, name_contains))
+
+    def get_folder_children(self, folder_id, name_contains):
+        self.calls.append(('folder', folder_id, name_contains))
+        return FakeChildrenResponse(self._children(folder_id, name_contains))
+
+    def _children(self, parent_id, name_contains):
+        children = [item for item in self.items if item['parent']['id'] == parent_id]
+        if name_contains is not None:
+            for child in list(children):
+                children.extend(self._children(child['id'], name_contains))
+        return children
+
+
+class TestRemoteSubtreeFetcher(TestCase):
+    def create_project(self):
+        return RemoteProject({'id': 'project1', 'kind': 'dds-project', 'name': 'mouse', 'description': '',
+                              'is_deleted': False})
+
+    def test_fetches_only_included_folder(self):
+        data_service = FakeChildrenDataService()
+        project = self.create_project()
+        RemoteSubtreeFetcher(data_service, project).add_path('data/results')
+        self.assertEqual(['data'], [child.name for child in project.children])
+        results = project.children[0].children[0]
+        self.assertEqual('data/results', results.remote_path)
+        self.assertEqual(['data/results/r1.txt'], [child.remote_path for child in results.children])
+        self.assertEqual([('project', 'project1', None), ('folder', 'data', None), ('folder', 'results', '')],
+                         data_service.calls)
+
+    def test_nested_paths_fetch_folder_once(self):
+        data_service = FakeChildrenDataService()
+        project = self.create_project()
+        fetcher = RemoteSubtreeFetcher(data_service, project)
+        fetcher.add_path('data')
+        fetcher.add_path('data/results')
+        self.assertEqual(['results', 'notes.txt'], [child.name for child in project.children[0].children])
+        self.assertEqual([('project', 'project1', None), ('folder', 'data', '')], data_service.calls)
+
+    def test_missing_path_and_file_path(self):
+        data_service = FakeChildrenDataService()
+        project = self.create_project()
+        fetcher = RemoteSubtreeFetcher(data_service, project)
+        fetcher.add_path('missing/stuff')
+        fetcher.add_path('data/notes.txt')
+        self.assertEqual(['data'], [child.name for child in project.children])
+        self.assertEqual(['notes.txt'], [child.name for child in project.children[0].children])
@@ -0,0 +1,173 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import ddsc.config
+from ddsc.core.ddsapi import DataServiceError
+from ddsc.core.remotestore import RemoteProjectChildren, RemoteStore
+from ddsc.core.remotetreecache import RemoteTreeCache, ProjectNameIndex
+
+PROJECT_CHILDREN = [
+    {'kind': 'dds-folder',
+     'id': 'folder1',
+     'name': 'data',
+     'is_deleted': False,
+     'parent': {'kind': 'dds-project', 'id': 'project1'},
+     'audit': {'created_on': '2016-02-19T16:38:56.229Z'}},
+    {'kind': 'dds-file',
+     'id': 'file1',
+     'name': 'results.txt',
+     'is_deleted': False,
+     'parent': {'kind': 'dds-folder', 'id': 'folder1'},
+     'current_version': {
+         'upload': {
+             'id': 'upload1',
+             'size': 10,
+             'hashes': [{'algorithm': 'md5', 'value': 'abc', 'audit': {}}],
+             'storage_provider': {'id': 'swift'}
+         }
+     }},
+]
+
+
+class FakeProject(object):
+    def __init__(self, id):
+        self.id = id
+
+
+class TestRemoteTreeCache(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_load_after_save(self):
+        cache = RemoteTreeCache(self.cache_dir, 'https://api.example.com', 600)
+        project = FakeProject('project1')
+        self.assertEqual(None, cache.load(project))
+        cache.save(project, PROJECT_CHILDREN)
+        children = cache.load(project)
+        tree = RemoteProjectChildren('project1', children).get_tree()
+        self.assertEqual('data', tree[0].name)
+        self.assertEqual('data/results.txt', tree[0].children[0].remote_path)
+        self.assertEqual(10, tree[0].children[0].size)
+        self.assertEqual('abc', tree[0].children[0].file_hash)
+        self.assertEqual('upload1', tree[0].children[0].upload_id)
+        self.assertNotIn('audit', children[0])
+
+    def test_expired_misses(self):
+        cache = RemoteTreeCache(self.cache_dir, 'https://api.example.com', -1)
+        project = FakeProject('project1')
+        cache.save(project, PROJECT_CHILDREN)
+        self.assertEqual(None, cache.load(project))
+
+    def test_servers_kept_separate(self):
+        project = FakeProject('project1')
+        RemoteTreeCache(self.cache_dir, 'https://api.example.com', 600).save(project, PROJECT_CHILDREN)
+        self.assertEqual(None, RemoteTreeCache(self.cache_dir, 'https://other.example.com', 600).load(project))
+
+    def test_remove(self):
+        cache = RemoteTreeCache(self.cache_dir, 'https://api.example.com', 600)
+        project = FakeProject('project1')
+        cache.save(project, PROJECT_CHILDREN)
+        cache.remove('project1')
+        self.assertEqual(None, cache.load(project))
+        cache.remove('project1')
+
+
+class TestProjectNameIndex(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.cache_dir, 'project_names.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_set_get_remove(self):
+        ProjectNameIndex(self.filename).set('mouse', '123')
+        index = ProjectNameIndex(self.filename)
+        self.assertEqual('123', index.get('mouse'))
+        index.remove('mouse')
+        self.assertEqual(None, ProjectNameIndex(self.filename).get('mouse'))
+
+    def test_replace_all_keeps_first_duplicate(self):
+        index = ProjectNameIndex(self.filename)
+        index.set('old', '1')
+        index.replace_all([{'name': 'mouse', 'id': '2'}, {'name': 'mouse', 'id': '3'}])
+        index = ProjectNameIndex(self.filename)
+        self.assertEqual(None, index.get('old'))
+        self.assertEqual('2', index.get('mouse'))
+
+
+class FakeResponse(object):
+    def __init__(self, json_data):
+        self.json_data = json_data
+
+    def json(self):
+        return self.json_data
+
+
+class FakeErrorResponse(object):
+    status_code = 404
+
+    def json(self):
+        return {}
+
+
+class FakeDataService(object):
+    def __init__(self, projects):
+        self.projects = projects
+        self.calls = []
+
+    def get_projects(self):
+        self.calls.append('get_projects')
+        return FakeResponse({'results': self.projects})
+
+    def get_project_by_id(self, id):
+        self.calls.append('get_project_by_id')
+        for project in self.projects:
+            if project['id'] == id:
+                return FakeResponse(project)
+        raise DataServiceError(FakeErrorResponse(), '/projects/' + id, {})
+
+
+def make_project(id, name):
+    return {'id': id, 'kind': 'dds-project', 'name': name, 'description': '', 'is_deleted': False}
+
+
+class TestRemoteStoreProjectNameIndex(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.config = ddsc.config.Config()
+        self.config.update_properties({'cache_dir': self.cache_dir})
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def create_remote_store(self, projects):
+        remote_store = RemoteStore(self.config)
+        remote_store.data_service = FakeDataService(projects)
+        return remote_store
+
+    def test_second_lookup_uses_index(self):
+        projects = [make_project('1', 'rat'), make_project('2', 'mouse')]
+        remote_store = self.create_remote_store(projects)
+        self.assertEqual('2', remote_store._get_my_project('mouse').id)
+        self.assertEqual(['get_projects'], remote_store.data_service.calls)
+        remote_store = self.create_remote_store(projects)
+        self.assertEqual('2', remote_store._get_my_project('mouse').id)
+        self.assertEqual(['get_project_by_id'], remote_store.data_service.calls)
+
+    def test_stale_index_falls_back_to_listing(self):
+        self.create_remote_store([make_project('2', 'mouse')])._get_my_project('mouse')
+        remote_store = self.create_remote_store([make_project('2', 'rat'), make_project('3', 'mouse')])
+        self.assertEqual('3', remote_store._get_my_project('mouse').id)
+        self.assertEqual(['get_project_by_id', 'get_projects'], remote_store.data_service.calls)
+
+    def test_deleted_project_falls_back_to_listing(self):
+        self.create_remote_store([make_project('2', 'mouse')])._get_my_project('mouse')
+        remote_store = self.create_remote_store([])
+        self.assertEqual(None, remote_store._get_my_project('mouse'))
+        self.assertEqual(['get_project_by_id', 'get_projects'], remote_store.data_service.calls)
@@ -0,0 +1,179 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+from ddsc.config import Config
+from ddsc.core.upload import ProjectUpload, RemoteProjectFetcher, StreamingUploadPlanner
+from ddsc.core.localstore import LocalProject, HashUtil
+
+
+class FakeRemoteStore(object):
+    def __init__(self, remote_project=None, error=None):
+        self.remote_project = remote_project
+        self.error = error
+        self.fetched_names = []
+        self.fetched_ids = []
+
+    def fetch_remote_project(self, project_name):
+        self.fetched_names.append(project_name)
+        if self.error:
+            raise self.error
+        return self.remote_project
+
+    def fetch_remote_project_by_id(self, project_id, include_children=False):
+        self.fetched_ids.append((project_id, include_children))
+        return self.remote_project
+
+
+class ScanFailsLocalProject(LocalProject):
+    def __init__(self, items_before_error):
+        super(ScanFailsLocalProject, self).__init__(False, file_exclude_regex='')
+        self.items_before_error = items_before_error
+
+    def scan_paths(self, path_list):
+        for index, found in enumerate(super(ScanFailsLocalProject, self).scan_paths(path_list)):
+            if index == self.items_before_error:
+                raise ValueError('scan failed')
+            yield found
+
+
+class FakeRemoteFile(object):
+    def __init__(self, name, size, hash_value):
+        self.id = 'remote-' + name
+        self.name = name
+        self.size = size
+        self.hashes = {'md5': hash_value}
+
+
+class FakeRemoteFolder(object):
+    def __init__(self, name, children):
+        self.id = 'remote-' + name
+        self.name = name
+        self.children = children
+
+
+class TestRemoteProjectFetcher(TestCase):
+    def test_returns_remote_project(self):
+        remote_store = FakeRemoteStore(remote_project='project')
+        fetcher = RemoteProjectFetcher(remote_store, 'mouse')
+        fetcher.start()
+        self.assertEqual('project', fetcher.get_remote_project())
+        self.assertEqual(['mouse'], remote_store.fetched_names)
+        self.assertEqual(True, fetcher.is_done())
+
+    def test_fetches_by_id(self):
+        remote_store = FakeRemoteStore(remote_project='project')
+        fetcher = RemoteProjectFetcher(remote_store, 'mouse', '123')
+        fetcher.start()
+        self.assertEqual('project', fetcher.get_remote_project())
+        self.assertEqual([], remote_store.fetched_names)
+        self.assertEqual([('123', True)], remote_store.fetched_ids)
+
+    def test_raises_fetch_error(self):
+        remote_store = FakeRemoteStore(error=ValueError('oops'))
+        fetcher = RemoteProjectFetcher(remote_store, 'mouse')
+        fetcher.start()
+        with self.assertRaises(ValueError):
+            fetcher.get_remote_project()
+
+
+class TestStreamingUploadPlanner(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.temp_dir, 'data')
+        os.makedirs(os.path.join(self.data_dir, 'sub'))
+        for name in ['a.txt', 'b.txt', os.path.join('sub', 'c.txt')]:
+            with open(os.path.join(self.data_dir, name), 'w') as outfile:
+                outfile.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def get_all_items(self, planner):
+        all_items = []
+        done = False
+        while not done:
+            items, done = planner.get_items(1)
+            all_items.extend(items)
+        return all_items
+
+    def make_planner(self, remote_store, local_project=None):
+        fetcher = RemoteProjectFetcher(remote_store, 'mouse')
+        fetcher.start()
+        if not local_project:
+            local_project = LocalProject(False, file_exclude_regex='')
+        return StreamingUploadPlanner(local_project, [self.data_dir], fetcher)
+
+    def test_compares_items_as_they_are_found(self):
+        a_path = os.path.join(self.data_dir, 'a.txt')
+        hash_util = HashUtil()
+        hash_util.add_file(a_path)
+        hash_alg, hash_value = hash_util.hexdigest()
+        remote_project = FakeRemoteFolder('project', [
+            FakeRemoteFolder('data', [FakeRemoteFile('a.txt', os.path.getsize(a_path), hash_value)])
+        ])
+        planner = self.make_planner(FakeRemoteStore(remote_project=remote_project))
+        planner.start()
+        items = self.get_all_items(planner)
+        local_project = planner.local_project
+        self.assertEqual((local_project, None), items[0])
+        self.assertEqual(remote_project, planner.remote_project)
+        self.assertEqual('remote-project', local_project.remote_id)
+        names = [item.name for item, parent in items[1:]]
+        self.assertEqual(['data', 'a.txt', 'b.txt', 'sub', 'c.txt'], names)
+        for item, parent in items[1:]:
+            self.assertIn(item, parent.children)
+        data_folder = items[1][0]
+        self.assertEqual('remote-data', data_folder.remote_id)
+        self.assertEqual([False, True], [child.need_to_send for child in data_folder.children[:2]])
+        self.assertEqual(2, local_project.compare_stats.missing_remote)
+        self.assertEqual(1, local_project.compare_stats.computed_hash)
+
+    def test_new_project(self):
+        planner = self.make_planner(FakeRemoteStore())
+        planner.start()
+        items = self.get_all_items(planner)
+        self.assertEqual(6, len(items))
+        self.assertEqual('', planner.local_project.remote_id)
+        self.assertEqual(3, planner.local_project.compare_stats.missing_remote)
+
+    def test_raises_fetch_error(self):
+        planner = self.make_planner(FakeRemoteStore(error=ValueError('oops')))
+        planner.start()
+        with self.assertRaises(ValueError):
+            self.get_all_items(planner)
+
+    def test_returns_items_found_before_scan_error(self):
+        planner = self.make_planner(FakeRemoteStore(), ScanFailsLocalProject(items_before_error=2))
+        planner.start()
+        # the items and the end of the scan are all read by the first call
+        planner.thread.join()
+        items, done = planner.get_items(1)
+        self.assertEqual((planner.local_project, None), items[0])
+        self.assertEqual(['data', 'a.txt'], [item.name for item, parent in items[1:]])
+        self.assertEqual(False, done)
+        with self.assertRaises(ValueError):
+            planner.get_items(1)
+
+
+class TestProjectUpload(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.staging_dir = os.path.join(self.temp_dir, 'staging')
+        os.mkdir(self.staging_dir)
+        self.data_dir = os.path.join(self.temp_dir, 'data')
+        os.mkdir(self.data_dir)
+        with open(os.path.join(self.data_dir, 'data.csv'), 'w') as outfile:
+            outfile.write('a,b,c\n' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_setup_error_removes_staged_files(self):
+        config = Config()
+        # nothing listens on port 1 so fetching the remote project fails after the bundle is created
+        config.update_properties({'url': 'http://127.0.0.1:1/api/v1', 'cache_dir': '',
+                                  'upload_compression_level': 6, 'upload_staging_dir': self.staging_dir})
+        with self.assertRaises(Exception):
+            ProjectUpload(config, 'mouse', [self.data_dir], bundle_folders=True)
+        self.assertEqual([], os.listdir(self.staging_dir))
@@ -1,72 +1,162 @@
 import datetime
-from ddsc.core.localstore import LocalProject
+import shutil
+import tempfile
+import threading
+from ddsc.core.localstore import LocalProject, FileCompareStats
 from ddsc.core.remotestore import RemoteStore
-from ddsc.core.util import ProgressPrinter, ProjectWalker
+from ddsc.core.util import ProgressPrinter, ProjectWalker, ScanProgressPrinter, KindType
 from ddsc.core.fileuploader import FileUploader
 from ddsc.core.projectuploader import UploadSettings, ProjectUploader
+from ddsc.core.hashcache import create_hash_cache
+from ddsc.core.ratelimit import install_rate_limiter
+from ddsc.core.bundle import create_bundles
+from ddsc.core.compression import compress_local_files, is_compressible, CompressedLocalFile
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 
 class ProjectUpload(object):
     """
     Allows uploading a local project to a remote duke-data-service.
     """
-    def __init__(self, config, project_name, folders, follow_symlinks=False):
+    def __init__(self, config, project_name, folders, follow_symlinks=False, bundle_folders=False, project_id=None):
         """
         Setup for uploading folders dictionary of paths to project_name using config.
+        When config.upload_compression_level is set compressible files are uploaded gzip compressed,
+        call cleanup when done to remove the compressed copies.
+        When config.stream_uploads is set folders are scanned and compared while run uploads them,
+        so what will be sent is only known once run has finished.
         :param config: Config configuration for performing the upload(url, keys, etc)
-        :param project_name: str name of the project we will upload files to
+        :param project_name: str name of the project we will upload files to, None to use the name of project_id
         :param folders: [str] list of paths of files/folders to upload to the project
         :param follow_symlinks: bool if true we will traverse symbolic linked directories
+        :param bundle_folders: bool if true each folder is uploaded as a single bundle file, call cleanup when done
+        :param project_id: str uuid of the existing project to upload to, when None the project is found by name
         """
         self.config = config
         self.remote_store = RemoteStore(config)
         self.project_name = project_name
-        self.remote_project = self.remote_store.fetch_remote_project(project_name)
-        self.local_project = ProjectUpload._load_local_project(folders, follow_symlinks, config.file_exclude_regex)
-        self.local_project.update_remote_ids(self.remote_project)
-        self.different_items = self._count_differences()
+        self.hash_cache = create_hash_cache(config)
+        self.bundle_dir = None
+        self.compression_dir = None
+        try:
+            self._setup(folders, follow_symlinks, bundle_folders, project_id)
+        except:
+            self.cleanup()
+            raise
+
+    def _setup(self, folders, follow_symlinks, bundle_folders, project_id):
+        """
+        Create bundles and scan and compare local files, anything written to disk is removed by cleanup.
+        """
+        config = self.config
+        if bundle_folders:
+            self.bundle_dir = tempfile.mkdtemp(prefix='ddsclient_bundles', dir=config.upload_staging_dir)
+            folders = create_bundles(folders, self.bundle_dir, config.file_exclude_regex, follow_symlinks)
+        if config.upload_compression_level:
+            self.compression_dir = tempfile.mkdtemp(prefix='ddsclient_compressed', dir=config.upload_staging_dir)
+        # Fetch the remote project tree while we scan local files since neither depends on the other
+        remote_project_fetcher = RemoteProjectFetcher(self.remote_store, self.project_name, project_id)
+        remote_project_fetcher.start()
+        self.different_items = LocalOnlyCounter(config.upload_bytes_per_chunk)
+        self.planner = None
+        if config.stream_uploads:
+            self.local_project = LocalProject(followsymlinks=follow_symlinks,
+                                              file_exclude_regex=config.file_exclude_regex,
+                                              hash_cache=self.hash_cache, hash_algs=config.file_hash_algorithms,
+                                              scan_workers=config.scan_workers)
+            self.planner = StreamingUploadPlanner(self.local_project, folders, remote_project_fetcher,
+                                                  config.upload_compression_level, self.compression_dir)
+            self.remote_project = None
+        else:
+            self.local_project = ProjectUpload._load_local_project(folders, follow_symlinks,
+                                                                   config.file_exclude_regex, self.hash_cache,
+                                                                   config.file_hash_algorithms, config.scan_workers)
+            if config.upload_compression_level:
+                compress_local_files(self.local_project, config.upload_compression_level, self.compression_dir)
+            self._set_remote_project(remote_project_fetcher.get_remote_project())
+            self.local_project.update_remote_ids(self.remote_project)
+            if self.hash_cache:
+                self.hash_cache.prune()
+            self.different_items.walk_project(self.local_project)
 
     @staticmethod
-    def _load_local_project(folders, follow_symlinks, file_exclude_regex):
-        local_project = LocalProject(followsymlinks=follow_symlinks, file_exclude_regex=file_exclude_regex)
+    def _load_local_project(folders, follow_symlinks, file_exclude_regex, hash_cache=None, hash_algs=None,
+                            scan_workers=1):
+        scan_progress = ScanProgressPrinter()
+        local_project = LocalProject(followsymlinks=follow_symlinks, file_exclude_regex=file_exclude_regex,
+                                     hash_cache=hash_cache, hash_algs=hash_algs, scan_workers=scan_workers,
+                                     scan_progress=scan_progress)
         local_project.add_paths(folders)
+        scan_progress.finished()
         return local_project
 
-    def _count_differences(self):
-        """
-        Count how many things we will be sending.
-        :param local_project: LocalProject project we will send data from
-        :return: LocalOnlyCounter contains counts for various items
-        """
-        different_items = LocalOnlyCounter(self.config.upload_bytes_per_chunk)
-        different_items.walk_project(self.local_project)
-        return different_items
-
     def needs_to_upload(self):
         """
         Is there anything in the local project different from the remote project.
+        When streaming uploads this isn't known until run has compared every item so we return True.
         :return: bool is there any point in calling upload()
         """
-        return self.different_items.total_items() != 0
+        return self.planner is not None or self.different_items.total_items() != 0
 
     def run(self):
         """
         Upload different items within local_project to remote store showing a progress bar.
         """
+        install_rate_limiter(self.config)
         progress_printer = ProgressPrinter(self.different_items.total_items(), msg_verb='sending')
         upload_settings = UploadSettings(self.config, self.remote_store.data_service, progress_printer,
                                          self.project_name)
         project_uploader = ProjectUploader(upload_settings)
-        project_uploader.run(self.local_project)
+        if self.planner:
+            self.planner.start()
+            project_uploader.run_streaming(self.planner, self.different_items)
+            self._set_remote_project(self.planner.remote_project)
+            if self.hash_cache:
+                self.hash_cache.prune()
+        else:
+            project_uploader.run(self.local_project, self.remote_project)
+        self.remote_store.project_changed(self.local_project.remote_id)
         progress_printer.finished()
 
+    def _set_remote_project(self, remote_project):
+        """
+        Save the remote project we are uploading to taking the project name from it when it exists.
+        :param remote_project: RemoteProject or None if the project doesn't exist yet
+        """
+        self.remote_project = remote_project
+        if remote_project:
+            self.project_name = remote_project.name
+
+    def cleanup(self):
+        """
+        Remove bundles and compressed files created for this upload.
+        """
+        if self.bundle_dir:
+            shutil.rmtree(self.bundle_dir, ignore_errors=True)
+            self.bundle_dir = None
+        if self.compression_dir:
+            shutil.rmtree(self.compression_dir, ignore_errors=True)
+            self.compression_dir = None
+
     def get_differences_summary(self):
         """
-        Print a summary of what is to be done.
+        Print a summary of what is to be done, or what was done once a streaming upload has run.
         :param different_items: LocalOnlyCounter item that contains the summary
         """
+        if self.planner:
+            return 'Uploaded {}.'.format(self.different_items.result_str())
         return 'Uploading {}.'.format(self.different_items.result_str())
 
+    def get_compare_summary(self):
+        """
+        Summary of how local files were compared against the remote project.
+        """
+        return 'Checked files: {}.'.format(self.local_project.compare_stats.result_str())
+
     def get_upload_report(self):
         """
         Generate and print a report onto stdout.
@@ -85,6 +175,186 @@ class ProjectUpload(object):
         return url
 
 
+class RemoteProjectFetcher(object):
+    """
+    Fetches a remote project tree in a background thread.
+    """
+    def __init__(self, remote_store, project_name, project_id=None):
+        """
+        :param remote_store: RemoteStore: where we will fetch the project from
+        :param project_name: str: name of the project to fetch
+        :param project_id: str: uuid of the project to fetch instead of looking it up by name
+        """
+        self.remote_store = remote_store
+        self.project_name = project_name
+        self.project_id = project_id
+        self.remote_project = None
+        self.error = None
+        self.thread = threading.Thread(target=self._fetch)
+        self.thread.daemon = True
+
+    def start(self):
+        """
+        Begin fetching the remote project.
+        """
+        self.thread.start()
+
+    def _fetch(self):
+        try:
+            if self.project_id:
+                self.remote_project = self.remote_store.fetch_remote_project_by_id(self.project_id,
+                                                                                   include_children=True)
+            else:
+                self.remote_project = self.remote_store.fetch_remote_project(self.project_name)
+        except Exception as ex:
+            self.error = ex
+
+    def is_done(self):
+        """
+        Has the fetch finished so get_remote_project will not block.
+        :return: bool: True when finished
+        """
+        return not self.thread.is_alive()
+
+    def get_remote_project(self):
+        """
+        Wait for the fetch to finish raising any error that occurred.
+        :return: RemoteProject or None if the project doesn't exist
+        """
+        # join with a timeout so KeyboardInterrupt is still delivered while we wait
+        while self.thread.is_alive():
+            self.thread.join(0.1)
+        if self.error:
+            raise self.error
+        return self.remote_project
+
+
+class StreamingUploadPlanner(object):
+    """
+    Scans local paths in a background thread comparing each item against the remote project as it is found.
+    Items are handed to the uploader in the order they are found with each parent before its children
+    so files are hashed and sent while the rest of the folders are still being scanned.
+    Items found before the remote project has been fetched are held until it arrives.
+    """
+    def __init__(self, local_project, paths, remote_project_fetcher, compression_level=0, compression_dir=None):
+        """
+        :param local_project: LocalProject: empty project that scanned items are added to
+        :param paths: [str]: paths of files/folders to scan
+        :param remote_project_fetcher: RemoteProjectFetcher: started fetch of the project we are uploading into
+        :param compression_level: int: gzip level for compressible files or 0 to upload files as they are
+        :param compression_dir: str: directory to write compressed files into
+        """
+        self.local_project = local_project
+        self.paths = paths
+        self.remote_project_fetcher = remote_project_fetcher
+        self.compression_level = compression_level
+        self.compression_dir = compression_dir
+        self.remote_project = None
+        self.project_added = False
+        self.remote_parents = {}
+        self.remote_children_parent = None
+        self.remote_children = {}
+        self.items = queue.Queue()
+        self.finished = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+    def start(self):
+        """
+        Begin scanning the local paths.
+        """
+        self.thread.start()
+
+    def get_items(self, timeout):
+        """
+        Wait up to timeout seconds for an item and return all of the items found so far.
+        Raises any error that stopped the scan from the call after the one returning the items found before it.
+        :param timeout: float: seconds to wait for an item
+        :return: ([(object, object)], bool): (item, parent) pairs and True if there will be no more items.
+        The first item is the project which has a parent of None.
+        """
+        items = []
+        if not self.finished:
+            try:
+                found = self.items.get(timeout=timeout)
+                while found:
+                    items.append(found)
+                    found = self.items.get_nowait()
+            except queue.Empty:
+                return items, False
+            self.finished = True
+        if self.error:
+            if items:
+                return items, False
+            raise self.error
+        return items, True
+
+    def _run(self):
+        try:
+            scanned_items = []
+            for item, parent in self.local_project.scan_paths(self.paths):
+                scanned_items.append((item, parent))
+                if self.remote_project_fetcher.is_done():
+                    self._add_items(scanned_items)
+                    scanned_items = []
+            self._add_items(scanned_items)
+        except Exception as ex:
+            self.error = ex
+        finally:
+            self.items.put(None)
+
+    def _add_items(self, scanned_items):
+        if not self.project_added:
+            self._add_project()
+        for item, parent in scanned_items:
+            self._add_item(item, parent)
+
+    def _add_project(self):
+        self.remote_project = self.remote_project_fetcher.get_remote_project()
+        self.local_project.compare_stats = FileCompareStats()
+        if self.remote_project:
+            self.local_project.remote_id = self.remote_project.id
+            self.remote_parents[self.local_project] = self.remote_project
+        self.items.put((self.local_project, None))
+        self.project_added = True
+
+    def _add_item(self, item, parent):
+        """
+        Add item to the local project tree, compare it against the remote project then hand it to the uploader.
+        :param item: LocalFolder/LocalFile: item that was scanned
+        :param parent: LocalProject/LocalFolder: parent of item
+        """
+        if KindType.is_file(item) and self.compression_level and is_compressible(item.name):
+            item = CompressedLocalFile(item, self.compression_level, self.compression_dir)
+        parent.children.append(item)
+        compare_stats = self.local_project.compare_stats
+        remote_item = self._find_remote_child(parent, item.name)
+        if remote_item:
+            item.update_remote_ids(remote_item, compare_stats)
+            if not KindType.is_file(item):
+                self.remote_parents[item] = remote_item
+        else:
+            compare_stats.add_missing(item)
+        self.items.put((item, parent))
+
+    def _find_remote_child(self, parent, name):
+        """
+        Find the remote item named name under the remote counterpart of parent.
+        Children of a parent are scanned together so we only keep the names of the last parent's children.
+        :param parent: LocalProject/LocalFolder: local parent
+        :param name: str: name of the child to find
+        :return: RemoteFolder/RemoteFile or None if it doesn't exist remotely
+        """
+        remote_parent = self.remote_parents.get(parent)
+        if not remote_parent:
+            return None
+        if remote_parent is not self.remote_children_parent:
+            self.remote_children_parent = remote_parent
+            self.remote_children = dict((child.name, child) for child in reversed(remote_parent.children))
+        return self.remote_children.get(name)
+
+
 class LocalOnlyCounter(object):
     """
     Visitor that counts items that need to be sent in LocalContent.
@@ -1,4 +1,7 @@
+import os
 import sys
+import threading
+import time
 
 TERMINAL_ENCODING_NOT_UTF_ERROR="""
 ERROR: DukeDSClient requires UTF terminal encoding.
@@ -51,7 +54,9 @@ class ProgressPrinter(object):
         :param item: LocalFile, LocalFolder, or LocalContent(project) that is about to be sent.
         :param increment_amt: int amount to increase our count(how much progress have we made)
         """
-        percent_done = int(float(self.cnt)/float(self.total) * 100.0)
+        percent_done = 0
+        if self.total:
+            percent_done = int(float(self.cnt)/float(self.total) * 100.0)
         name = ''
         if KindType.is_project(item):
             name = 'project'
@@ -64,6 +69,13 @@ class ProgressPrinter(object):
         sys.stdout.flush()
         self.cnt += increment_amt
 
+    def increase_total(self, amount):
+        """
+        Add to the number of items we are expecting when they are found while transferring.
+        :param amount: int amount to increase the total by
+        """
+        self.total += amount
+
     def finished(self):
         """
         Must be called to print final progress label.
@@ -79,6 +91,53 @@ class ProgressPrinter(object):
         print(message)
 
 
+class ScanProgressPrinter(object):
+    """
+    Prints how many folders and files have been found while scanning local directories.
+    Only prints once a scan has taken longer than print_interval seconds so quick scans stay quiet.
+    Safe to call from multiple threads.
+    """
+    def __init__(self, print_interval=1.0):
+        """
+        :param print_interval: float: seconds between updates to the terminal
+        """
+        self.folders = 0
+        self.files = 0
+        self.print_interval = print_interval
+        self.last_print_time = time.time()
+        self.printed = False
+        self.lock = threading.Lock()
+
+    def found_item(self, item):
+        """
+        Record that we found a file or folder, periodically printing our progress.
+        :param item: LocalFile/LocalFolder: item found while scanning
+        """
+        with self.lock:
+            if KindType.is_file(item):
+                self.files += 1
+            else:
+                self.folders += 1
+            now = time.time()
+            if now - self.last_print_time >= self.print_interval:
+                self.last_print_time = now
+                self._print_progress()
+
+    def finished(self):
+        """
+        Print final counts if we printed any progress.
+        """
+        if self.printed:
+            self._print_progress()
+            sys.stdout.write('\n')
+            sys.stdout.flush()
+
+    def _print_progress(self):
+        sys.stdout.write('\rScanning: {} folders, {} files'.format(self.folders, self.files))
+        sys.stdout.flush()
+        self.printed = True
+
+
 class ProjectWalker(object):
     """
     Generic tool for visiting all the nodes in a project.
@@ -183,10 +242,11 @@ class ProjectFilenameList(object):
 
 class ProgressQueue(object):
     """
-    Sends tuples over queue for amount processed or an error with a message.
+    Sends tuples over queue for amount processed, a hash of data processed or an error with a message.
     """
     ERROR = 'error'
     PROCESSED = 'processed'
+    HASHED = 'hashed'
 
     def __init__(self, queue):
         self.queue = queue
@@ -197,10 +257,19 @@ class ProgressQueue(object):
     def processed(self, amt):
         self.queue.put((ProgressQueue.PROCESSED, amt))
 
+    def hashed(self, hash_alg, hash_value):
+        """
+        Report the hash of data processed. Must be sent before the final processed amount.
+        :param hash_alg: str: name of the hash algorithm
+        :param hash_value: str: hex digest of the data
+        """
+        self.queue.put((ProgressQueue.HASHED, (hash_alg, hash_value)))
+
     def get(self):
         """
         Get the next tuple added to the queue.
-        :return: (str, value): where str is either ERROR or PROCESSED and value is the message or processed int amount.
+        :return: (str, value): where str is ERROR, PROCESSED or HASHED and value is the message,
+        processed int amount or (hash_alg, hash_value) tuple.
         """
         return self.queue.get()
 
@@ -214,13 +283,17 @@ def wait_for_processes(processes, size, progress_queue, watcher, item):
     :param progress_queue: ProgressQueue: queue which will receive tuples of progress or error
     :param watcher: ProgressPrinter: we notify of our progress:
     :param item: object: RemoteFile/LocalFile we are transferring.
+    :return: [(str, str)]: (hash_alg, hash_value) tuples reported by processes
     """
+    hashes = []
     while size > 0:
         progress_type, value = progress_queue.get()
         if progress_type == ProgressQueue.PROCESSED:
             chunk_size = value
             watcher.transferring_item(item, increment_amt=chunk_size)
             size -= chunk_size
+        elif progress_type == ProgressQueue.HASHED:
+            hashes.append(value)
         else:
             error_message = value
             for process in processes:
@@ -228,6 +301,36 @@ def wait_for_processes(processes, size, progress_queue, watcher, item):
             raise ValueError(error_message)
     for process in processes:
         process.join()
+    return hashes
+
+
+def make_parent_directory(filename):
+    """
+    Create the directory that will contain filename if it doesn't already exist.
+    :param filename: str: path to a file
+    """
+    parent_dir = os.path.dirname(filename)
+    if parent_dir and not os.path.exists(parent_dir):
+        try:
+            os.makedirs(parent_dir)
+        except OSError:
+            # another process may have created the directory
+            if not os.path.isdir(parent_dir):
+                raise
+
+
+def write_file_atomically(filename, data, open_func=open):
+    """
+    Write data to a temporary file and rename it to filename so readers never see a partial file.
+    :param filename: str: path to write to (parent directory is created if necessary)
+    :param data: bytes: content to write
+    :param open_func: function used to open the file(open or gzip.open)
+    """
+    make_parent_directory(filename)
+    temp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+    with open_func(temp_filename, 'wb') as outfile:
+        outfile.write(data)
+    os.rename(temp_filename, filename)
 
 
 def verify_terminal_encoding(encoding):
@@ -17,6 +17,32 @@ NO_PROJECTS_FOUND_MESSAGE = 'No projects found.'
 TWO_SECONDS = 2
 
 
+def fetch_project(remote_store, args, must_exist=True, include_children=True):
+    """
+    Fetch the project specified by either project_name(-p) or project_id(-i) in args.
+    :param remote_store: RemoteStore: where we will fetch the project from
+    :param args: Namespace arguments parsed from the command line.
+    :param must_exist: should we error if the project name doesn't exist
+    :param include_children: should we read children(folders/files)
+    :return: RemoteProject project requested or None if not found(and must_exist=False)
+    """
+    if args.project_id:
+        return remote_store.fetch_remote_project_by_id(args.project_id, include_children=include_children)
+    return remote_store.fetch_remote_project(args.project_name, must_exist=must_exist,
+                                             include_children=include_children)
+
+
+def get_project_identifier(args):
+    """
+    Return how the user specified the project for use in messages.
+    :param args: Namespace arguments parsed from the command line.
+    :return: str: project name or id
+    """
+    if args.project_id:
+        return "with id '{}'".format(args.project_id)
+    return "named '{}'".format(args.project_name)
+
+
 class DDSClient(object):
     """
     Runs various commands based on arguments.
@@ -105,17 +131,30 @@ class UploadCommand(object):
         :param args: Namespace arguments parsed from the command line.
         """
         project_name = args.project_name        # name of the remote project to create/upload to
+        project_id = args.project_id            # uuid of an existing project to upload to instead of project_name
         folders = args.folders                  # list of local files/folders to upload into the project
         follow_symlinks = args.follow_symlinks  # should we follow symlinks when traversing folders
+        bundle_folders = args.bundle            # should folders be uploaded as a single bundle file
 
-        project_upload = ProjectUpload(self.config, project_name, folders, follow_symlinks=follow_symlinks)
-        print(project_upload.get_differences_summary())
-        if project_upload.needs_to_upload():
-            project_upload.run()
-            print('\n')
-            print(project_upload.get_upload_report())
-            print('\n')
-        print(project_upload.get_url_msg())
+        project_upload = ProjectUpload(self.config, project_name, folders, follow_symlinks=follow_symlinks,
+                                       bundle_folders=bundle_folders, project_id=project_id)
+        try:
+            # a streaming upload compares files while it sends them so only has a summary once it has run
+            stream_uploads = self.config.stream_uploads
+            if not stream_uploads:
+                print(project_upload.get_differences_summary())
+                print(project_upload.get_compare_summary())
+            if project_upload.needs_to_upload():
+                project_upload.run()
+                print('\n')
+                if stream_uploads:
+                    print(project_upload.get_differences_summary())
+                    print(project_upload.get_compare_summary())
+                print(project_upload.get_upload_report())
+                print('\n')
+            print(project_upload.get_url_msg())
+        finally:
+            project_upload.cleanup()
 
 
 class DownloadCommand(object):
@@ -134,14 +173,14 @@ class DownloadCommand(object):
         Download a project based on passed in args.
         :param args: Namespace arguments parsed from the command line.
         """
-        project_name = args.project_name    # name of the pre-existing project to set permissions on
+        project = fetch_project(self.remote_store, args, must_exist=True, include_children=False)
         folder = args.folder                # path to a folder to download data into
         # Default to project name with spaces replaced with '_' if not specified
         if not folder:
-            fixed_path = replace_invalid_path_chars(project_name.replace(' ', '_'))
+            fixed_path = replace_invalid_path_chars(project.name.replace(' ', '_'))
             folder = path_does_not_exist_or_is_empty(fixed_path)
         path_filter = PathFilter(args.include_paths, args.exclude_paths)
-        project_download = ProjectDownload(self.remote_store, project_name, folder, path_filter)
+        project_download = ProjectDownload(self.remote_store, project, folder, path_filter)
         project_download.run()
 
 
@@ -161,14 +200,13 @@ class AddUserCommand(object):
         Give the user with user_full_name the auth_role permissions on the remote project with project_name.
         :param args Namespace arguments parsed from the command line
         """
-        project_name = args.project_name    # name of the pre-existing project to set permissions on
         email = args.email                  # email of person to give permissions, will be None if username is specified
         username = args.username            # username of person to give permissions, will be None if email is specified
         auth_role = args.auth_role          # type of permission(project_admin)
-        project = self.remote_store.fetch_remote_project(project_name, must_exist=True, include_children=False)
+        project = fetch_project(self.remote_store, args, must_exist=True, include_children=False)
         user = self.remote_store.lookup_user_by_email_or_username(email, username)
         self.remote_store.set_user_project_permission(project, user, auth_role)
-        print(u'Gave user {} {} permissions for {}.'.format(user.full_name, auth_role, project_name))
+        print(u'Gave user {} {} permissions for {}.'.format(user.full_name, auth_role, project.name))
 
 
 class RemoveUserCommand(object):
@@ -187,13 +225,12 @@ class RemoveUserCommand(object):
         Remove permissions from the user with user_full_name or email on the remote project with project_name.
         :param args Namespace arguments parsed from the command line
         """
-        project_name = args.project_name  # name of the pre-existing project to set permissions on
         email = args.email                # email of person to remove permissions from (None if username specified)
         username = args.username          # username of person to remove permissions from (None if email is specified)
-        project = self.remote_store.fetch_remote_project(project_name, must_exist=True, include_children=False)
+        project = fetch_project(self.remote_store, args, must_exist=True, include_children=False)
         user = self.remote_store.lookup_user_by_email_or_username(email, username)
         self.remote_store.revoke_user_project_permission(project, user)
-        print(u'Removed permissions from user {} for project {}.'.format(user.full_name, project_name))
+        print(u'Removed permissions from user {} for project {}.'.format(user.full_name, project.name))
 
 
 class ShareCommand(object):
@@ -213,14 +250,14 @@ class ShareCommand(object):
         Gives user permission based on auth_role arg and sends email to that user.
         :param args Namespace arguments parsed from the command line
         """
-        project_name = args.project_name    # name of the pre-existing project to set permissions on
+        project = fetch_project(self.remote_store, args, must_exist=True, include_children=False)
         email = args.email                  # email of person to send email to
         username = args.username            # username of person to send email to, will be None if email is specified
         force_send = args.resend            # is this a resend so we should force sending
         auth_role = args.auth_role          # authorization role(project permissions) to give to the user
         to_user = self.remote_store.lookup_user_by_email_or_username(email, username)
         try:
-            dest_email = self.service.share(project_name, to_user, force_send, auth_role)
+            dest_email = self.service.share(project, to_user, force_send, auth_role)
             print("Share email message sent to " + dest_email)
         except D4S2Error as ex:
             if ex.warning:
@@ -248,18 +285,18 @@ class DeliverCommand(object):
         When user accepts delivery they receive access and we lose admin privileges.
         :param args Namespace arguments parsed from the command line
         """
-        project_name = args.project_name    # name of the pre-existing project to set permissions on
+        project = fetch_project(self.remote_store, args, must_exist=True, include_children=False)
         email = args.email                  # email of person to deliver to, will be None if username is specified
         username = args.username            # username of person to deliver to, will be None if email is specified
         skip_copy_project = args.skip_copy_project  # should we skip the copy step
         force_send = args.resend            # is this a resend so we should force sending
         new_project_name = None
         if not skip_copy_project:
-            new_project_name = self.get_new_project_name(project_name)
+            new_project_name = self.get_new_project_name(project.name)
         to_user = self.remote_store.lookup_user_by_email_or_username(email, username)
         try:
             path_filter = PathFilter(args.include_paths, args.exclude_paths)
-            dest_email = self.service.deliver(project_name, new_project_name, to_user, force_send, path_filter)
+            dest_email = self.service.deliver(project, new_project_name, to_user, force_send, path_filter)
             print("Delivery email message sent to " + dest_email)
         except D4S2Error as ex:
             if ex.warning:
@@ -294,8 +331,8 @@ class ListCommand(object):
         Lists project names.
         :param args Namespace arguments parsed from the command line
         """
-        if args.project_name:
-            project = self.remote_store.fetch_remote_project(args.project_name, must_exist=True)
+        if args.project_name or args.project_id:
+            project = fetch_project(self.remote_store, args, must_exist=True)
             self.print_project_details(project)
         else:
             self.print_project_names()
@@ -331,16 +368,15 @@ class DeleteCommand(object):
         Deletes a single project specified by project_name in args.
         :param args Namespace arguments parsed from the command line
         """
-        project_name = args.project_name
-        project = self.remote_store.fetch_remote_project(project_name, must_exist=False)
+        project = fetch_project(self.remote_store, args, must_exist=False, include_children=False)
         if not project:
-            raise ValueError("No project named '{}' found.\n".format(project_name))
+            raise ValueError("No project {} found.\n".format(get_project_identifier(args)))
         else:
             if not args.force:
-                delete_prompt = "Are you sure you wish to delete {} (y/n)?".format(project_name)
+                delete_prompt = "Are you sure you wish to delete {} (y/n)?".format(project.name)
                 if not boolean_input_prompt(delete_prompt):
                     return
-            self.remote_store.delete_project_by_name(args.project_name)
+            self.remote_store.delete_project(project)
 
 
 class ListAuthRolesCommand(object):
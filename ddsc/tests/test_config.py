@@ -1,5 +1,6 @@
 from unittest import TestCase
 import math
+import os
 import ddsc.config
 import multiprocessing
 
@@ -64,6 +65,31 @@ class TestConfig(TestCase):
         config.update_properties(some_config)
         self.assertEqual(config.upload_bytes_per_chunk, 20971520)
 
+    def test_upload_chunk_limits(self):
+        config = ddsc.config.Config()
+        config.update_properties({'upload_workers': 4})
+        self.assertEqual(ddsc.config.DDS_DEFAULT_UPLOAD_MAX_CHUNK_BYTES, config.upload_max_bytes_per_chunk)
+        # the default shrinks so all workers' chunks fit in memory
+        config.update_properties({'upload_workers': 20})
+        self.assertEqual(100 * 1024 * 1024, config.upload_max_bytes_per_chunk)
+        config.update_properties({'upload_workers': 40})
+        self.assertEqual(ddsc.config.DDS_DEFAULT_UPLOAD_CHUNKS, config.upload_max_bytes_per_chunk)
+        self.assertEqual(ddsc.config.DDS_DEFAULT_UPLOAD_MAX_CHUNKS, config.upload_max_chunks)
+        config.update_properties({'upload_max_bytes_per_chunk': '1024MB', 'upload_max_chunks': 500})
+        self.assertEqual(1024 * 1024 * 1024, config.upload_max_bytes_per_chunk)
+        self.assertEqual(500, config.upload_max_chunks)
+        # never smaller than the minimum chunk size
+        config.update_properties({'upload_bytes_per_chunk': '2048MB'})
+        self.assertEqual(2 * 1024 * 1024 * 1024, config.upload_max_bytes_per_chunk)
+
+    def test_upload_small_file_batch_size(self):
+        config = ddsc.config.Config()
+        self.assertEqual(ddsc.config.DEFAULT_UPLOAD_SMALL_FILE_BATCH_SIZE, config.upload_small_file_batch_size)
+        config.update_properties({'upload_small_file_batch_size': 100})
+        self.assertEqual(100, config.upload_small_file_batch_size)
+        config.update_properties({'upload_small_file_batch_size': 0})
+        self.assertEqual(1, config.upload_small_file_batch_size)
+
     def test_get_portal_url_base(self):
         config = ddsc.config.Config()
         config1 = {
@@ -105,3 +131,94 @@ class TestConfig(TestCase):
         ddsc.config.MAX_DEFAULT_WORKERS = 1
         self.assertEqual(1, ddsc.config.default_num_workers())
         ddsc.config.MAX_DEFAULT_WORKERS = orig_max_default_workers
+
+    def test_hash_cache_filename(self):
+        config = ddsc.config.Config()
+        self.assertEqual(os.path.expanduser('~/.ddsclient_cache/hashes.sqlite'), config.hash_cache_filename)
+        config.update_properties({'cache_dir': '/tmp/ddscache'})
+        self.assertEqual('/tmp/ddscache/hashes.sqlite', config.hash_cache_filename)
+        config.update_properties({'hash_cache_max_entries': 0})
+        self.assertEqual(None, config.hash_cache_filename)
+        config.update_properties({'cache_dir': '', 'hash_cache_max_entries': 10})
+        self.assertEqual(None, config.cache_dir)
+        self.assertEqual(None, config.hash_cache_filename)
+
+    def test_scan_workers(self):
+        config = ddsc.config.Config()
+        self.assertEqual(1, config.scan_workers)
+        config.update_properties({'scan_workers': 8})
+        self.assertEqual(8, config.scan_workers)
+
+    def test_remote_tree_cache_dir(self):
+        config = ddsc.config.Config()
+        self.assertEqual(None, config.remote_tree_cache_dir)
+        config.update_properties({'cache_dir': '/tmp/ddscache', 'remote_tree_cache_seconds': 3600})
+        self.assertEqual('/tmp/ddscache/remote_trees', config.remote_tree_cache_dir)
+
+    def test_file_hash_algorithms(self):
+        config = ddsc.config.Config()
+        self.assertEqual(['md5'], config.file_hash_algorithms)
+        config.update_properties({'file_hash_algorithms': 'sha256, md5'})
+        self.assertEqual(['sha256', 'md5'], config.file_hash_algorithms)
+        config.update_properties({'file_hash_algorithms': ['sha1']})
+        self.assertEqual(['sha1'], config.file_hash_algorithms)
+
+    def test_file_hash_algorithms_invalid(self):
+        config = ddsc.config.Config()
+        config.update_properties({'file_hash_algorithms': 'sha256, sha265'})
+        with self.assertRaises(ValueError) as raised_exception:
+            config.file_hash_algorithms
+        self.assertIn('sha265', str(raised_exception.exception))
+
+    def test_download_verification(self):
+        config = ddsc.config.Config()
+        self.assertEqual(True, config.verify_downloads)
+        self.assertEqual(2, config.download_retries)
+        self.assertEqual(4, config.download_url_prefetch)
+        config.update_properties({'verify_downloads': False, 'download_retries': 0})
+        self.assertEqual(False, config.verify_downloads)
+        self.assertEqual(0, config.download_retries)
+
+    def test_download_allocation(self):
+        config = ddsc.config.Config()
+        self.assertEqual('fallocate', config.download_allocation)
+        config.update_properties({'download_allocation': 'sequential'})
+        self.assertEqual('sequential', config.download_allocation)
+        config.update_properties({'download_allocation': 'other'})
+        with self.assertRaises(ValueError):
+            config.download_allocation
+
+    def test_transfer_rate_limit(self):
+        config = ddsc.config.Config()
+        self.assertEqual(0, config.transfer_rate_limit)
+        config.update_properties({'transfer_rate_limit': '10MB'})
+        self.assertEqual(10 * 1024 * 1024, config.transfer_rate_limit)
+        self.assertEqual(10 * 1024 * 1024, config.transfer_rate_burst)
+        config.update_properties({'transfer_rate_burst': '50MB'})
+        self.assertEqual(50 * 1024 * 1024, config.transfer_rate_burst)
+
+    def test_autotune_workers(self):
+        config = ddsc.config.Config()
+        self.assertEqual(False, config.autotune_workers)
+        config.update_properties({'autotune_workers': True})
+        self.assertEqual(True, config.autotune_workers)
+
+    def test_upload_compression_level(self):
+        config = ddsc.config.Config()
+        self.assertEqual(0, config.upload_compression_level)
+        config.update_properties({'upload_compression_level': 6})
+        self.assertEqual(6, config.upload_compression_level)
+        config.update_properties({'upload_compression_level': 20})
+        self.assertEqual(9, config.upload_compression_level)
+
+    def test_stream_uploads(self):
+        config = ddsc.config.Config()
+        self.assertEqual(False, config.stream_uploads)
+        config.update_properties({'stream_uploads': True})
+        self.assertEqual(True, config.stream_uploads)
+
+    def test_upload_staging_dir(self):
+        config = ddsc.config.Config()
+        self.assertEqual(None, config.upload_staging_dir)
+        config.update_properties({'upload_staging_dir': '/scratch/ddsclient'})
+        self.assertEqual('/scratch/ddsclient', config.upload_staging_dir)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Measures the memory used per node by the local and remote project tree classes.
+Creates NUM_NODES nodes of each class with unique names and reports the bytes allocated per node
+(including the name strings) using tracemalloc. Requires python 3.4+.
+
+Compare two versions by running it from each checkout:
+    git checkout <commit> && PYTHONPATH=. python scripts/tree_memory.py
+"""
+from __future__ import print_function
+import sys
+import gc
+import tracemalloc
+from ddsc.core.localstore import LocalFile, LocalFolder
+from ddsc.core.remotestore import RemoteFile, RemoteFolder
+
+NUM_NODES = 100000
+PARENT_PATH = '/data/project/results/sample'
+PARENT_REMOTE_PATH = 'results/sample'
+
+
+def make_local_file(index):
+    return LocalFile('{}/file_{:08d}.txt'.format(PARENT_PATH, index), size=index)
+
+
+def make_local_folder(index):
+    return LocalFolder('{}/folder_{:08d}'.format(PARENT_PATH, index))
+
+
+def make_remote_file(index):
+    json_data = {
+        'id': '{:08d}-0000-0000-0000-000000000000'.format(index),
+        'kind': 'dds-file',
+        'name': 'file_{:08d}.txt'.format(index),
+        'is_deleted': False,
+        'current_version': {
+            'upload': {
+                'id': '{:08d}-1111-0000-0000-000000000000'.format(index),
+                'size': index,
+                'hashes': [{'algorithm': 'md5', 'value': '{:032x}'.format(index)}],
+            }
+        },
+    }
+    return RemoteFile(json_data, PARENT_REMOTE_PATH)
+
+
+def make_remote_folder(index):
+    json_data = {
+        'id': '{:08d}-0000-0000-0000-000000000000'.format(index),
+        'kind': 'dds-folder',
+        'name': 'folder_{:08d}'.format(index),
+        'is_deleted': False,
+    }
+    return RemoteFolder(json_data, PARENT_REMOTE_PATH)
+
+
+def bytes_per_node(make_node, num_nodes=NUM_NODES):
+    """
+    Create num_nodes nodes with make_node and return the average bytes still allocated for each one.
+    :param make_node: func(int) -> object: creates a node with a unique name
+    :param num_nodes: int: how many nodes to create
+    :return: float: bytes per node
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = [make_node(index) for index in range(num_nodes)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del nodes
+    return float(after - before) / num_nodes
+
+
+def main():
+    print('Python {}'.format(sys.version.split()[0]))
+    for name, make_node in [('LocalFile', make_local_file), ('LocalFolder', make_local_folder),
+                            ('RemoteFile', make_remote_file), ('RemoteFolder', make_remote_folder)]:
+        print('{:<12} {:6.0f} B'.format(name, bytes_per_node(make_node)))
+
+
+if __name__ == '__main__':
+    main()
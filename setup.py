@@ -12,6 +12,7 @@ setup(name='DukeDSClient',
         install_requires=[
           'requests',
           'PyYAML',
+          'scandir;python_version<"3.5"',
         ],
         test_suite='nose.collector',
         tests_require=['nose', 'mock'],